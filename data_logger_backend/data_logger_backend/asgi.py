@@ -13,6 +13,10 @@ django.setup()
 # ✅ جهّز التطبيق العادي
 django_asgi_app = get_asgi_application()
 
+# ✅ تحديثات الـ master clock من باقي الـ processes: في السيرفر بس، مش في كل manage.py
+from home.utils import start_master_clock_listener
+start_master_clock_listener()
+
 # ✅ بعد ما Django يبقى جاهز، استورد باقي الموديولات
 from data_logger_backend.utils.websocket_utils import TokenAuthMiddleware, websocket_urlpatterns
 
@@ -141,6 +141,42 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Reading uploads: "" = write in the request, "redis" / "disk" = queue them
+# and let `manage.py run_ingest_writer` do the inserts
+INGEST_QUEUE = config("INGEST_QUEUE", default="")
+INGEST_REDIS_URL = config("INGEST_REDIS_URL", default="redis://127.0.0.1:6379/0")
+INGEST_QUEUE_DIR = config("INGEST_QUEUE_DIR", default=os.path.join(BASE_DIR, "ingest_queue"))
+
+# Raw reading storage: "table" = one DeviceReading row per reading,
+# "chunks" = one compressed ReadingChunk per device-hour (device_details/storage.py)
+READING_STORE = config("READING_STORE", default="table")
+
+# Readings API page size (?page_size= up to the max), see device_details/pagination.py
+READINGS_PAGE_SIZE = config("READINGS_PAGE_SIZE", default=500, cast=int)
+READINGS_MAX_PAGE_SIZE = config("READINGS_MAX_PAGE_SIZE", default=5000, cast=int)
+
+# Closed months of raw readings moved out of the database by
+# `manage.py archive_readings` (one memory-mapped .npy file per device-month)
+READINGS_ARCHIVE_DIR = config("READINGS_ARCHIVE_DIR", default=os.path.join(BASE_DIR, "readings_archive"))
+
+# Rendered PDF reports (device_details/reports.py), reused until readings
+# land in their range, and the worker processes that render them
+REPORTS_DIR = config("REPORTS_DIR", default=os.path.join(BASE_DIR, "reports"))
+REPORT_WORKERS = config("REPORT_WORKERS", default=2, cast=int)
+
+# Offline checker (logs/offline_scheduler.py): full resync of the device
+# deadlines with the database every this many seconds
+OFFLINE_RECONCILE_SECONDS = config("OFFLINE_RECONCILE_SECONDS", default=300, cast=int)
+
+# Token-bucket admission control on device POSTs (per worker process).
+# RATE is tokens/second, BURST the bucket size, RETRY_JITTER the max extra
+# seconds added to Retry-After per device.
+INGEST_ADMISSION = {
+    "ingest": {"DEVICE_RATE": 0.2, "DEVICE_BURST": 5, "GLOBAL_RATE": 50, "GLOBAL_BURST": 100, "RETRY_JITTER": 30},
+    "discovery": {"DEVICE_RATE": 1, "DEVICE_BURST": 5, "GLOBAL_RATE": 100, "GLOBAL_BURST": 200, "RETRY_JITTER": 10},
+    "gateway": {"DEVICE_RATE": 1, "DEVICE_BURST": 5, "GLOBAL_RATE": 10, "GLOBAL_BURST": 20, "RETRY_JITTER": 10},
+}
+
 ASGI_APPLICATION = "data_logger_backend.asgi.application"
 WSGI_APPLICATION = 'data_logger_backend.wsgi.application'
 
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'data_logger_backend.settings')
 
 application = get_wsgi_application()
+
+# تحديثات الـ master clock من باقي الـ processes: في السيرفر بس، مش في كل manage.py
+from home.utils import start_master_clock_listener
+start_master_clock_listener()
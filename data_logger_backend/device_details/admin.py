@@ -1 +1,41 @@
 from django.contrib import admin
+from .models import DailyCompliance, Excursion, ReadingCompaction, ReportJob, RetentionPolicy
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ('device', 'department', 'raw_days', 'hourly_days', 'daily_days')
+    list_select_related = ('device', 'department')
+    autocomplete_fields = ('device', 'department')
+
+
+@admin.register(ReadingCompaction)
+class ReadingCompactionAdmin(admin.ModelAdmin):
+    list_display = ('device', 'raw_before', 'hourly_before', 'archived_before', 'updated_at')
+    list_select_related = ('device',)
+    readonly_fields = ('device', 'raw_before', 'hourly_before', 'archived_before', 'updated_at')
+
+
+@admin.register(DailyCompliance)
+class DailyComplianceAdmin(admin.ModelAdmin):
+    list_display = ('device', 'day', 'reading_count', 'observed_seconds', 'in_range_seconds')
+    list_filter = ('day',)
+    list_select_related = ('device',)
+    readonly_fields = [f.name for f in DailyCompliance._meta.fields]
+
+
+@admin.register(Excursion)
+class ExcursionAdmin(admin.ModelAdmin):
+    list_display = ('device', 'metric', 'direction', 'start', 'end', 'peak', 'limit', 'duration')
+    list_filter = ('metric', 'direction')
+    list_select_related = ('device',)
+    date_hierarchy = 'start'
+    readonly_fields = [f.name for f in Excursion._meta.fields]
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('device', 'start', 'end', 'mode', 'with_csv', 'template_version', 'status', 'generation', 'rendered_generation', 'finished_at')
+    list_filter = ('status', 'mode', 'template_version')
+    list_select_related = ('device',)
+    readonly_fields = [f.name for f in ReportJob._meta.fields]
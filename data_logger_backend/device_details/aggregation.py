@@ -0,0 +1,102 @@
+# device_details/aggregation.py
+"""
+Vectorised per-bucket statistics of reading series. Missing values
+(no sensor, or a NULL reading) are NaN and are left out of every
+statistic, so a temperature-only logger just gets NaN humidity buckets.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+BUCKET_WIDTHS = {
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+METRICS = ('avg', 'min', 'max', 'std', 'count')
+SENSORS = ('temperature', 'humidity')
+MAX_BUCKETS = 20000  # أقصى عدد buckets في طلب واحد
+
+SeriesStats = namedtuple('SeriesStats', 'count mean min max std')
+
+
+def reading_arrays(readings):
+    """
+    (timestamps, temperatures, humidities) arrays from a DeviceReading
+    queryset (pulled with values_list, no model instances) or from
+    (timestamp, temperature, humidity, ...) rows. Timestamps are
+    datetime64[us]; missing values are NaN.
+    """
+    if hasattr(readings, 'values_list'):
+        readings = readings.values_list('timestamp', 'temperature', 'humidity')
+
+    rows = list(readings)
+    # أسرع بكتير من np.array(datetimes, dtype='datetime64[us]')
+    timestamps = np.array([(row[0] - EPOCH) // MICROSECOND for row in rows], dtype=np.int64).view('datetime64[us]')
+    temperatures = np.array([row[1] for row in rows], dtype=np.float64)  # None -> nan
+    humidities = np.array([row[2] for row in rows], dtype=np.float64)
+    return timestamps, temperatures, humidities
+
+
+def series_stats(inverse, size, values):
+    """count/mean/min/max/std (population) of values per bucket index; NaN ignored."""
+    valid = ~np.isnan(values)
+    index = inverse[valid]
+    v = values[valid]
+
+    count = np.bincount(index, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(index, weights=v, minlength=size) / count
+        # two-pass variance: أدق من sum of squares لقيم زي 1000.01
+        deviation = v - mean[index]
+        std = np.sqrt(np.bincount(index, weights=deviation * deviation, minlength=size) / count)
+
+    minimum = np.full(size, np.inf)
+    maximum = np.full(size, -np.inf)
+    np.minimum.at(minimum, index, v)
+    np.maximum.at(maximum, index, v)
+    empty = count == 0
+    minimum[empty] = np.nan
+    maximum[empty] = np.nan
+
+    return SeriesStats(count, mean, minimum, maximum, std)
+
+
+def aggregate(timestamps, temperatures, humidities, width):
+    """
+    Buckets of `width` seconds aligned to midnight (naive local time, like
+    every timestamp here). Returns (bucket_starts, temperature SeriesStats,
+    humidity SeriesStats), buckets ascending, empty buckets skipped.
+    """
+    step = np.timedelta64(int(width), 's')
+    buckets = (timestamps - np.datetime64(0, 'us')) // step
+    starts, inverse = np.unique(buckets, return_inverse=True)
+    size = len(starts)
+
+    return (
+        np.datetime64(0, 'us') + starts * step,
+        series_stats(inverse, size, temperatures),
+        series_stats(inverse, size, humidities),
+    )
+
+
+def nan_to_none(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def stats_columns(starts, stats, metrics):
+    """
+    aggregate()'s output as parallel lists: 'buckets' plus one
+    '<sensor>_<metric>' list per sensor and requested metric.
+    """
+    columns = {'buckets': starts.astype(datetime).tolist()}
+    for sensor, series in zip(SENSORS, stats):
+        for metric in metrics:
+            values = getattr(series, 'mean' if metric == 'avg' else metric)
+            columns[f'{sensor}_{metric}'] = values.tolist() if metric == 'count' else nan_to_none(values)
+    return columns
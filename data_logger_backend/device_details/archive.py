@@ -0,0 +1,125 @@
+# device_details/archive.py
+import os
+from collections import namedtuple
+from datetime import date
+import numpy as np
+from django.conf import settings
+from .models import ReadingArchive
+
+COLUMNS = ('timestamp', 'temperature', 'humidity')
+# شهر = ملف .npy واحد بأعمدة الثلاثة، فالاستبدال os.replace واحد atomic
+MONTH_DTYPE = np.dtype([('timestamp', 'datetime64[us]'), ('temperature', np.float64), ('humidity', np.float64)])
+BLOCK = 1000  # rows converted from the mmap at a time
+
+# نفس attributes بتاعة DeviceReading اللي الـ views بتستخدمها (storage بيستخدمه برضه).
+# id = 0 للقراءات اللي مش في جدول DeviceReading، period = 'hour' / 'day' للمتوسطات
+ReadingRow = namedtuple('ReadingRow', COLUMNS + ('id', 'period'), defaults=(0, None))
+
+
+def month_start(ts):
+    return date(ts.year, ts.month, 1)
+
+
+def next_month(d):
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def month_path(device, month):
+    # device.pk مش device_id: الـ MAC فيه ':' ومينفعش في أسماء ملفات ويندوز
+    return os.path.join(settings.READINGS_ARCHIVE_DIR, str(device.pk), f"{month:%Y-%m}.npy")
+
+
+def load_month(device, month):
+    """Memory-mapped rows of one archived month (columns by name), or None if it has no file."""
+    try:
+        return np.load(month_path(device, month), mmap_mode='r')
+    except FileNotFoundError:
+        return None
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def write_month(device, month, rows):
+    """
+    Writes (timestamp, temperature, humidity) rows of one month as one .npy
+    file sorted by timestamp, merged with what is already archived for
+    that month. On equal timestamps the archived row wins, like the unique
+    constraint on the live table. Returns the number of rows in the month.
+    """
+    timestamps = np.array([r[0] for r in rows], dtype='datetime64[us]')
+    temperatures = _float_column(r[1] for r in rows)
+    humidities = _float_column(r[2] for r in rows)
+
+    existing = load_month(device, month)
+    if existing is not None:
+        timestamps = np.concatenate([existing['timestamp'], timestamps])
+        temperatures = np.concatenate([existing['temperature'], temperatures])
+        humidities = np.concatenate([existing['humidity'], humidities])
+
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    _, first = np.unique(timestamps, return_index=True)
+    month_rows = np.empty(len(first), dtype=MONTH_DTYPE)
+    month_rows['timestamp'] = timestamps[first]
+    month_rows['temperature'] = temperatures[order][first]
+    month_rows['humidity'] = humidities[order][first]
+    existing = None  # يقفل الـ mmap قبل ما نستبدل الملف
+
+    path = month_path(device, month)
+    tmp_path = path + '.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        np.save(f, month_rows)
+        f.flush()
+        os.fsync(f.fileno())
+    # القارئ بيشوف الشهر القديم أو الجديد كامل، ومفيش لحظة من غير ملف
+    os.replace(tmp_path, path)
+
+    return len(month_rows)
+
+
+def delete_month(archive):
+    try:
+        os.remove(month_path(archive.device, archive.month))
+    except FileNotFoundError:
+        pass
+    archive.delete()
+
+
+def archived_readings(device, start=None, end=None, newest_first=False):
+    """Archived readings of one device in [start, end], oldest first by default."""
+    archives = ReadingArchive.objects.filter(device=device).order_by('-month' if newest_first else 'month')
+    if start:
+        archives = archives.filter(month__gte=month_start(start))
+    if end:
+        archives = archives.filter(month__lte=end.date())
+
+    for archive in archives:
+        columns = load_month(device, archive.month)
+        if columns is None:
+            continue
+
+        timestamps = columns['timestamp']
+        lo = np.searchsorted(timestamps, np.datetime64(start, 'us')) if start else 0
+        hi = np.searchsorted(timestamps, np.datetime64(end, 'us'), side='right') if end else len(timestamps)
+        if lo >= hi:
+            continue
+
+        # بنقرا الشريحة المطلوبة بس من الملف، على blocks عشان اللي بياخد
+        # صفحة واحدة مايحوّلش الشهر كله لـ Python objects
+        blocks = range(hi, lo, -BLOCK) if newest_first else range(lo, hi, BLOCK)
+        for edge in blocks:
+            block = slice(max(lo, edge - BLOCK), edge) if newest_first else slice(edge, min(hi, edge + BLOCK))
+            rows = zip(
+                timestamps[block].tolist(),
+                columns['temperature'][block].tolist(),
+                columns['humidity'][block].tolist(),
+            )
+            for ts, temperature, humidity in (reversed(list(rows)) if newest_first else rows):
+                yield ReadingRow(
+                    ts,
+                    None if temperature != temperature else temperature,
+                    None if humidity != humidity else humidity,
+                )
@@ -0,0 +1,119 @@
+# device_details/chunk_codec.py
+"""
+Binary encoding of one device-hour of readings (ReadingChunk.data).
+
+    flag byte        0 = plain, 1 = zlib (sealed chunks)
+    varint count
+    timestamps       µs from the chunk start: first offset, first delta,
+                     then delta-of-delta (0 for a steady upload interval)
+    temperature      presence bitmap, then the first value and the deltas
+    humidity         of the present values, quantised to 1/100
+
+All integers are zigzag varints, so steady readings cost ~1 byte each.
+"""
+import zlib
+from datetime import timedelta
+
+PLAIN = 0
+ZLIB = 1
+SCALE = 100  # نفس دقة الـ frame parser: 0.01 °C / %RH
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _put_varint(out, n):
+    n = _zigzag(n)
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    shift = result = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return _unzigzag(result), pos
+        shift += 7
+
+
+def _put_values(out, values):
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, v in enumerate(values):
+        if v is not None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    out += bitmap
+
+    previous = 0
+    for v in values:
+        if v is not None:
+            q = round(v * SCALE)
+            _put_varint(out, q - previous)
+            previous = q
+
+
+def _get_values(data, pos, count):
+    bitmap = data[pos:pos + (count + 7) // 8]
+    pos += len(bitmap)
+
+    values = []
+    previous = 0
+    for i in range(count):
+        if bitmap[i >> 3] & (1 << (i & 7)):
+            delta, pos = _get_varint(data, pos)
+            previous += delta
+            values.append(previous / SCALE)
+        else:
+            values.append(None)
+    return values, pos
+
+
+def encode_chunk(start, rows, sealed=False):
+    """rows: (timestamp, temperature, humidity) sorted by timestamp, all >= start."""
+    out = bytearray()
+    _put_varint(out, len(rows))
+
+    previous = previous_delta = 0
+    for i, (ts, _, _) in enumerate(rows):
+        offset = (ts - start) // timedelta(microseconds=1)
+        delta = offset - previous
+        _put_varint(out, offset if i == 0 else delta if i == 1 else delta - previous_delta)
+        previous, previous_delta = offset, delta
+
+    _put_values(out, [row[1] for row in rows])
+    _put_values(out, [row[2] for row in rows])
+
+    if sealed:
+        return bytes([ZLIB]) + zlib.compress(bytes(out), 6)
+    return bytes([PLAIN]) + bytes(out)
+
+
+def decode_chunk(start, data):
+    """Inverse of encode_chunk: list of (timestamp, temperature, humidity)."""
+    data = bytes(data)
+    body = zlib.decompress(data[1:]) if data[0] == ZLIB else data[1:]
+
+    count, pos = _get_varint(body, 0)
+    timestamps = []
+    offset = delta = 0
+    for i in range(count):
+        value, pos = _get_varint(body, pos)
+        if i == 0:
+            offset = value
+        else:
+            delta = value if i == 1 else delta + value
+            offset += delta
+        timestamps.append(start + timedelta(microseconds=offset))
+
+    temperatures, pos = _get_values(body, pos, count)
+    humidities, pos = _get_values(body, pos, count)
+    return list(zip(timestamps, temperatures, humidities))
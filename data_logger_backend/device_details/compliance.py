@@ -0,0 +1,173 @@
+# device_details/compliance.py
+"""
+Cold-chain compliance per device-day: mean kinetic temperature (MKT),
+time within min_temp/max_temp and excursion minutes.
+
+Every temperature reading holds until the next one, up to MAX_GAP (a
+longer gap means the logger was offline and counts as unobserved). MKT
+only needs the running sum of exp(-ΔH/RT) and the reading count, so both
+are kept up to date at ingest without rescanning a day.
+"""
+import math
+from datetime import datetime, time, timedelta
+from .models import DailyCompliance, ReadingCompaction
+from .storage import readings_between
+
+ACTIVATION_ENERGY = 83.144  # kJ/mol، القيمة الافتراضية لـ ΔH في USP <1160>
+GAS_CONSTANT = 8.3144e-3  # kJ/(mol·K)
+KELVIN = 273.15
+MAX_GAP = timedelta(hours=1)
+
+TRACKED_FIELDS = [
+    'reading_count', 'mkt_sum', 'observed_seconds', 'in_range_seconds',
+    'last_timestamp', 'last_temperature', 'last_in_range',
+]
+
+
+def in_range(device, temperature):
+    return (
+        (device.min_temp is None or temperature >= device.min_temp)
+        and (device.max_temp is None or temperature <= device.max_temp)
+    )
+
+
+def mkt_term(temperature):
+    return math.exp(-ACTIVATION_ENERGY / (GAS_CONSTANT * (temperature + KELVIN)))
+
+
+def mean_kinetic_temperature(mkt_sum, count):
+    """MKT in °C from the running sum of exp(-ΔH/RT) over count readings."""
+    if not count:
+        return None
+    return ACTIVATION_ENERGY / GAS_CONSTANT / -math.log(mkt_sum / count) - KELVIN
+
+
+def _add_interval(days, start, end, inside):
+    if end - start > MAX_GAP:
+        return
+    # الفترة ممكن تعدي نص الليل، كل يوم ياخد نصيبه
+    while start < end:
+        part_end = min(end, datetime.combine(start.date() + timedelta(days=1), time.min))
+        row = days.get(start.date())
+        if row is not None:
+            seconds = (part_end - start).total_seconds()
+            row.observed_seconds += seconds
+            if inside:
+                row.in_range_seconds += seconds
+        start = part_end
+
+
+def _accumulate(device, days, previous, readings):
+    """
+    Adds readings (ascending, with a temperature) to the rows in days
+    ({date: DailyCompliance}). previous is (timestamp, in_range) of the
+    reading just before them, or None.
+    """
+    for r in readings:
+        inside = in_range(device, r.temperature)
+        if previous:
+            _add_interval(days, previous[0], r.timestamp, previous[1])
+        row = days[r.timestamp.date()]
+        row.reading_count += 1
+        row.mkt_sum += mkt_term(r.temperature)
+        row.last_timestamp, row.last_temperature, row.last_in_range = r.timestamp, r.temperature, inside
+        previous = (r.timestamp, inside)
+
+
+def _locked_days(device, days):
+    # الصفوف الناقصة تتعمل فاضية الأول، فالـ select_for_update يقفلها كلها
+    DailyCompliance.objects.bulk_create([DailyCompliance(device=device, day=day) for day in days], ignore_conflicts=True)
+    return {row.day: row for row in DailyCompliance.objects.select_for_update().filter(device=device, day__in=days)}
+
+
+def update_compliance(device, readings):
+    """
+    Folds newly stored readings (ascending) into the device's daily rows.
+    Call it inside the transaction that stored them. A batch older than
+    the last reading already counted re-derives the days it touches.
+    """
+    readings = [r for r in readings if r.temperature is not None]
+    if not readings:
+        return
+
+    last = (
+        DailyCompliance.objects.select_for_update()
+        .filter(device=device, last_timestamp__isnull=False)
+        .order_by('-day')
+        .first()
+    )
+    if last and readings[0].timestamp <= last.last_timestamp:
+        # قراءات متأخرة (ESP كان offline): نعيد حساب الأيام دي بس
+        recompute_compliance(device, readings[0].timestamp.date(), max(last.day, readings[-1].timestamp.date()))
+        return
+
+    days = {r.timestamp.date() for r in readings}
+    if last:
+        days.add(last.day)
+    rows = _locked_days(device, days)
+    _accumulate(device, rows, (last.last_timestamp, last.last_in_range) if last else None, readings)
+    DailyCompliance.objects.bulk_update(rows.values(), TRACKED_FIELDS)
+
+
+def recompute_compliance(device, first_day, last_day):
+    """
+    Rebuilds the rows of first_day..last_day from the raw readings (reading
+    store and archive), judged against the device's current limits. Days
+    whose raw readings enforce_retention already removed are left alone.
+    """
+    raw_before = ReadingCompaction.objects.filter(device=device).values_list('raw_before', flat=True).first()
+    if raw_before:
+        first_day = max(first_day, raw_before.date() if raw_before.time() == time.min else raw_before.date() + timedelta(days=1))
+    if first_day > last_day:
+        return
+
+    start = datetime.combine(first_day, time.min)
+    end = datetime.combine(last_day, time.max)
+    readings = [r for r in readings_between(device, start - MAX_GAP, end) if r.temperature is not None]
+    before = [r for r in readings if r.timestamp < start]
+    previous = (before[-1].timestamp, in_range(device, before[-1].temperature)) if before else None
+
+    days = {}
+    day = first_day
+    while day <= last_day:
+        days[day] = DailyCompliance(device=device, day=day)
+        day += timedelta(days=1)
+    _accumulate(device, days, previous, readings[len(before):])
+
+    DailyCompliance.objects.filter(device=device, day__gte=first_day, day__lte=last_day).delete()
+    DailyCompliance.objects.bulk_create([row for row in days.values() if row.reading_count or row.observed_seconds])
+
+
+def _stats(reading_count, mkt_sum, observed_seconds, in_range_seconds):
+    def rounded(value):
+        return None if value is None else round(value, 2)
+
+    return {
+        'readings': reading_count,
+        'mkt': rounded(mean_kinetic_temperature(mkt_sum, reading_count)),
+        'time_in_range_percent': rounded(100 * in_range_seconds / observed_seconds if observed_seconds else None),
+        'excursion_minutes': round((observed_seconds - in_range_seconds) / 60, 1),
+    }
+
+
+def compliance_summary(device, first_day, last_day):
+    """Per-day statistics of first_day..last_day plus the same figures over the whole range."""
+    rows = list(DailyCompliance.objects.filter(device=device, day__gte=first_day, day__lte=last_day).order_by('day'))
+    return {
+        'start_date': first_day.strftime("%Y-%m-%d"),
+        'end_date': last_day.strftime("%Y-%m-%d"),
+        'min_temp': device.min_temp,
+        'max_temp': device.max_temp,
+        'days': [
+            {'day': r.day.strftime("%Y-%m-%d"),
+             **_stats(r.reading_count, r.mkt_sum, r.observed_seconds, r.in_range_seconds)}
+            for r in rows
+        ],
+        # MKT المدى كله من مجموع الـ sums، مش متوسط الـ MKT اليومي
+        'total': _stats(
+            sum(r.reading_count for r in rows),
+            sum(r.mkt_sum for r in rows),
+            sum(r.observed_seconds for r in rows),
+            sum(r.in_range_seconds for r in rows),
+        ),
+    }
@@ -1,13 +1,18 @@
 import re
+from datetime import timedelta
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
 from home.models.device_model import Device
-from .models import DeviceReading
+from home.utils import get_master_time
+from .downsample import MAX_POINTS, MIN_POINTS, lttb_rows
+from .storage import get_reading_store, series_rows
 
 
 class DeviceConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.device_id = self.scope['url_route']['kwargs']['device_id']
+        self.chart_options = self.parse_chart_options()
         safe_device_id = re.sub(r'[^a-zA-Z0-9_.-]', '_', self.device_id)
         self.group_name = f'device_{safe_device_id}'
 
@@ -100,10 +105,26 @@ class DeviceConsumer(AsyncJsonWebsocketConsumer):
         except Device.DoesNotExist:
             return None
 
+    def parse_chart_options(self):
+        # ?max_points=N&hours=H: أول تحميل يبقى آخر H ساعة متقلصة لـ N نقطة بدل آخر 50 قراءة
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            max_points = int(query['max_points'][0])
+            hours = float(query.get('hours', ['24'])[0])
+        except (KeyError, ValueError):
+            return None
+        if not MIN_POINTS <= max_points <= MAX_POINTS or hours <= 0:
+            return None
+        return max_points, hours
+
     @database_sync_to_async
     def get_readings(self, device):
         try:
-            return list(DeviceReading.objects.filter(device=device).order_by('-timestamp')[:50])
+            if self.chart_options:
+                max_points, hours = self.chart_options
+                start = get_master_time() - timedelta(hours=hours)
+                return lttb_rows(series_rows(device, start), max_points)[::-1]
+            return get_reading_store().latest(device, 50)
         except Exception:
             return []
 
@@ -0,0 +1,74 @@
+# device_details/downsample.py
+"""
+Largest-Triangle-Three-Buckets reduction of reading series for charts:
+keeps the points that shape the curve (peaks, excursions), so a chart of
+any range costs at most max_points points.
+"""
+import numpy as np
+from .aggregation import reading_arrays
+
+MIN_POINTS = 3
+MAX_POINTS = 10000
+
+
+def lttb_indices(x, y, n):
+    """Indices of the n points of (x, y) that LTTB keeps; x ascending, no NaN."""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < MIN_POINTS:
+        return np.array([0, size - 1][:max(n, 0)])
+
+    # أول وآخر نقطة ثابتين، والباقي n-2 buckets
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+
+    for i in range(n - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+        else:
+            next_lo, next_hi = size - 1, size
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        # ضعف مساحة المثلث (a, نقطة من الـ bucket, متوسط الـ bucket الجاي)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+def _series_indices(x, y, n):
+    present = np.flatnonzero(~np.isnan(y))
+    if len(present) == 0:
+        return present
+    return present[lttb_indices(x[present], y[present], n)]
+
+
+def lttb_rows(rows, max_points):
+    """
+    Reduces (timestamp, temperature, humidity, ...) rows, oldest first, to
+    at most max_points rows. Each sensor gets its own LTTB pass over its
+    non-missing values and the kept rows are the union, so a peak in either
+    series survives.
+    """
+    if len(rows) <= max_points:
+        return list(rows)
+
+    timestamps, temperature, humidity = reading_arrays(rows)
+    x = timestamps.astype(np.int64).astype(np.float64)
+
+    has_temperature = not np.isnan(temperature).all()
+    has_humidity = not np.isnan(humidity).all()
+    per_series = max_points // 2 if has_temperature and has_humidity else max_points
+
+    keep = np.union1d(
+        _series_indices(x, temperature, per_series) if has_temperature else [],
+        _series_indices(x, humidity, per_series) if has_humidity else [],
+    ).astype(np.int64)
+    return [rows[i] for i in keep]
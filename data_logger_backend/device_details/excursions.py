@@ -0,0 +1,142 @@
+# device_details/excursions.py
+"""
+Streaming detection of excursions: spans where a device's temperature or
+humidity stayed outside min/max. New readings only extend or close the
+open excursion of each metric; late readings re-detect from the first
+excursion they could change.
+"""
+from django.db.models import Q
+from .compliance import MAX_GAP
+from .models import Excursion, ReadingCompaction
+from .storage import get_reading_store, stream_readings
+
+METRICS = {
+    Excursion.TEMPERATURE: (1, 'min_temp', 'max_temp'),  # مكان القيمة في الـ row
+    Excursion.HUMIDITY: (2, 'min_hum', 'max_hum'),
+}
+
+UPDATE_FIELDS = ['end', 'peak', 'last_reading_at', 'duration']
+
+
+class _Detector:
+    """Feeds one metric of one device, oldest first, and collects the excursions it opened or changed."""
+
+    def __init__(self, device, metric, open_excursion=None):
+        self.device = device
+        self.metric = metric
+        self.index, low_field, high_field = METRICS[metric]
+        self.low = getattr(device, low_field)
+        self.high = getattr(device, high_field)
+        self.open = open_excursion
+        self.changed = {}
+
+    def feed(self, row):
+        ts, value = row[0], row[self.index]
+        if value is None:
+            return
+
+        if self.open and ts - self.open.last_reading_at > MAX_GAP:
+            # الجهاز كان offline: الـ excursion بيقفل عند آخر قراءة شفناها برا الحد
+            self._close(self.open.last_reading_at)
+
+        if self.high is not None and value > self.high:
+            direction = Excursion.HIGH
+        elif self.low is not None and value < self.low:
+            direction = Excursion.LOW
+        else:
+            direction = None
+
+        if self.open and self.open.direction != direction:
+            self._close(ts)
+        if direction is None:
+            return
+
+        if self.open is None:
+            self.open = Excursion(
+                device=self.device, metric=self.metric, direction=direction, start=ts, peak=value,
+                limit=self.high if direction == Excursion.HIGH else self.low,
+            )
+        else:
+            self.open.peak = max(self.open.peak, value) if direction == Excursion.HIGH else min(self.open.peak, value)
+        self.open.last_reading_at = ts
+        self.open.duration = ts - self.open.start
+        self.changed[id(self.open)] = self.open
+
+    def _close(self, ts):
+        self.open.end = ts
+        self.open.duration = ts - self.open.start
+        self.changed[id(self.open)] = self.open
+        self.open = None
+
+
+def _save(detectors):
+    changed = [e for detector in detectors for e in detector.changed.values()]
+    Excursion.objects.bulk_create([e for e in changed if e.pk is None])
+    Excursion.objects.bulk_update([e for e in changed if e.pk is not None], UPDATE_FIELDS)
+
+
+def update_excursions(device, readings):
+    """
+    Extends or closes the device's open excursions with newly stored
+    readings (ascending) and opens new ones. Call it inside the
+    transaction that stored them.
+    """
+    if not readings:
+        return
+
+    # الدفعة في آخر التاريخ؟ لو فيه قراءة أحدث منها متخزنة قبل كده يبقى دي قراءات متأخرة
+    newest = get_reading_store().latest(device, len(readings))
+    if [r.timestamp for r in newest] != [r.timestamp for r in reversed(readings)]:
+        rebuild_excursions(device, since=readings[0].timestamp)
+        return
+
+    open_excursions = {
+        e.metric: e for e in Excursion.objects.select_for_update().filter(device=device, end__isnull=True)
+    }
+    detectors = [_Detector(device, metric, open_excursions.get(metric)) for metric in METRICS]
+    for r in readings:
+        row = (r.timestamp, r.temperature, r.humidity)
+        for detector in detectors:
+            detector.feed(row)
+    _save(detectors)
+
+
+def rebuild_excursions(device, since=None):
+    """
+    Re-detects the device's excursions from since (its whole history if
+    None) up to its latest reading, from the reading store and the
+    archive, against the device's current limits. Ranges whose raw
+    readings enforce_retention removed keep their excursions.
+    """
+    raw_before = ReadingCompaction.objects.filter(device=device).values_list('raw_before', flat=True).first()
+    since = max(filter(None, (since, raw_before)), default=None)
+
+    # كل metric ليه بداية لوحده: excursion رطوبة بدأ بدري مايرجعش الحرارة لورا والعكس
+    begins, reopened = {metric: since for metric in METRICS}, {}
+    if since is not None:
+        covering = Excursion.objects.filter(device=device, start__lt=since).filter(Q(end__isnull=True) | Q(end__gte=since))
+        for excursion in covering:
+            # excursion شغال وقت since بيتحسب من أوله؛ لو بدايته اتمسحت بالـ retention بيكمل زي ما هو
+            if raw_before and excursion.start < raw_before:
+                excursion.end = None
+                reopened[excursion.metric] = excursion
+            else:
+                begins[excursion.metric] = excursion.start
+
+    for metric, begin in begins.items():
+        excursions = Excursion.objects.filter(device=device, metric=metric)
+        if begin is not None:
+            excursions = excursions.filter(start__gte=begin)
+        excursions.delete()
+
+    detectors = [(_Detector(device, metric, reopened.get(metric)), begins[metric]) for metric in METRICS]
+    first = None if any(begin is None for begin in begins.values()) else min(begins.values())
+    for row in stream_readings(device, first):
+        for detector, begin in detectors:
+            if begin is None or row[0] >= begin:
+                detector.feed(row)
+    detectors = [detector for detector, _ in detectors]
+    for detector in detectors:
+        if detector.open is not None and detector.open.pk is not None:
+            detector.changed[id(detector.open)] = detector.open
+    _save(detectors)
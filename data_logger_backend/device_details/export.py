@@ -0,0 +1,59 @@
+# device_details/export.py
+import json
+from .storage import stream_readings
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson',
+}
+
+LINES_PER_CHUNK = 1000  # سطور في كل chunk بتتبعت للـ client
+
+
+def _csv_value(value):
+    return '' if value is None else repr(value)
+
+
+def _json_value(value):
+    return 'null' if value is None else repr(value)
+
+
+def _csv_field(text):
+    if any(c in text for c in ',"\n\r'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def export_chunks(devices, start=None, end=None, output=CSV, chunk_size=2000):
+    """
+    Raw readings of the devices in [start, end] as CSV or NDJSON text
+    chunks, device by device, oldest first. Rows are formatted straight
+    from the (timestamp, temperature, humidity) tuples of stream_readings,
+    and only LINES_PER_CHUNK lines are held at a time.
+    """
+    if output == CSV:
+        yield 'device_id,timestamp,temperature,humidity\n'
+
+    for device in devices:
+        if output == CSV:
+            prefix = _csv_field(device.device_id) + ','
+        else:
+            prefix = '{"device_id":' + json.dumps(device.device_id) + ',"timestamp":"'
+
+        lines = []
+        for row in stream_readings(device, start, end, chunk_size):
+            ts = f"{row[0]:%Y-%m-%d %H:%M:%S}"
+            if output == CSV:
+                lines.append(f"{prefix}{ts},{_csv_value(row[1])},{_csv_value(row[2])}\n")
+            else:
+                lines.append(f'{prefix}{ts}","temperature":{_json_value(row[1])},"humidity":{_json_value(row[2])}}}\n')
+
+            if len(lines) >= LINES_PER_CHUNK:
+                yield ''.join(lines)
+                lines = []
+
+        if lines:
+            yield ''.join(lines)
@@ -0,0 +1,45 @@
+# device_details/expressions.py
+from django.db.models import DateTimeField, Func, StdDev
+from django.db.utils import NotSupportedError
+
+
+class BucketStart(Func):
+    """
+    Start of the `width`-second bucket a naive timestamp falls in, aligned
+    to midnight like aggregation.aggregate, so a GROUP BY on it runs in the
+    database. MySQL in production, SQLite for local runs.
+    """
+    output_field = DateTimeField()
+
+    def __init__(self, expression, width, **extra):
+        self.width = int(width)
+        if self.width <= 0:
+            raise ValueError("width must be positive")
+        super().__init__(expression, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"BucketStart is not implemented for {connection.vendor}")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        # TIMESTAMPDIFF من تاريخ ثابت مش UNIX_TIMESTAMP، عشان time zone الـ session مايأثرش
+        template = (
+            "DATE_ADD(CAST('1970-01-01' AS DATETIME), INTERVAL "
+            f"FLOOR(TIMESTAMPDIFF(SECOND, '1970-01-01', %(expressions)s) / {self.width}) * {self.width} SECOND)"
+        )
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # strftime('%s') بيعامل الـ naive timestamp كـ UTC، فالحسبة من غير time zone برضه
+        template = f"datetime(CAST(strftime('%%%%s', %(expressions)s) AS INTEGER) / {self.width} * {self.width}, 'unixepoch')"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+class PopulationStdDev(StdDev):
+    """StdDev(sample=False) that also works on SQLite for groups with no values."""
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # STDDEV_POP بتاع Django على SQLite بيقع لو الـ group كله NULL (pstdev من غير داتا)
+        template = (
+            "SQRT(MAX(AVG(%(expressions)s * %(expressions)s) - AVG(%(expressions)s) * AVG(%(expressions)s), 0))"
+        )
+        return super().as_sql(compiler, connection, template=template, **extra_context)
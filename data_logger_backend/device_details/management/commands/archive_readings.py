@@ -0,0 +1,90 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from home.models.device_model import Device
+from home.utils import get_master_time
+from device_details.archive import month_start, next_month, write_month
+from device_details.models import ReadingArchive, ReadingCompaction
+from device_details.storage import get_reading_store
+
+
+def previous_month(d):
+    return d.replace(year=d.year - 1, month=12) if d.month == 1 else d.replace(month=d.month - 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed months of raw readings out of the database into per-device, per-month "
+        ".npy files (READINGS_ARCHIVE_DIR). The readings, averages and PDF endpoints "
+        "read them back transparently. Re-running merges late readings into the archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", metavar="YYYY-MM", help="Archive months before this one (default: --keep-months)")
+        parser.add_argument("--keep-months", type=int, default=3, help="Closed months to keep in the database")
+        parser.add_argument("--device", help="Only this device_id")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows deleted per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                before = datetime.strptime(options["before"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("--before must be YYYY-MM")
+        else:
+            before = month_start(get_master_time())
+            for _ in range(options["keep_months"]):
+                before = previous_month(before)
+
+        if before > month_start(get_master_time()):
+            raise CommandError("Only closed months can be archived")
+
+        self.chunk_size = options["chunk_size"]
+        cutoff = datetime.combine(before, datetime.min.time())
+
+        devices = Device.objects.all()
+        if options["device"]:
+            devices = devices.filter(device_id=options["device"])
+
+        self.store = get_reading_store()
+        total = 0
+        for device in devices.iterator():
+            first, _ = self.store.bounds(device, before=cutoff)
+            if first is None:
+                continue
+
+            if options["dry_run"]:
+                self.stdout.write(f"{device.device_id}: {self.store.count_before(device, cutoff)} readings before {before:%Y-%m}")
+                continue
+
+            month = month_start(first)
+            while month < before:
+                total += self.archive_month(device, month)
+                month = next_month(month)
+
+        action = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{action} readings before {before:%Y-%m} ({total} rows moved)"))
+
+    def archive_month(self, device, month):
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(next_month(month), datetime.min.time())
+        rows, keys = self.store.snapshot(device, start, end)
+        if not rows:
+            return 0
+
+        # الملفات الأول (بـ fsync)، وبعدين نمسح من الجدول؛ لو وقف في النص
+        # التشغيل الجاي بيدمج نفس الصفوف من غير تكرار
+        count = write_month(device, month, rows)
+        with transaction.atomic():
+            ReadingArchive.objects.update_or_create(device=device, month=month, defaults={"count": count})
+            compaction, _ = ReadingCompaction.objects.get_or_create(device=device)
+            if not compaction.archived_before or compaction.archived_before < end:
+                compaction.archived_before = end
+                compaction.save(update_fields=["archived_before", "updated_at"])
+
+        # بس الصفوف اللي اتكتبت؛ اللي وصل بعد القراءة يستنى التشغيل الجاي
+        self.store.delete_snapshot(keys, self.chunk_size)
+
+        self.stdout.write(f"{device.device_id}: {month:%Y-%m} -> {len(rows)} rows ({count} in archive)")
+        return len(rows)
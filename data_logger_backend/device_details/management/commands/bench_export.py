@@ -0,0 +1,76 @@
+import gc
+import os
+import resource
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from home.models.device_model import Device
+from device_details.export import CONTENT_TYPES, CSV, export_chunks
+from device_details.storage import get_reading_store
+
+
+def current_rss():
+    """Resident memory in bytes (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the readings export streams in constant memory: writes --rows "
+        "readings, exports them and fails if resident memory grows more than "
+        "--max-rss-mb while streaming. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", help="Existing device to write into")
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--output", choices=sorted(CONTENT_TYPES), default=CSV)
+        parser.add_argument("--max-rss-mb", type=float, default=64, help="Allowed RSS growth during the export")
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(device_id=options["device_id"])
+        except Device.DoesNotExist:
+            raise CommandError(f"Device {options['device_id']} not found")
+
+        # سنة 2000 عشان مانتقابلش مع قراءات الجهاز الحقيقية
+        start = datetime(2000, 1, 1)
+        end = start + timedelta(minutes=options["rows"])
+
+        with transaction.atomic():
+            self._fill(device, start, options["rows"])
+
+            gc.collect()
+            baseline = peak = current_rss()
+            rows = size = 0
+            began = time.perf_counter()
+            for i, chunk in enumerate(export_chunks([device], start, end, options["output"])):
+                rows += chunk.count("\n")
+                size += len(chunk)
+                if i % 20 == 0:
+                    peak = max(peak, current_rss())
+            elapsed = time.perf_counter() - began
+            peak = max(peak, current_rss())
+
+            transaction.set_rollback(True)
+
+        growth = (peak - baseline) / 2**20
+        self.stdout.write(
+            f"{options['output']}: {rows} lines, {size / 2**20:.1f} MiB in {elapsed:.1f}s "
+            f"({rows / elapsed:.0f} rows/s), RSS growth {growth:.1f} MiB"
+        )
+        if growth > options["max_rss_mb"]:
+            raise CommandError(f"RSS grew {growth:.1f} MiB while streaming (limit {options['max_rss_mb']} MiB)")
+
+    def _fill(self, device, start, count, batch=5000):
+        store = get_reading_store()
+        for offset in range(0, count, batch):
+            store.append([(device, [
+                (start + timedelta(minutes=i), 4.0 + (i % 40) / 10, 60.0 + (i % 25) / 10)
+                for i in range(offset, min(count, offset + batch))
+            ])])
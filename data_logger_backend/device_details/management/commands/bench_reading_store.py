@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from home.models.device_model import Device
+from device_details.models import DeviceReading, ReadingChunk
+from device_details.storage import STORES
+
+def table_bytes(model):
+    """
+    Bytes the model's table and its indexes take right now, uncommitted
+    rows of this connection included (SQLite dbstat); None if the
+    database can't tell.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                [table, table],
+            )
+        elif connection.vendor == "mysql":
+            # InnoDB بيحدث الأرقام دي بالـ persistent stats؛ expiry=0 بيجيب آخر قيمة عنده
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+            cursor.execute(
+                "SELECT data_length + index_length FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the reading stores (READING_STORE): bytes per reading, insert "
+        "throughput and a range read over the whole generated period. Runs inside "
+        "a transaction that is rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", help="Existing device to write into")
+        parser.add_argument("--days", type=int, default=30, help="Days of readings to generate and read back")
+        parser.add_argument("--interval", type=int, default=60, help="Seconds between readings")
+        parser.add_argument("--batch", type=int, default=200, help="Readings per append (one upload)")
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(device_id=options["device_id"])
+        except Device.DoesNotExist:
+            raise CommandError(f"Device {options['device_id']} not found")
+
+        # سنة 2000 عشان مانتقابلش مع قراءات الجهاز الحقيقية
+        start = datetime(2000, 1, 1)
+        end = start + timedelta(days=options["days"])
+        rows = self._make_rows(start, end, options["interval"])
+        batches = [rows[i:i + options["batch"]] for i in range(0, len(rows), options["batch"])]
+        self.stdout.write(f"{len(rows)} readings, {options['days']} days, {len(batches)} appends")
+
+        for name, store_class in STORES.items():
+            store = store_class()
+            model = DeviceReading if name == "table" else ReadingChunk
+            with transaction.atomic():
+                size_before = table_bytes(model)
+                began = time.perf_counter()
+                for batch in batches:
+                    store.append([(device, batch)])
+                insert_seconds = time.perf_counter() - began
+
+                read_seconds = min(self._time_read(store, device, start, end) for _ in range(3))
+                size_after = table_bytes(model)
+                transaction.set_rollback(True)
+
+            if size_before is None or size_after is None or size_after == size_before:
+                # MySQL: الـ stats ممكن ماتكونش اتحدثت جوه الـ transaction؛ شغّل ANALYZE TABLE على داتا حقيقية
+                size = "     n/a"
+            else:
+                size = f"{(size_after - size_before) / len(rows):8.1f}"
+            self.stdout.write(
+                f"{name:7} {size} B/reading {len(rows) / insert_seconds:12.1f} rows/s insert "
+                f"{read_seconds * 1000:10.1f} ms {options['days']}-day read"
+            )
+
+    def _make_rows(self, start, end, interval):
+        rng = random.Random(0)
+        temperature, humidity = 5.0, 60.0
+        rows = []
+        ts = start
+        while ts < end:
+            # تغيّر بطيء زي الثلاجة الحقيقية، بدقة الحساس (0.1)
+            temperature = round(temperature + rng.uniform(-0.2, 0.2), 1)
+            humidity = round(humidity + rng.uniform(-0.5, 0.5), 1)
+            rows.append((ts, temperature, humidity))
+            ts += timedelta(seconds=interval)
+        return rows
+
+    def _time_read(self, store, device, start, end):
+        began = time.perf_counter()
+        list(store.range(device, start, end))
+        return time.perf_counter() - began
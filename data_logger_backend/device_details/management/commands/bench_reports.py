@@ -0,0 +1,92 @@
+import gc
+import resource
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from home.models.device_model import Device
+from device_details.compliance import recompute_compliance
+from device_details.excursions import rebuild_excursions
+from device_details.models import ReportJob
+from device_details.reports import render_pdf
+from device_details.rollups import recompute_rollups
+from device_details.storage import get_reading_store
+from .bench_export import current_rss
+
+RANGES = (
+    ('1 day', timedelta(days=1)),
+    ('1 month', timedelta(days=30)),
+    ('1 year', timedelta(days=365)),
+)
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Render time and memory of the PDF report for 1 day, 1 month and 1 year of "
+        "readings at --interval minutes, in summary mode and (up to --full-max-rows "
+        "readings) the full table. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", help="Existing device to write into")
+        parser.add_argument("--interval", type=int, default=5, help="Minutes between readings")
+        parser.add_argument("--full-max-rows", type=int, default=20_000, help="Skip the full report above this many readings")
+        parser.add_argument("--raw-csv", action="store_true", help="Also attach the raw readings CSV")
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(device_id=options["device_id"])
+        except Device.DoesNotExist:
+            raise CommandError(f"Device {options['device_id']} not found")
+
+        # سنة 2000 عشان مانتقابلش مع قراءات الجهاز الحقيقية
+        start = datetime(2000, 1, 1)
+        step = timedelta(minutes=options["interval"])
+        longest = max(span for _, span in RANGES)
+
+        with transaction.atomic():
+            count = self._fill(device, start, start + longest, step)
+            recompute_rollups(device, start, start + longest)
+            recompute_compliance(device, start.date(), (start + longest).date())
+            rebuild_excursions(device, since=start)
+            self.stdout.write(f"{count} readings every {options['interval']} min")
+
+            for label, span in RANGES:
+                rows = int(span / step)
+                modes = [ReportJob.SUMMARY]
+                if rows <= options["full_max_rows"]:
+                    modes.insert(0, ReportJob.FULL)
+                for mode in modes:
+                    self._render(device, start, start + span, label, rows, mode, options["raw_csv"])
+
+            transaction.set_rollback(True)
+
+    def _render(self, device, start, end, label, rows, mode, with_csv):
+        gc.collect()
+        baseline, peak_before = current_rss(), peak_rss()
+        began = time.perf_counter()
+        pdf = render_pdf(device, start, end, mode=mode, with_csv=with_csv)
+        elapsed = time.perf_counter() - began
+        growth = (current_rss() - baseline) / 2**20
+        peak = (peak_rss() - peak_before) / 2**20
+        self.stdout.write(
+            f"{label:8} {mode:8} {rows:7} readings: {elapsed:6.2f}s, {len(pdf) / 1024:7.1f} KiB, "
+            f"RSS growth {growth:.1f} MiB (new peak +{peak:.1f} MiB)"
+        )
+
+    def _fill(self, device, start, end, step, batch=5000):
+        store = get_reading_store()
+        count = int((end - start) / step)
+        for offset in range(0, count, batch):
+            rows = []
+            for i in range(offset, min(count, offset + batch)):
+                # دورة يومية وحبة excursions عشان الجداول والرسم يبقى فيهم حاجة
+                ts = start + step * i
+                temperature = 5.0 + 2.5 * ((ts.hour - 12) / 12) ** 2 + (4.0 if ts.day == 15 and ts.hour == 3 else 0)
+                rows.append((ts, round(temperature, 1), 60.0 + (i % 25) / 10))
+            store.append([(device, rows)])
+        return count
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min
+from home.models.device_model import Device
+from device_details.models import DeviceReading
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove duplicate DeviceReading rows (same device and timestamp), keeping the oldest id. "
+        "Run once before applying the unique (device, timestamp) constraint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Duplicate timestamps per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only count, do not delete")
+
+    def handle(self, *args, **options):
+        if getattr(settings, "READING_STORE", "table") != "table":
+            # الـ chunk store بيشيل التكرار وقت الـ append، وصفوف DeviceReading القديمة مش بتتقري أصلًا
+            raise CommandError("READING_STORE is not 'table': the chunk store never holds duplicate readings")
+
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        total = 0
+
+        for device in Device.objects.only("id", "device_id").iterator():
+            groups = list(
+                DeviceReading.objects.filter(device=device)
+                .values("timestamp")
+                .annotate(n=Count("id"), keep_id=Min("id"))
+                .filter(n__gt=1)
+                .values_list("timestamp", "keep_id", "n")
+            )
+            if not groups:
+                continue
+
+            duplicates = sum(n - 1 for _, _, n in groups)
+            total += duplicates
+            self.stdout.write(f"{device.device_id}: {duplicates} duplicates in {len(groups)} timestamps")
+
+            if dry_run:
+                continue
+
+            for i in range(0, len(groups), chunk_size):
+                chunk = groups[i:i + chunk_size]
+                with transaction.atomic():
+                    DeviceReading.objects.filter(
+                        device=device,
+                        timestamp__in=[ts for ts, _, _ in chunk],
+                    ).exclude(id__in=[keep_id for _, keep_id, _ in chunk]).delete()
+
+        action = "Found" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{action} {total} duplicate readings"))
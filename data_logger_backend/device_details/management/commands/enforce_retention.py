@@ -0,0 +1,107 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from home.models.device_model import Device
+from home.utils import get_master_time
+from device_details.archive import delete_month, next_month
+from device_details.models import ReadingArchive, ReadingCompaction, ReadingRollup, RetentionPolicy
+from device_details.rollups import advance_raw_before, bucket_start, recompute_rollups
+from device_details.storage import get_reading_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply RetentionPolicy: raw readings older than raw_days are folded into the "
+        "hourly/daily rollups and deleted one day at a time, then hourly and daily "
+        "rollups past their own limits are deleted. Safe to stop and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows deleted per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+
+    def handle(self, *args, **options):
+        self.chunk_size = options["chunk_size"]
+        self.dry_run = options["dry_run"]
+        self.store = get_reading_store()
+        today = bucket_start(ReadingRollup.DAY, get_master_time())
+
+        for device in Device.objects.select_related("department").iterator():
+            policy = RetentionPolicy.for_device(device)
+            if not policy:
+                continue
+
+            if policy.raw_days is not None:
+                self.compact_raw(device, today - timedelta(days=policy.raw_days))
+                self.expire_archives(device, today - timedelta(days=policy.raw_days))
+            if policy.hourly_days is not None:
+                self.expire_rollups(device, ReadingRollup.HOUR, today - timedelta(days=policy.hourly_days))
+            if policy.daily_days is not None:
+                self.expire_rollups(device, ReadingRollup.DAY, today - timedelta(days=policy.daily_days))
+
+        self.stdout.write(self.style.SUCCESS("Dry run done" if self.dry_run else "Retention applied"))
+
+    def compact_raw(self, device, cutoff):
+        first, _ = self.store.bounds(device, before=cutoff)
+        if first is None:
+            return
+
+        if self.dry_run:
+            self.stdout.write(f"{device.device_id}: {self.store.count_before(device, cutoff)} raw readings before {cutoff:%Y-%m-%d}")
+            return
+
+        removed = 0
+        day = bucket_start(ReadingRollup.DAY, first)
+        while day < cutoff:
+            day_end = day + timedelta(days=1)
+            # الـ rollups والـ watermark في نفس الـ transaction وقبل أي مسح: لو وقفنا
+            # في نص المسح، الـ run الجاي مايعيدش تجميع يوم نصه ممسوح
+            with transaction.atomic():
+                recompute_rollups(device, day, day_end - timedelta(microseconds=1))
+                advance_raw_before(device, day_end)
+            removed += self.store.delete_range(device, day, day_end, self.chunk_size)
+            day = day_end
+
+        self.stdout.write(f"{device.device_id}: compacted {removed} raw readings before {cutoff:%Y-%m-%d}")
+
+    def expire_archives(self, device, cutoff):
+        # شهر مؤرشف بيتمسح لما يبقى كله قبل الـ cutoff، والـ rollups بتاعته فاضلة
+        months = [a for a in ReadingArchive.objects.filter(device=device).order_by("month") if next_month(a.month) <= cutoff.date()]
+        if not months:
+            return
+        if self.dry_run:
+            self.stdout.write(f"{device.device_id}: {len(months)} archived months before {cutoff:%Y-%m-%d}")
+            return
+
+        for archive in months:
+            delete_month(archive)
+        advance_raw_before(device, datetime.combine(next_month(months[-1].month), time.min))
+        self.stdout.write(f"{device.device_id}: removed {len(months)} archived months before {cutoff:%Y-%m-%d}")
+
+    def expire_rollups(self, device, period, cutoff):
+        old = ReadingRollup.objects.filter(device=device, period=period, bucket__lt=cutoff)
+        if self.dry_run:
+            count = old.count()
+            if count:
+                self.stdout.write(f"{device.device_id}: {count} {period} rollups before {cutoff:%Y-%m-%d}")
+            return
+
+        removed = self.delete_chunked(old)
+        if period == ReadingRollup.HOUR:
+            compaction = ReadingCompaction.objects.filter(device=device).first()
+            # الساعات بتتمسح بس لو الـ raw بتاعها اتمسح قبلها
+            if compaction and compaction.raw_before and (compaction.hourly_before or cutoff) <= cutoff:
+                compaction.hourly_before = min(cutoff, compaction.raw_before)
+                compaction.save(update_fields=["hourly_before", "updated_at"])
+        if removed:
+            self.stdout.write(f"{device.device_id}: removed {removed} {period} rollups before {cutoff:%Y-%m-%d}")
+
+    def delete_chunked(self, queryset):
+        removed = 0
+        while True:
+            ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:self.chunk_size])
+            if not ids:
+                return removed
+            with transaction.atomic():
+                deleted, _ = queryset.model.objects.filter(pk__in=ids).delete()
+            removed += deleted
@@ -0,0 +1,206 @@
+from datetime import date, datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncDate
+from home.models.device_model import Device
+from home.utils import get_master_time
+from device_details.models import DeviceReading, ReadingCompaction, ReadingRollup
+from device_details.rollups import advance_raw_before
+
+TABLE = DeviceReading._meta.db_table
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def next_month(d):
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def partition_name(d):
+    return f"p{d.year:04d}{d.month:02d}"
+
+
+def partition_sql(d):
+    return f"PARTITION {partition_name(d)} VALUES LESS THAN (TO_DAYS('{next_month(d).isoformat()}'))"
+
+
+class Command(BaseCommand):
+    help = (
+        "Monthly RANGE partitioning of DeviceReading on MySQL: --setup converts the table, "
+        "a plain run pre-creates future months, --drop-before drops (or --detach moves out) "
+        "old months in O(1) once their daily rollups are built, --explain shows which "
+        "partitions a range query reads. "
+        "On other databases (SQLite, tests) the table stays a plain table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--setup", action="store_true", help="Partition the existing table (one-off, rebuilds it)")
+        parser.add_argument("--months-ahead", type=int, default=3, help="Future monthly partitions to keep ready")
+        parser.add_argument("--drop-before", metavar="YYYY-MM", help="Remove partitions older than this month")
+        parser.add_argument("--detach", action="store_true", help="With --drop-before: keep each month as its own table")
+        parser.add_argument("--explain", metavar="YYYY-MM-DD", help="EXPLAIN a one-day range query on this date")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "mysql":
+            self.stdout.write(f"{connection.vendor}: DeviceReading stays a plain table, nothing to do.")
+            return
+
+        with connection.cursor() as cursor:
+            self.cursor = cursor
+
+            if options["setup"]:
+                self.setup(options["months_ahead"])
+            else:
+                self.add_future(options["months_ahead"])
+
+            if options["drop_before"]:
+                try:
+                    before = datetime.strptime(options["drop_before"], "%Y-%m").date()
+                except ValueError:
+                    raise CommandError("--drop-before must be YYYY-MM")
+                self.drop_before(before, options["detach"])
+
+            if options["explain"]:
+                self.explain(options["explain"])
+
+    def partitions(self):
+        self.cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [TABLE],
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def setup(self, months_ahead):
+        if self.partitions():
+            raise CommandError(f"{TABLE} is already partitioned")
+
+        # MySQL: partitioned InnoDB tables can't have foreign keys, and every
+        # unique key (the primary key too) must include the partition column.
+        self.cursor.execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [TABLE],
+        )
+        for (name,) in self.cursor.fetchall():
+            self.cursor.execute(f"ALTER TABLE `{TABLE}` DROP FOREIGN KEY `{name}`")
+
+        first = DeviceReading.objects.aggregate(first=Min("timestamp"))["first"] or get_master_time()
+        months = self.months(month_start(first), months_ahead)
+
+        self.cursor.execute(f"ALTER TABLE `{TABLE}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `timestamp`)")
+        self.cursor.execute(
+            f"ALTER TABLE `{TABLE}` PARTITION BY RANGE (TO_DAYS(`timestamp`)) ("
+            + ", ".join(partition_sql(m) for m in months)
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{TABLE} partitioned into {len(months)} months + pmax"))
+
+    def months(self, start, months_ahead):
+        last = month_start(get_master_time())
+        for _ in range(months_ahead):
+            last = next_month(last)
+
+        months = []
+        current = start
+        while current <= last:
+            months.append(current)
+            current = next_month(current)
+        return months
+
+    def add_future(self, months_ahead):
+        existing = self.partitions()
+        if not existing:
+            raise CommandError(f"{TABLE} is not partitioned yet, run with --setup first")
+
+        monthly = [p for p in existing if p != "pmax"]
+        newest = datetime.strptime(monthly[-1], "p%Y%m").date()
+        missing = self.months(next_month(newest), months_ahead)
+        if not missing:
+            self.stdout.write("Future partitions already exist")
+            return
+
+        # pmax فاضي دايمًا طالما الشهور الجاية متجهزة، فالـ reorganize سريع
+        self.cursor.execute(
+            f"ALTER TABLE `{TABLE}` REORGANIZE PARTITION pmax INTO ("
+            + ", ".join(partition_sql(m) for m in missing)
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Added {', '.join(partition_name(m) for m in missing)}"))
+
+    def drop_before(self, before, detach):
+        old = [p for p in self.partitions() if p != "pmax" and p < partition_name(before)]
+        if not old:
+            self.stdout.write("Nothing to drop")
+            return
+
+        # بعد الـ drop الـ rollups هي المرجع الوحيد للفترة دي، فلازم تكون متبنية
+        cutoff = datetime.combine(before, time.min)
+        devices = self.check_rollups(cutoff)
+
+        # الـ watermark الأول: الـ readings API يقرا الفترة من الـ rollups، وقراءة
+        # متأخرة في أقدم partition باقي ماتعيدش بناء rollup بيلخص قراءات اتمسحت
+        with transaction.atomic():
+            for device in devices:
+                advance_raw_before(device, cutoff)
+
+        for name in old:
+            if detach:
+                # EXCHANGE PARTITION بيبدّل الملفات بس، مفيش نسخ صفوف
+                archive = f"{TABLE}_{name}"
+                self.cursor.execute(f"CREATE TABLE `{archive}` LIKE `{TABLE}`")
+                self.cursor.execute(f"ALTER TABLE `{archive}` REMOVE PARTITIONING")
+                self.cursor.execute(f"ALTER TABLE `{TABLE}` EXCHANGE PARTITION {name} WITH TABLE `{archive}`")
+                self.stdout.write(f"{name} -> {archive}")
+
+            self.cursor.execute(f"ALTER TABLE `{TABLE}` DROP PARTITION {name}")
+            self.stdout.write(f"Dropped {name}")
+
+    def check_rollups(self, end):
+        """
+        Devices with readings before end (what the dropped partitions hold; the
+        oldest one takes everything below its bound). Raises CommandError if
+        any day of theirs has raw readings its daily rollup doesn't count.
+        """
+        raw = (
+            DeviceReading.objects.filter(timestamp__lt=end)
+            .annotate(day=TruncDate("timestamp")).values_list("device_id", "day").annotate(n=Count("pk"))
+        )
+        rolled = {
+            (device_id, bucket.date()): count
+            for device_id, bucket, count in ReadingRollup.objects.filter(
+                period=ReadingRollup.DAY, bucket__lt=end,
+            ).values_list("device_id", "bucket", "count")
+        }
+        watermarks = dict(ReadingCompaction.objects.exclude(raw_before=None).values_list("device_id", "raw_before"))
+
+        device_ids, missing = set(), set()
+        for device_id, day, n in raw:
+            device_ids.add(device_id)
+            raw_before = watermarks.get(device_id)
+            # قبل الـ raw_before القراءات المتأخرة مابتدخلش الـ rollup أصلًا
+            if raw_before and day < raw_before.date():
+                continue
+            if rolled.get((device_id, day)) != n:
+                missing.add(device_id)
+
+        devices = Device.objects.in_bulk(device_ids)
+        if missing:
+            names = ", ".join(sorted(devices[pk].device_id for pk in missing))
+            raise CommandError(f"Rollups not built before {end:%Y-%m} for {names}; run rebuild_rollups first")
+        return list(devices.values())
+
+    def explain(self, day):
+        try:
+            start = datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise CommandError("--explain must be YYYY-MM-DD")
+
+        query = DeviceReading.objects.filter(
+            timestamp__gte=start, timestamp__lte=start.replace(hour=23, minute=59, second=59),
+        ).order_by("-timestamp")
+        self.stdout.write(query.explain())
@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from home.models.device_model import Device
+from device_details.compliance import recompute_compliance
+from device_details.models import DeviceReading, ReadingArchive, ReadingChunk
+
+
+def reading_days(device):
+    """(first day, last day) with stored or archived readings, or None."""
+    bounds = [
+        DeviceReading.objects.filter(device=device).aggregate(first=Min("timestamp"), last=Max("timestamp")),
+        ReadingChunk.objects.filter(device=device).aggregate(first=Min("first_timestamp"), last=Max("last_timestamp")),
+    ]
+    firsts = [b["first"].date() for b in bounds if b["first"]]
+    lasts = [b["last"].date() for b in bounds if b["last"]]
+
+    months = ReadingArchive.objects.filter(device=device).aggregate(first=Min("month"), last=Max("month"))
+    if months["first"]:
+        firsts.append(months["first"])
+        # آخر يوم في آخر شهر متأرشف
+        lasts.append((months["last"].replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1))
+
+    if not firsts:
+        return None
+    return min(firsts), max(lasts)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily compliance rows (MKT, time in range, excursion minutes) from raw "
+        "and archived readings, one month per transaction. Use after changing a device's "
+        "min_temp/max_temp to re-judge its history, or to backfill existing readings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--device", help="Only this device_id")
+
+    def handle(self, *args, **options):
+        devices = Device.objects.all()
+        if options["device"]:
+            devices = devices.filter(device_id=options["device"])
+
+        for device in devices.iterator():
+            days = reading_days(device)
+            if days is None:
+                continue
+
+            first, last = days
+            day = first
+            while day <= last:
+                block_end = min(last, day + timedelta(days=30))
+                with transaction.atomic():
+                    recompute_compliance(device, day, block_end)
+                day = block_end + timedelta(days=1)
+
+            self.stdout.write(f"{device.device_id}: {first} .. {last}")
+
+        self.stdout.write(self.style.SUCCESS("Compliance rebuilt"))
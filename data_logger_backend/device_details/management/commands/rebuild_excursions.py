@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from datetime import datetime, time
+from home.models.device_model import Device
+from device_details.excursions import rebuild_excursions
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the excursion index from raw and archived readings, one device per "
+        "transaction. Use after changing a device's limits to re-judge its history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--device", help="Only this device_id")
+        parser.add_argument("--since", help="YYYY-MM-DD; re-detect from this day only (default: all history)")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            day = parse_date(options["since"])
+            if not day:
+                raise CommandError("--since must be YYYY-MM-DD")
+            since = datetime.combine(day, time.min)
+
+        devices = Device.objects.all()
+        if options["device"]:
+            devices = devices.filter(device_id=options["device"])
+
+        for device in devices.iterator():
+            with transaction.atomic():
+                rebuild_excursions(device, since)
+            self.stdout.write(f"{device.device_id}: {device.excursions.count()} excursions")
+
+        self.stdout.write(self.style.SUCCESS("Excursions rebuilt"))
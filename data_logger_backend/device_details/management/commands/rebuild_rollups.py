@@ -0,0 +1,36 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from home.models.device_model import Device
+from device_details.storage import get_reading_store
+from device_details.rollups import recompute_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild hourly/daily reading rollups from raw readings, one day per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--device", help="Only this device_id")
+
+    def handle(self, *args, **options):
+        devices = Device.objects.all()
+        if options["device"]:
+            devices = devices.filter(device_id=options["device"])
+
+        store = get_reading_store()
+        for device in devices.iterator():
+            first, last = store.bounds(device)
+            if first is None:
+                continue
+
+            day = first.replace(hour=0, minute=0, second=0, microsecond=0)
+            days = 0
+            while day <= last:
+                with transaction.atomic():
+                    recompute_rollups(device, day, day + timedelta(hours=23, minutes=59, seconds=59))
+                day += timedelta(days=1)
+                days += 1
+
+            self.stdout.write(f"{device.device_id}: {days} days")
+
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from device_details.models import ReportJob
+from device_details.reports import RENDER_TIMEOUT, TEMPLATE_VERSION, render_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Render queued PDF report jobs in this process: pending ones, and running ones "
+        "older than RENDER_TIMEOUT whose worker died. For deployments without the web "
+        "process pool, or to drain the queue after a restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100)
+
+    def handle(self, *args, **options):
+        jobs = ReportJob.objects.filter(template_version=TEMPLATE_VERSION).filter(
+            Q(status=ReportJob.PENDING)
+            | Q(status=ReportJob.RUNNING, started_at__lt=timezone.now() - RENDER_TIMEOUT)
+        )
+
+        done = failed = 0
+        for job_id in jobs.order_by("created_at").values_list("pk", flat=True)[:options["limit"]]:
+            if render_report(job_id):
+                done += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} reports, {failed} failed"))
@@ -1,17 +1,290 @@
+from django.core.exceptions import ValidationError
+from django.conf import settings
 from django.db import models
 from home.models.device_model import Device
 from home.utils import get_master_time
 
 class DeviceReading(models.Model):
-    device = models.ForeignKey('home.Device', on_delete=models.CASCADE)
-    temperature = models.FloatField()
-    humidity = models.FloatField()
+    # db_constraint=False: MySQL partitioned tables can't have foreign keys
+    # (see `manage.py reading_partitions`); CASCADE is still done by Django.
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, db_constraint=False)
+    temperature = models.FloatField(null=True, blank=True)
+    humidity = models.FloatField(null=True, blank=True)
     timestamp = models.DateTimeField(default=get_master_time)
 
+    class Meta:
+        # الجهاز بيعيد إرسال كل القراءات المخزنة لو الـ POST فشل
+        constraints = [
+            models.UniqueConstraint(fields=["device", "timestamp"], name="unique_device_reading_timestamp"),
+        ]
+
     def __str__(self):
         return f"{self.device.name} - {self.timestamp}"
+
+
+class ReadingRollup(models.Model):
+    """Per-device hourly / daily aggregates, kept up to date by the ingest path."""
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()  # بداية الساعة / اليوم
+    count = models.IntegerField(default=0)
+
+    temp_count = models.IntegerField(default=0)
+    temp_sum = models.FloatField(null=True, blank=True)
+    temp_min = models.FloatField(null=True, blank=True)
+    temp_max = models.FloatField(null=True, blank=True)
+
+    hum_count = models.IntegerField(default=0)
+    hum_sum = models.FloatField(null=True, blank=True)
+    hum_min = models.FloatField(null=True, blank=True)
+    hum_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "period", "bucket"], name="unique_reading_rollup_bucket"),
+        ]
+
+    @property
+    def avg_temperature(self):
+        return self.temp_sum / self.temp_count if self.temp_count else None
+
+    @property
+    def avg_humidity(self):
+        return self.hum_sum / self.hum_count if self.hum_count else None
+
+    def __str__(self):
+        return f"{self.device.device_id} - {self.period} {self.bucket}"
     
 
+class RetentionPolicy(models.Model):
+    """
+    How long readings are kept, for one device or a whole department
+    (a device policy wins over its department's). Empty = keep forever.
+    Enforced by `manage.py enforce_retention`.
+    """
+    device = models.OneToOneField('home.Device', on_delete=models.CASCADE, null=True, blank=True, related_name='retention_policy')
+    department = models.OneToOneField('home.Department', on_delete=models.CASCADE, null=True, blank=True, related_name='retention_policy')
+
+    raw_days = models.PositiveIntegerField(null=True, blank=True, help_text="Raw readings kept (days)")
+    hourly_days = models.PositiveIntegerField(null=True, blank=True, help_text="Hourly rollups kept (days)")
+    daily_days = models.PositiveIntegerField(null=True, blank=True, help_text="Daily rollups kept (days)")
+
+    def clean(self):
+        super().clean()
+
+        if bool(self.device) == bool(self.department):
+            raise ValidationError("Set either a device or a department.")
+
+        # كل مستوى لازم يعيش على الأقل قد المستوى الأدق منه
+        kept = [self.raw_days, self.hourly_days, self.daily_days]
+        for finer, coarser in zip(kept, kept[1:]):
+            if finer is None and coarser is not None:
+                raise ValidationError("A coarser level can't expire while a finer one is kept forever.")
+            if finer is not None and coarser is not None and coarser < finer:
+                raise ValidationError("Rollups must be kept at least as long as the finer data.")
+
+    @classmethod
+    def for_device(cls, device):
+        policies = {p.device_id is not None: p for p in cls.objects.filter(
+            models.Q(device=device) | models.Q(department_id=device.department_id, department__isnull=False)
+        )}
+        return policies.get(True) or policies.get(False)
+
+    def __str__(self):
+        target = self.device or self.department
+        return f"{target}: raw {self.raw_days or '∞'}d / hourly {self.hourly_days or '∞'}d / daily {self.daily_days or '∞'}d"
+
+
+class ReadingCompaction(models.Model):
+    """
+    What enforce_retention already removed for a device: raw readings before
+    raw_before and hourly rollups before hourly_before are gone, so those
+    ranges are served from the coarser rollups.
+    """
+    device = models.OneToOneField('home.Device', on_delete=models.CASCADE, related_name='compaction')
+    raw_before = models.DateTimeField(null=True, blank=True)
+    hourly_before = models.DateTimeField(null=True, blank=True)
+    # raw readings before this moved to archive files (archive_readings)
+    archived_before = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.device.device_id}: raw < {self.raw_before}, hourly < {self.hourly_before}"
+
+
+class ReadingArchive(models.Model):
+    """One archived month of a device's raw readings, stored as one .npy file of (timestamp, temperature, humidity) rows."""
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='reading_archives')
+    month = models.DateField()  # أول يوم في الشهر
+    count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "month"], name="unique_reading_archive_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.device.device_id} - {self.month:%Y-%m} ({self.count})"
+
+
+class ReadingChunk(models.Model):
+    """
+    One device-hour of readings encoded by chunk_codec, used instead of
+    DeviceReading rows when READING_STORE = "chunks". The current hour stays
+    open for appends; older hours are sealed (zlib-compressed).
+    """
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='reading_chunks')
+    hour = models.DateTimeField()  # بداية الساعة
+    count = models.IntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    sealed = models.BooleanField(default=False)
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "hour"], name="unique_reading_chunk_hour"),
+        ]
+
+    def __str__(self):
+        return f"{self.device.device_id} - {self.hour} ({self.count})"
+
+
+class DailyCompliance(models.Model):
+    """
+    Cold-chain statistics of one device-day, kept up to date at ingest by
+    compliance.update_compliance: the running MKT sum and how long the
+    temperature stayed within min_temp/max_temp.
+    """
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='compliance_days')
+    day = models.DateField()
+    reading_count = models.IntegerField(default=0)  # قراءات الحرارة بس
+    mkt_sum = models.FloatField(default=0)  # Σ exp(-ΔH/RT)
+    observed_seconds = models.FloatField(default=0)
+    in_range_seconds = models.FloatField(default=0)
+    # آخر قراءة حرارة في اليوم: الفترة لحد القراءة الجاية بتتحسب لما توصل
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_temperature = models.FloatField(null=True, blank=True)
+    last_in_range = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "day"], name="unique_daily_compliance"),
+        ]
+
+    @property
+    def excursion_seconds(self):
+        return self.observed_seconds - self.in_range_seconds
+
+    def __str__(self):
+        return f"{self.device.device_id} - {self.day} ({self.reading_count})"
+
+
+class Excursion(models.Model):
+    """
+    A span where one metric of a device stayed above its max or below its
+    min, from the first out-of-range reading to the first reading back in
+    range. end is null while it is still going on. Kept by
+    excursions.update_excursions at ingest.
+    """
+    TEMPERATURE = 'temperature'
+    HUMIDITY = 'humidity'
+    METRIC_CHOICES = [
+        (TEMPERATURE, 'Temperature'),
+        (HUMIDITY, 'Humidity'),
+    ]
+
+    HIGH = 'high'
+    LOW = 'low'
+    DIRECTION_CHOICES = [
+        (HIGH, 'Above max'),
+        (LOW, 'Below min'),
+    ]
+
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='excursions')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    direction = models.CharField(max_length=4, choices=DIRECTION_CHOICES)
+    start = models.DateTimeField()
+    end = models.DateTimeField(null=True, blank=True)
+    peak = models.FloatField()  # أعلى قيمة (high) أو أقل قيمة (low)
+    limit = models.FloatField()  # الحد وقت ما الـ excursion حصل
+    last_reading_at = models.DateTimeField()  # آخر قراءة برا الحد
+    duration = models.DurationField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["device", "start"], name="excursion_device_start"),
+            models.Index(fields=["start"], name="excursion_start"),
+        ]
+
+    def __str__(self):
+        return f"{self.device.device_id} {self.metric} {self.direction} from {self.start}"
+
+
+class ReportJob(models.Model):
+    """
+    A PDF report of one device over [start, end], rendered by the report
+    process pool (device_details/reports.py). The row is also the cache
+    entry: ingest bumps generation when readings land in the range, and the
+    file is only served while rendered_generation still matches.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    FULL = 'full'
+    SUMMARY = 'summary'
+    MODE_CHOICES = [
+        (FULL, 'Every reading'),
+        (SUMMARY, 'Charts and daily summary'),
+    ]
+
+    device = models.ForeignKey('home.Device', on_delete=models.CASCADE, related_name='report_jobs')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=FULL)
+    with_csv = models.BooleanField(default=False)  # القراءات الخام كـ CSV مرفق جوه الـ PDF
+    template_version = models.IntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    generation = models.IntegerField(default=0)  # بيزيد مع كل قراءة جديدة جوه المدى
+    rendered_generation = models.IntegerField(null=True, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "start", "end", "mode", "with_csv", "template_version"], name="unique_report_job",
+            ),
+        ]
+
+    @property
+    def is_fresh(self):
+        return self.status == self.DONE and self.rendered_generation == self.generation
+
+    def __str__(self):
+        return f"{self.device.device_id} {self.start} - {self.end} ({self.status})"
+
+
 class DeviceControl(models.Model):
     PRIORITY_CHOICES = [
         ('schedule', 'Auto Schedule'),
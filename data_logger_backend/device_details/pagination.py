@@ -0,0 +1,78 @@
+# device_details/pagination.py
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from .storage import page_readings
+
+
+class ReadingCursorPagination:
+    """
+    Keyset pagination of a device's readings, newest first, on
+    (timestamp, id). The cursor is opaque to clients: it holds the key of
+    the last row seen and the direction, so every page is one indexed
+    range read however deep it is. Same query params as DRF's
+    CursorPagination.
+    """
+    page_size = getattr(settings, 'READINGS_PAGE_SIZE', 500)
+    max_page_size = getattr(settings, 'READINGS_MAX_PAGE_SIZE', 5000)
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate(self, request, device, start=None, end=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor, forward = self.decode_cursor(request)
+
+        rows = page_readings(device, start, end, cursor, newest_first=forward, limit=page_size)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        # forward = ماشيين لورا (أقدم)، backward = راجعين لصفحة أحدث
+        self.next_key = self.key(rows[-1]) if rows and (has_more if forward else True) else None
+        self.previous_key = self.key(rows[0]) if rows and (cursor is not None if forward else has_more) else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        if page_size < 1:
+            raise ValidationError({'page_size': 'Must be at least 1.'})
+        return min(page_size, self.max_page_size)
+
+    def key(self, row):
+        return (row.timestamp, row.id)
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None, True
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode()))
+            return (datetime.fromisoformat(data['t']), int(data['i'])), bool(data['f'])
+        except (BinasciiError, ValueError, TypeError, KeyError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    def encode_cursor(self, key, forward):
+        ts, pk = key
+        data = json.dumps({'t': ts.isoformat(), 'i': pk, 'f': forward}, separators=(',', ':'))
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def link(self, key, forward):
+        if key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(key, forward))
+
+    def get_next_link(self):
+        return self.link(self.next_key, True)
+
+    def get_previous_link(self):
+        return self.link(self.previous_key, False)
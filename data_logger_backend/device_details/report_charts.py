@@ -0,0 +1,143 @@
+# device_details/report_charts.py
+"""
+Static SVG charts for the summary PDF. The series comes already bucketed
+from the database (storage.bucket_columns), so a year costs as much to draw
+as a day: a mean line, a min-max band and the device's limits.
+"""
+from datetime import timedelta
+from xml.sax.saxutils import escape
+from .aggregation import BUCKET_WIDTHS
+
+MAX_BUCKETS = 1000  # نقط الرسم في أي مدى
+
+WIDTH = 720
+HEIGHT = 220
+MARGIN_LEFT = 44
+MARGIN_RIGHT = 10
+MARGIN_TOP = 22
+MARGIN_BOTTOM = 26
+
+COLORS = {
+    'temperature': '#d9534f',
+    'humidity': '#337ab7',
+}
+
+
+def chart_width(start, end):
+    """Smallest of BUCKET_WIDTHS that keeps [start, end] within MAX_BUCKETS buckets."""
+    seconds = (end - start).total_seconds()
+    for width in sorted(BUCKET_WIDTHS.values()):
+        if seconds / width <= MAX_BUCKETS:
+            return width
+    return max(BUCKET_WIDTHS.values())
+
+
+def _ticks(low, high, count=5):
+    step = (high - low) / (count - 1)
+    return [low + step * i for i in range(count)]
+
+
+def _fmt(value):
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+
+def line_chart_svg(title, buckets, means, minimums, maximums, start, end, step, low=None, high=None, unit='', color='#333'):
+    """
+    SVG markup of one series: buckets are datetimes, the value lists are
+    parallel to them with None where the bucket has no data. step is the
+    bucket width; a missing bucket breaks the line.
+    """
+    values = [v for series in (means, minimums, maximums) for v in series if v is not None]
+    values += [v for v in (low, high) if v is not None]
+    if not values:
+        return ''
+
+    y_low, y_high = min(values), max(values)
+    if y_high - y_low < 1:
+        y_low, y_high = y_low - 0.5, y_high + 0.5
+    pad = (y_high - y_low) * 0.05
+    y_low, y_high = y_low - pad, y_high + pad
+
+    span = max((end - start).total_seconds(), 1)
+    plot_w = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    plot_h = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+
+    def x(ts):
+        return MARGIN_LEFT + plot_w * (ts - start).total_seconds() / span
+
+    def y(value):
+        return MARGIN_TOP + plot_h * (y_high - value) / (y_high - y_low)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+        f'viewBox="0 0 {WIDTH} {HEIGHT}" font-family="sans-serif" font-size="9">',
+        f'<text x="{MARGIN_LEFT}" y="13" font-size="11" font-weight="bold">{escape(title)}</text>',
+    ]
+
+    for tick in _ticks(y_low + pad, y_high - pad):
+        parts.append(
+            f'<line x1="{MARGIN_LEFT}" x2="{WIDTH - MARGIN_RIGHT}" y1="{y(tick):.1f}" y2="{y(tick):.1f}" stroke="#e5e5e5"/>'
+            f'<text x="{MARGIN_LEFT - 4}" y="{y(tick) + 3:.1f}" text-anchor="end">{_fmt(tick)}{escape(unit)}</text>'
+        )
+    for ts in (start, start + (end - start) / 2, end):
+        label = f"{ts:%Y-%m-%d %H:%M}" if span <= 2 * 86400 else f"{ts:%Y-%m-%d}"
+        anchor = 'start' if ts == start else 'end' if ts == end else 'middle'
+        parts.append(f'<text x="{x(ts):.1f}" y="{HEIGHT - 8}" text-anchor="{anchor}">{label}</text>')
+
+    # كل جزء متصل من غير فجوات بيترسم لوحده
+    segments, current, previous = [], [], None
+    for i, bucket in enumerate(buckets):
+        if means[i] is None:
+            continue
+        if current and bucket - previous > step:
+            segments.append(current)
+            current = []
+        current.append(i)
+        previous = bucket
+    if current:
+        segments.append(current)
+
+    for segment in segments:
+        band = [i for i in segment if minimums[i] is not None and maximums[i] is not None]
+        if len(band) > 1:
+            outline = [(x(buckets[i]), y(maximums[i])) for i in band] + [(x(buckets[i]), y(minimums[i])) for i in reversed(band)]
+            points = ' '.join(f"{px:.1f},{py:.1f}" for px, py in outline)
+            parts.append(f'<polygon points="{points}" fill="{color}" fill-opacity="0.15" stroke="none"/>')
+        points = ' '.join(f"{x(buckets[i]):.1f},{y(means[i]):.1f}" for i in segment)
+        if len(segment) == 1:
+            i = segment[0]
+            parts.append(f'<circle cx="{x(buckets[i]):.1f}" cy="{y(means[i]):.1f}" r="1.5" fill="{color}"/>')
+        else:
+            parts.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.2"/>')
+
+    for limit in (low, high):
+        if limit is not None:
+            parts.append(
+                f'<line x1="{MARGIN_LEFT}" x2="{WIDTH - MARGIN_RIGHT}" y1="{y(limit):.1f}" y2="{y(limit):.1f}" '
+                f'stroke="#f0ad4e" stroke-dasharray="4,3"/>'
+            )
+
+    parts.append(
+        f'<rect x="{MARGIN_LEFT}" y="{MARGIN_TOP}" width="{plot_w}" height="{plot_h}" fill="none" stroke="#999"/>'
+    )
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def device_charts(device, columns, start, end, width):
+    """{'temperature': svg, 'humidity': svg} for the sensors the device has, from bucket_columns output."""
+    buckets = columns['buckets']
+    step = timedelta(seconds=width)
+    charts = {}
+    sensors = (
+        ('temperature', 'Temperature', '°', device.has_temperature_sensor, device.min_temp, device.max_temp),
+        ('humidity', 'Humidity', '%', device.has_humidity_sensor, device.min_hum, device.max_hum),
+    )
+    for sensor, title, unit, present, low, high in sensors:
+        if present:
+            charts[sensor] = line_chart_svg(
+                title, buckets,
+                columns[f'{sensor}_avg'], columns[f'{sensor}_min'], columns[f'{sensor}_max'],
+                start, end, step, low, high, unit, COLORS[sensor],
+            )
+    return charts
@@ -0,0 +1,31 @@
+# device_details/report_worker.py
+"""
+Entry points of the report process pool. The pool starts its workers with
+"spawn", so this module must import without Django being set up yet.
+"""
+import os
+import django
+
+# الـ ready() بتاع logs و home بيشغلوا threads (offline checker، master clock) ملهاش لازمة في الـ worker
+WORKER_ENV = "DATA_LOGGER_REPORT_WORKER"
+
+
+def in_report_worker():
+    return os.environ.get(WORKER_ENV) == "1"
+
+
+def init_worker():
+    os.environ[WORKER_ENV] = "1"
+    django.setup()
+
+
+def render_job(job_id, readings=None):
+    from django.db import close_old_connections
+    from .reports import render_report
+
+    # الـ worker عايش طول عمر الـ pool، فالـ connection ممكن تكون اتقفلت من ناحية MySQL
+    close_old_connections()
+    try:
+        return render_report(job_id, readings)
+    finally:
+        close_old_connections()
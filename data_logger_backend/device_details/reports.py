@@ -0,0 +1,284 @@
+# device_details/reports.py
+"""
+PDF reports rendered off the request thread. A ReportJob row per
+(device, start, end, mode, TEMPLATE_VERSION) is both the job and the cache
+entry: the worker pool writes the PDF under REPORTS_DIR, and ingest bumps
+the row's generation when readings land in its range, so a repeat
+download is served from disk until the data behind it changes.
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from weasyprint import HTML, Attachment
+from home.utils import get_master_time
+from .archive import ReadingRow
+from .compliance import compliance_summary
+from .export import CSV, export_chunks
+from .models import Excursion, ReadingRollup, ReportJob
+from .report_charts import chart_width, device_charts
+from .report_worker import init_worker, render_job
+from .rollups import rollup_series
+from .storage import bucket_columns, readings_between
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = {
+    ReportJob.FULL: 'device_details/device_data_pdf.html',
+    ReportJob.SUMMARY: 'device_details/device_summary_pdf.html',
+}
+# زوّدها مع أي تغيير في الـ templates أو الـ context، فالتقارير القديمة متتخدمش تاني
+TEMPLATE_VERSION = 2
+FULL_MAX_DAYS = 1  # أطول من كده الـ auto mode بيختار summary
+MAX_EXCURSIONS = 200  # في جدول الـ summary
+RENDER_TIMEOUT = timedelta(minutes=10)  # running أكتر من كده = الـ worker مات
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def report_context(device, start, end, filter_date=None, readings=None):
+    """readings: the range's (timestamp, temperature, humidity) rows, oldest first, if already fetched."""
+    if readings is None:
+        readings = readings_between(device, start, end, newest_first=True)
+    else:
+        readings = [ReadingRow(*row) for row in reversed(readings)]
+    return {
+        'device': device,
+        'rows': [
+            {
+                'timestamp': r.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                'temperature': r.temperature,
+                'humidity': r.humidity
+            } for r in readings
+        ],
+        'hourly': rollup_series(device, ReadingRollup.HOUR, start, end),
+        'compliance': compliance_summary(device, start.date(), end.date()),
+        'filter_date': filter_date,
+        'now': get_master_time(),
+    }
+
+
+def summary_context(device, start, end, filter_date=None):
+    """
+    Context of the summary report: SVG charts from database-side buckets,
+    one row per day (rollup min/max/mean plus compliance) and the
+    excursion list. No raw readings, so the layout cost doesn't grow with
+    the number of readings.
+    """
+    width = chart_width(start, end)
+    columns = bucket_columns(device, width, start, end, ['avg', 'min', 'max'])
+
+    compliance = compliance_summary(device, start.date(), end.date())
+    compliance_days = {day['day']: day for day in compliance['days']}
+    days = []
+    for rollup in rollup_series(device, ReadingRollup.DAY, start, end):
+        day = f"{rollup.bucket:%Y-%m-%d}"
+        days.append({
+            'day': day,
+            'count': rollup.count,
+            'temp_min': rollup.temp_min,
+            'temp_max': rollup.temp_max,
+            'temp_avg': rollup.avg_temperature,
+            'hum_min': rollup.hum_min,
+            'hum_max': rollup.hum_max,
+            'hum_avg': rollup.avg_humidity,
+            'compliance': compliance_days.get(day),
+        })
+
+    excursions = list(
+        Excursion.objects.filter(device=device, start__lte=end)
+        .filter(Q(end__isnull=True) | Q(end__gte=start))
+        .order_by('start')[:MAX_EXCURSIONS + 1]
+    )
+
+    return {
+        'device': device,
+        'start': start,
+        'end': end,
+        'charts': device_charts(device, columns, start, end, width),
+        'days': days,
+        'compliance': compliance,
+        'excursions': excursions[:MAX_EXCURSIONS],
+        'more_excursions': len(excursions) > MAX_EXCURSIONS,
+        'filter_date': filter_date,
+        'now': get_master_time(),
+    }
+
+
+def pick_mode(mode, start, end):
+    """'auto' is the full table for short ranges and the summary for longer ones."""
+    if mode in TEMPLATES:
+        return mode
+    return ReportJob.FULL if (end - start).days < FULL_MAX_DAYS else ReportJob.SUMMARY
+
+
+def render_pdf(device, start, end, filter_date=None, mode=ReportJob.FULL, with_csv=False, readings=None):
+    """
+    PDF bytes of the report. with_csv embeds the raw readings of the range
+    as a CSV file attachment, written from the streaming export to a temp
+    file so it never sits in memory. readings (full mode only) skips the
+    report's own reading query.
+    """
+    if mode == ReportJob.FULL:
+        context = report_context(device, start, end, filter_date, readings)
+    else:
+        context = summary_context(device, start, end, filter_date)
+    html = HTML(string=render_to_string(TEMPLATES[mode], context))
+    if not with_csv:
+        return html.write_pdf()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"readings_{device.pk}_{start:%Y%m%d}_{end:%Y%m%d}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in export_chunks([device], start, end, CSV):
+                f.write(chunk)
+        return html.write_pdf(attachments=[Attachment(filename=path, description='Raw readings')])
+
+
+def report_path(job):
+    csv = '_csv' if job.with_csv else ''
+    return os.path.join(
+        settings.REPORTS_DIR, str(job.device_id),
+        f"{job.start:%Y%m%d%H%M%S}_{job.end:%Y%m%d%H%M%S}_{job.mode}{csv}_v{job.template_version}.pdf",
+    )
+
+
+def render_report(job_id, readings=None):
+    """Renders one job to its file. Runs in a pool worker, or inline from render_report_jobs."""
+    job = ReportJob.objects.select_related('device').get(pk=job_id)
+    # الـ generation وقت البداية: لو قراءات نزلت في المدى أثناء الرسم، النتيجة تبقى قديمة
+    generation = job.generation
+    ReportJob.objects.filter(pk=job_id).update(status=ReportJob.RUNNING, error='', started_at=timezone.now())
+
+    try:
+        # تقرير يوم واحد بيتعرض زي ?filter_date= في الـ endpoint القديم
+        filter_date = f"{job.start:%Y-%m-%d}" if job.start.date() == job.end.date() else None
+        pdf = render_pdf(job.device, job.start, job.end, filter_date, job.mode, job.with_csv, readings)
+        path = report_path(job)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.exception("Report job %s failed", job_id)
+        ReportJob.objects.filter(pk=job_id).update(status=ReportJob.FAILED, error=str(e), finished_at=timezone.now())
+        return False
+
+    ReportJob.objects.filter(pk=job_id).update(
+        status=ReportJob.DONE, rendered_generation=generation, path=path, finished_at=timezone.now(),
+    )
+    return True
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn مش fork: الـ worker مايورثش connections الداتابيز المفتوحة في الـ web process
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        return _pool
+
+
+def submit_report(job_id, readings=None):
+    """Future of rendering job_id on the pool."""
+    global _pool
+    try:
+        return _get_pool().submit(render_job, job_id, readings)
+    except BrokenProcessPool:
+        # worker مات (OOM مثلًا): pool جديد ونحاول تاني مرة واحدة
+        with _pool_lock:
+            _pool = None
+        return _get_pool().submit(render_job, job_id, readings)
+
+
+def prepare_report(device, start, end, user=None, mode=ReportJob.FULL, with_csv=False):
+    """
+    (job, render) for device/[start, end]/mode at the current template
+    version: render is False when the PDF is fresh or a render is running.
+    A job that needs rendering is put back to pending (one running past
+    RENDER_TIMEOUT included, in case the process that had it went away).
+    """
+    try:
+        with transaction.atomic():
+            job, created = ReportJob.objects.get_or_create(
+                device=device, start=start, end=end, mode=mode, with_csv=with_csv,
+                template_version=TEMPLATE_VERSION, defaults={'requested_by': user},
+            )
+    except IntegrityError:
+        job = ReportJob.objects.get(
+            device=device, start=start, end=end, mode=mode, with_csv=with_csv, template_version=TEMPLATE_VERSION,
+        )
+        created = False
+
+    if not created:
+        running = job.status == ReportJob.RUNNING and job.started_at and timezone.now() - job.started_at < RENDER_TIMEOUT
+        if (job.is_fresh and os.path.exists(job.path)) or running:
+            # ملف صالح أو رسم شغال دلوقتي: مفيش داعي نرسم تاني
+            return job, False
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.PENDING, error='', requested_by=user)
+        job.refresh_from_db()
+    return job, True
+
+
+def request_report(device, start, end, user=None, mode=ReportJob.FULL, with_csv=False):
+    """The ReportJob for device/[start, end]/mode, queued on the pool if it needs rendering."""
+    job, render = prepare_report(device, start, end, user, mode, with_csv)
+    if render:
+        transaction.on_commit(lambda: submit_report(job.pk))
+    return job
+
+
+def render_reports(job_ids):
+    """
+    Renders job_ids on the pool in parallel and waits for all of them.
+    A job whose worker died is left as it is; the caller reads the
+    outcome from the rows.
+    """
+    global _pool
+    futures = {submit_report(job_id): job_id for job_id in job_ids}
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except BrokenProcessPool:
+            logger.error("Report worker died while rendering job %s", futures[future])
+            with _pool_lock:
+                _pool = None
+        except Exception:
+            logger.exception("Report job %s failed", futures[future])
+
+
+def cached_report(device, start, end, mode=ReportJob.FULL, with_csv=False):
+    """Path of a fresh rendered PDF for device/[start, end], or None."""
+    job = ReportJob.objects.filter(
+        device=device, start=start, end=end, mode=mode, with_csv=with_csv, template_version=TEMPLATE_VERSION,
+    ).first()
+    if job and job.is_fresh and os.path.exists(job.path):
+        return job.path
+    return None
+
+
+def invalidate_reports(device, start, end):
+    """Marks the device's reports whose range overlaps [start, end] as out of date."""
+    ReportJob.objects.filter(device=device, start__lte=end, end__gte=start).update(generation=F('generation') + 1)
+
+
+def job_status(job):
+    """Status for the API: 'stale' when a finished PDF no longer matches the readings."""
+    if job.status == ReportJob.DONE and not job.is_fresh:
+        return 'stale'
+    return job.status
@@ -0,0 +1,119 @@
+# device_details/rollups.py
+from datetime import timedelta
+from django.db.models.functions import TruncDay, TruncHour
+from .archive import ReadingRow
+from .models import ReadingCompaction, ReadingRollup
+
+PERIODS = {
+    ReadingRollup.HOUR: (TruncHour, timedelta(hours=1)),
+    ReadingRollup.DAY: (TruncDay, timedelta(days=1)),
+}
+
+AGGREGATE_FIELDS = [
+    'count', 'temp_count', 'temp_sum', 'temp_min', 'temp_max',
+    'hum_count', 'hum_sum', 'hum_min', 'hum_max',
+]
+
+
+def bucket_start(period, ts):
+    if period == ReadingRollup.HOUR:
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def advance_raw_before(device, raw_before):
+    """Moves the device's raw_before watermark up to raw_before; never back."""
+    # قراءة متأخرة في فترة اتضغطت قبل كده ماترجعش الـ watermark لورا
+    compaction, _ = ReadingCompaction.objects.get_or_create(device=device)
+    if not compaction.raw_before or compaction.raw_before < raw_before:
+        compaction.raw_before = raw_before
+        compaction.save(update_fields=["raw_before", "updated_at"])
+
+
+def recompute_rollups(device, start, end):
+    """
+    Rebuilds the hour and day buckets of one device that touch [start, end]
+    from the raw readings in the reading store, so late or deleted readings
+    only cost the buckets they fall in. Call it inside the transaction that changed the readings.
+    Ranges already compacted by enforce_retention or moved out by
+    archive_readings are left alone.
+    """
+    from .storage import get_reading_store  # storage بيستورد PERIODS من هنا
+    store = get_reading_store()
+
+    watermarks = ReadingCompaction.objects.filter(device=device).values_list('raw_before', 'archived_before').first()
+    raw_before = max(filter(None, watermarks or ()), default=None)
+
+    for period, (_, width) in PERIODS.items():
+        first = bucket_start(period, start)
+        last = bucket_start(period, end) + width
+        if raw_before and first < raw_before:
+            # الـ raw اتمسح هنا، الـ rollup الموجود هو المرجع
+            first = raw_before
+            if first >= last:
+                continue
+
+        rows = store.rollup_rows(device, period, first, last)
+
+        if rows:
+            ReadingRollup.objects.bulk_create(
+                [ReadingRollup(device=device, period=period, **row) for row in rows],
+                update_conflicts=True,
+                unique_fields=['device', 'period', 'bucket'],
+                update_fields=AGGREGATE_FIELDS,
+            )
+
+        # buckets اتمسحت كل قراءاتها
+        ReadingRollup.objects.filter(
+            device=device, period=period, bucket__gte=first, bucket__lt=last,
+        ).exclude(bucket__in=[row['bucket'] for row in rows]).delete()
+
+
+def rollup_series(device, period, start, end):
+    """Rollup rows of one device whose bucket overlaps [start, end], oldest first."""
+    return list(
+        ReadingRollup.objects.filter(
+            device=device,
+            period=period,
+            bucket__gte=bucket_start(period, start),
+            bucket__lte=end,
+        ).order_by('bucket')
+    )
+
+
+def _rollup_rows(device, period, start, end, newest_first, limit):
+    qs = ReadingRollup.objects.filter(device=device, period=period, bucket__lt=end)
+    if start:
+        qs = qs.filter(bucket__gte=bucket_start(period, start))
+    qs = qs.order_by('-bucket' if newest_first else 'bucket')
+    if limit:
+        qs = qs[:limit]
+    return [ReadingRow(r.bucket, r.avg_temperature, r.avg_humidity, period=period) for r in qs]
+
+
+def downsampled_rows(device, start=None, end=None, newest_first=True, limit=None):
+    """
+    Readings-API rows for the part of [start, end] that enforce_retention
+    already compacted: hourly averages where only hourly rollups are left,
+    daily averages further back, as ReadingRow with period set.
+    """
+    compaction = ReadingCompaction.objects.filter(device=device).first()
+    if not compaction or not compaction.raw_before:
+        return []
+    if start and start >= compaction.raw_before:
+        return []
+
+    raw_before = min(end, compaction.raw_before) if end else compaction.raw_before
+    hourly_before = compaction.hourly_before
+
+    if not hourly_before:
+        return _rollup_rows(device, ReadingRollup.HOUR, start, raw_before, newest_first, limit)
+
+    hourly = []
+    if hourly_before < raw_before:
+        hourly_start = max(start, hourly_before) if start else hourly_before
+        hourly = _rollup_rows(device, ReadingRollup.HOUR, hourly_start, raw_before, newest_first, limit)
+    daily = _rollup_rows(device, ReadingRollup.DAY, start, min(hourly_before, raw_before), newest_first, limit)
+
+    rows = hourly + daily if newest_first else daily + hourly
+    return rows[:limit] if limit else rows
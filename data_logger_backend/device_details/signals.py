@@ -5,6 +5,7 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from home.models.device_model import Device
 from .models import DeviceReading
+from .rollups import recompute_rollups
 
 channel_layer = get_channel_layer()
 
@@ -39,23 +40,34 @@ def device_update_signal(sender, instance, **kwargs):
         'last_update': instance.last_update.strftime("%Y-%m-%d %H:%M:%S")
     }
     send_ws_update(group_name, data)
-    
-@receiver(post_save, sender=DeviceReading)
-def device_reading_signal(sender, instance, **kwargs):
-    group_name = f'device_{safe_group_name(instance.device.device_id)}'
-    
-    readings_item = {'timestamp': instance.timestamp.strftime("%Y-%m-%d %H:%M:%S")}
-    
-    if instance.device.has_temperature_sensor:
-        readings_item['temperature'] = instance.temperature
 
-    if instance.device.has_humidity_sensor:
-        readings_item['humidity'] = instance.humidity
+def reading_item(device, reading):
+    item = {'timestamp': reading.timestamp.strftime("%Y-%m-%d %H:%M:%S")}
+
+    if device.has_temperature_sensor:
+        item['temperature'] = reading.temperature
+
+    if device.has_humidity_sensor:
+        item['humidity'] = reading.humidity
 
+    return item
+
+def send_readings_batch(device, readings):
+    """رسالة واحدة لكل دفعة قراءات بدل رسالة لكل قراءة (bulk_create مش بيبعت post_save)"""
+    group_name = f'device_{safe_group_name(device.device_id)}'
     data = {
         'type': 'readings',
-        'device_id': instance.device.device_id,
-        'last_update': instance.device.last_update.strftime("%Y-%m-%d %H:%M:%S"),
-        'readings': [readings_item]  # ✅ دايمًا array
+        'device_id': device.device_id,
+        'last_update': device.last_update.strftime("%Y-%m-%d %H:%M:%S"),
+        'readings': [reading_item(device, r) for r in readings]
     }
     send_ws_update(group_name, data)
+    
+@receiver(post_save, sender=DeviceReading)
+def device_reading_signal(sender, instance, **kwargs):
+    send_readings_batch(instance.device, [instance])  # ✅ دايمًا array
+
+@receiver(post_save, sender=DeviceReading)
+def reading_rollup_signal(sender, instance, **kwargs):
+    # القراءات اللي بتتسجل واحدة واحدة (bulk ingest بيحدث الـ rollups بنفسه)
+    recompute_rollups(instance.device, instance.timestamp, instance.timestamp)
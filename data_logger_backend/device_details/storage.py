@@ -0,0 +1,577 @@
+# device_details/storage.py
+"""
+Where raw readings live. READING_STORE picks the backend:
+
+    "table"   one DeviceReading row per reading (default)
+    "chunks"  one ReadingChunk row per device-hour, see chunk_codec
+
+Ingest, rollups and the device views only go through get_reading_store()
+and readings_between(), so switching the setting switches all of them.
+Existing rows are not converted.
+"""
+import heapq
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from .aggregation import EPOCH, SENSORS, aggregate, reading_arrays, stats_columns
+from .archive import COLUMNS, ReadingRow, archived_readings, month_start
+from .chunk_codec import decode_chunk, encode_chunk
+from .expressions import BucketStart, PopulationStdDev
+from .models import DeviceReading, ReadingArchive, ReadingChunk, ReadingRollup
+from .rollups import PERIODS, bucket_start, downsampled_rows
+
+
+class TableReadingStore:
+    """One DeviceReading row per reading."""
+
+    def append(self, batches):
+        """
+        Stores the readings of [(device, rows)] that are not stored yet, with
+        one bulk insert, and returns the new readings of each batch. rows are
+        (timestamp, temperature, humidity) sorted by timestamp. Call inside
+        a transaction.
+        """
+        created = [self._new_readings(device, rows) for device, rows in batches]
+        all_readings = [r for readings in created for r in readings]
+        if all_readings:
+            # ignore_conflicts يغطي أي طلب متزامن لنفس الدفعة
+            DeviceReading.objects.bulk_create(all_readings, ignore_conflicts=True)
+        return created
+
+    def _new_readings(self, device, rows):
+        # آخر قراءة لكل timestamp جوه نفس الدفعة
+        unique_rows = {ts: (ts, t, h) for ts, t, h in rows}
+
+        existing = set()
+        if unique_rows:
+            existing = set(
+                DeviceReading.objects.filter(
+                    device=device,
+                    timestamp__gte=rows[0][0],
+                    timestamp__lte=rows[-1][0],
+                ).values_list('timestamp', flat=True)
+            )
+
+        return [
+            DeviceReading(device=device, temperature=t, humidity=h, timestamp=ts)
+            for ts, t, h in unique_rows.values()
+            if ts not in existing
+        ]
+
+    def range(self, device, start=None, end=None, newest_first=False):
+        readings = DeviceReading.objects.filter(device=device)
+        if start:
+            readings = readings.filter(timestamp__gte=start)
+        if end:
+            readings = readings.filter(timestamp__lte=end)
+        return readings.order_by('-timestamp' if newest_first else 'timestamp')
+
+    def latest(self, device, limit):
+        return list(DeviceReading.objects.filter(device=device).order_by('-timestamp')[:limit])
+
+    def bounds(self, device, before=None):
+        """(first, last) timestamp of the device's stored readings, only those before `before` if given."""
+        readings = DeviceReading.objects.filter(device=device)
+        if before:
+            readings = readings.filter(timestamp__lt=before)
+        bounds = readings.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        return bounds['first'], bounds['last']
+
+    def count_before(self, device, before):
+        return DeviceReading.objects.filter(device=device, timestamp__lt=before).count()
+
+    def snapshot(self, device, start, end):
+        """
+        The readings of [start, end) oldest first, plus the keys that make
+        delete_snapshot remove exactly those and nothing stored since.
+        """
+        rows = list(
+            DeviceReading.objects.filter(device=device, timestamp__gte=start, timestamp__lt=end)
+            .order_by('timestamp').values_list('pk', *COLUMNS)
+        )
+        return [row[1:] for row in rows], [row[0] for row in rows]
+
+    def delete_snapshot(self, keys, chunk_size):
+        for i in range(0, len(keys), chunk_size):
+            with transaction.atomic():
+                DeviceReading.objects.filter(pk__in=keys[i:i + chunk_size]).delete()
+
+    def delete_range(self, device, start, end, chunk_size):
+        """Deletes the readings of [start, end), chunk_size rows per transaction. Returns how many."""
+        readings = DeviceReading.objects.filter(device=device, timestamp__gte=start, timestamp__lt=end)
+        removed = 0
+        while True:
+            ids = list(readings.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return removed
+            with transaction.atomic():
+                deleted, _ = DeviceReading.objects.filter(pk__in=ids).delete()
+            removed += deleted
+
+    def range_many(self, devices, start, end):
+        """{device pk: [(timestamp, temperature, humidity)]} of several devices, oldest first, in one query."""
+        rows = (
+            DeviceReading.objects.filter(device__in=devices, timestamp__gte=start, timestamp__lte=end)
+            .order_by('device', 'timestamp')
+            .values_list('device', *COLUMNS)
+        )
+        return {pk: [row[1:] for row in group] for pk, group in groupby(rows, key=itemgetter(0))}
+
+    def stream(self, device, start=None, end=None, chunk_size=2000):
+        """
+        (timestamp, temperature, humidity) tuples, oldest first, fetched in
+        keyset batches: constant memory even on MySQL, whose driver buffers
+        the whole result of a plain .iterator().
+        """
+        readings = self.range(device, start, end).values_list(*COLUMNS)
+        last = None
+        while True:
+            batch = list((readings.filter(timestamp__gt=last) if last else readings)[:chunk_size])
+            yield from batch
+            if len(batch) < chunk_size:
+                return
+            last = batch[-1][0]
+
+    def page(self, device, start, end, cursor, newest_first, limit):
+        """Up to limit rows past cursor = (timestamp, id), via the (device, timestamp) index."""
+        readings = self.range(device, start, end)
+        if cursor:
+            ts, pk = cursor
+            if newest_first:
+                readings = readings.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=pk))
+            else:
+                readings = readings.filter(Q(timestamp__gt=ts) | Q(timestamp=ts, id__gt=pk))
+        order = ('-timestamp', '-id') if newest_first else ('timestamp', 'id')
+        return [ReadingRow(*r) for r in readings.order_by(*order).values_list(*COLUMNS, 'id')[:limit]]
+
+    def rollup_rows(self, device, period, start, end):
+        """Aggregates of [start, end) per bucket, in the ReadingRollup field names."""
+        trunc, _ = PERIODS[period]
+        return list(
+            DeviceReading.objects.filter(device=device, timestamp__gte=start, timestamp__lt=end)
+            .annotate(bucket=trunc('timestamp'))
+            .values('bucket')
+            .annotate(
+                count=Count('id'),
+                temp_count=Count('temperature'),
+                temp_sum=Sum('temperature'),
+                temp_min=Min('temperature'),
+                temp_max=Max('temperature'),
+                hum_count=Count('humidity'),
+                hum_sum=Sum('humidity'),
+                hum_min=Min('humidity'),
+                hum_max=Max('humidity'),
+            )
+            .order_by()
+        )
+
+    def bucket_columns(self, device, width, start, end, metrics):
+        """
+        Per-bucket metrics of [start, end] as parallel lists (see
+        aggregation.stats_columns), grouped by the database in one query.
+        """
+        rows = (
+            DeviceReading.objects.filter(device=device, timestamp__gte=start, timestamp__lte=end)
+            .annotate(bucket=BucketStart('timestamp', width))
+            .values('bucket')
+            .annotate(**{
+                f'{sensor}_{metric}': DATABASE_METRICS[metric](sensor)
+                for sensor in SENSORS for metric in metrics
+            })
+            .order_by('bucket')
+        )
+        columns = {'buckets': []}
+        columns.update((f'{sensor}_{metric}', []) for sensor in SENSORS for metric in metrics)
+        for row in rows:
+            for key, values in columns.items():
+                values.append(row['bucket' if key == 'buckets' else key])
+        return columns
+
+    def bucket_values(self, devices, width, start, end, metric):
+        """
+        {(device pk, bucket): (temperature, humidity)} of one metric for
+        several devices, grouped by the database in one query.
+        """
+        aggregate_function = DATABASE_METRICS[metric]
+        rows = (
+            DeviceReading.objects.filter(device__in=devices, timestamp__gte=start, timestamp__lte=end)
+            .annotate(bucket=BucketStart('timestamp', width))
+            .values('device', 'bucket')
+            .annotate(t=aggregate_function('temperature'), h=aggregate_function('humidity'))
+            .values_list('device', 'bucket', 't', 'h')
+            .order_by()
+        )
+        return {(device, bucket): (t, h) for device, bucket, t, h in rows}
+
+
+DATABASE_METRICS = {
+    'avg': Avg,
+    'min': Min,
+    'max': Max,
+    'std': PopulationStdDev,  # population، زي aggregation.series_stats
+    'count': Count,
+}
+
+
+class ChunkReadingStore:
+    """One ReadingChunk per device-hour; values are kept to 0.01."""
+
+    def append(self, batches):
+        return [self._append(device, rows) for device, rows in batches]
+
+    def _append(self, device, rows):
+        if not rows:
+            return []
+
+        unique_rows = {ts: (ts, t, h) for ts, t, h in rows}
+        by_hour = {
+            hour: list(group)
+            for hour, group in groupby(unique_rows.values(), key=lambda row: bucket_start(ReadingRollup.HOUR, row[0]))
+        }
+
+        # الـ chunks الناقصة تتعمل فاضية الأول، فالـ select_for_update يقفلها كلها
+        # وطلبين لنفس الساعة مايعملوش chunk مرتين
+        ReadingChunk.objects.bulk_create(
+            [ReadingChunk(device=device, hour=hour, data=encode_chunk(hour, [])) for hour in by_hour],
+            ignore_conflicts=True,
+        )
+
+        created = []
+        changed = []
+        for chunk in ReadingChunk.objects.select_for_update().filter(device=device, hour__in=list(by_hour)):
+            stored = decode_chunk(chunk.hour, chunk.data)
+            existing = {row[0] for row in stored}
+            new = [row for row in by_hour[chunk.hour] if row[0] not in existing]
+            if not new:
+                continue
+
+            self._encode(chunk, sorted(stored + new, key=lambda row: row[0]), chunk.sealed)
+            changed.append(chunk)
+            created.extend(ReadingRow(*row) for row in new)
+
+        if changed:
+            ReadingChunk.objects.bulk_update(changed, ['count', 'first_timestamp', 'last_timestamp', 'data'])
+
+        # الساعات اللي قبل أحدث ساعة وصلت مش هيتضاف لها غير قراءة متأخرة
+        self.seal(device, before=max(by_hour))
+
+        created.sort(key=lambda r: r.timestamp)
+        return created
+
+    def _encode(self, chunk, rows, sealed):
+        chunk.count = len(rows)
+        chunk.first_timestamp = rows[0][0] if rows else None
+        chunk.last_timestamp = rows[-1][0] if rows else None
+        chunk.sealed = sealed
+        chunk.data = encode_chunk(chunk.hour, rows, sealed=sealed)
+
+    def seal(self, device, before):
+        chunks = list(ReadingChunk.objects.filter(device=device, sealed=False, hour__lt=before))
+        for chunk in chunks:
+            self._encode(chunk, decode_chunk(chunk.hour, chunk.data), sealed=True)
+        if chunks:
+            ReadingChunk.objects.bulk_update(chunks, ['sealed', 'data'])
+
+    def _chunks(self, device, start, end):
+        chunks = ReadingChunk.objects.filter(device=device, count__gt=0)
+        if start:
+            chunks = chunks.filter(last_timestamp__gte=start)
+        if end:
+            chunks = chunks.filter(first_timestamp__lte=end)
+        return chunks.only('hour', 'data')
+
+    def range(self, device, start=None, end=None, newest_first=False):
+        rows = []
+        for chunk in self._chunks(device, start, end).order_by('hour').iterator():
+            rows.extend(
+                ReadingRow(*row) for row in decode_chunk(chunk.hour, chunk.data)
+                if (start is None or row[0] >= start) and (end is None or row[0] <= end)
+            )
+        if newest_first:
+            rows.reverse()
+        return rows
+
+    def latest(self, device, limit):
+        rows = []
+        for chunk in self._chunks(device, None, None).order_by('-hour').iterator():
+            rows.extend(ReadingRow(*row) for row in reversed(decode_chunk(chunk.hour, chunk.data)))
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
+
+    # الـ maintenance commands بتقطع على حدود يوم أو شهر، فالـ chunk (ساعة) يا جوه يا برا
+    def bounds(self, device, before=None):
+        chunks = ReadingChunk.objects.filter(device=device, count__gt=0)
+        if before:
+            chunks = chunks.filter(hour__lt=before)
+        bounds = chunks.aggregate(first=Min('first_timestamp'), last=Max('last_timestamp'))
+        return bounds['first'], bounds['last']
+
+    def count_before(self, device, before):
+        return ReadingChunk.objects.filter(device=device, hour__lt=before).aggregate(n=Sum('count'))['n'] or 0
+
+    def snapshot(self, device, start, end):
+        rows, keys = [], []
+        for chunk in ReadingChunk.objects.filter(device=device, hour__gte=start, hour__lt=end, count__gt=0).order_by('hour'):
+            rows.extend(decode_chunk(chunk.hour, chunk.data))
+            # chunk اتضاف لها قراءة متأخرة بعد القراية ماتتمسحش؛ تستنى التشغيل الجاي
+            keys.append((chunk.pk, chunk.count))
+        return rows, keys
+
+    def delete_snapshot(self, keys, chunk_size):
+        batch = max(1, chunk_size // 60)
+        for i in range(0, len(keys), batch):
+            with transaction.atomic():
+                for pk, count in keys[i:i + batch]:
+                    ReadingChunk.objects.filter(pk=pk, count=count).delete()
+
+    def delete_range(self, device, start, end, chunk_size):
+        chunks = ReadingChunk.objects.filter(device=device, hour__gte=start, hour__lt=end)
+        batch = max(1, chunk_size // 60)
+        removed = 0
+        while True:
+            rows = list(chunks.order_by('pk').values_list('pk', 'count')[:batch])
+            if not rows:
+                return removed
+            with transaction.atomic():
+                ReadingChunk.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+            removed += sum(count for _, count in rows)
+
+    def range_many(self, devices, start, end):
+        chunks = (
+            ReadingChunk.objects.filter(device__in=devices, count__gt=0, last_timestamp__gte=start, first_timestamp__lte=end)
+            .order_by('device', 'hour')
+            .only('device', 'hour', 'data')
+        )
+        rows = {}
+        for chunk in chunks.iterator():
+            rows.setdefault(chunk.device_id, []).extend(
+                row for row in decode_chunk(chunk.hour, chunk.data) if start <= row[0] <= end
+            )
+        return rows
+
+    def stream(self, device, start=None, end=None, chunk_size=2000):
+        chunks = self._chunks(device, start, end).order_by('hour')
+        batch_size = max(1, chunk_size // 60)  # chunk فيها ساعة، تقريبًا 60 قراءة
+        last = None
+        while True:
+            batch = list((chunks.filter(hour__gt=last) if last else chunks)[:batch_size])
+            for chunk in batch:
+                for row in decode_chunk(chunk.hour, chunk.data):
+                    if (start is None or row[0] >= start) and (end is None or row[0] <= end):
+                        yield row
+            if len(batch) < batch_size:
+                return
+            last = batch[-1].hour
+
+    def page(self, device, start, end, cursor, newest_first, limit):
+        if cursor:
+            # الصف اللي عند الـ cursor نفسه بيتشال في page_readings
+            start, end = (start, cursor[0]) if newest_first else (cursor[0], end)
+
+        rows = []
+        chunks = self._chunks(device, start, end).order_by('-hour' if newest_first else 'hour')
+        for chunk in chunks.iterator():
+            decoded = decode_chunk(chunk.hour, chunk.data)
+            rows.extend(
+                ReadingRow(*row) for row in (reversed(decoded) if newest_first else decoded)
+                if (start is None or row[0] >= start) and (end is None or row[0] <= end)
+            )
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
+
+    def rollup_rows(self, device, period, start, end):
+        buckets = {}
+        for r in self.range(device, start, end - timedelta(microseconds=1)):
+            bucket = bucket_start(period, r.timestamp)
+            row = buckets.get(bucket)
+            if row is None:
+                row = buckets[bucket] = {
+                    'bucket': bucket, 'count': 0,
+                    'temp_count': 0, 'temp_sum': None, 'temp_min': None, 'temp_max': None,
+                    'hum_count': 0, 'hum_sum': None, 'hum_min': None, 'hum_max': None,
+                }
+            row['count'] += 1
+            for prefix, value in (('temp', r.temperature), ('hum', r.humidity)):
+                if value is None:
+                    continue
+                row[f'{prefix}_count'] += 1
+                row[f'{prefix}_sum'] = value if row[f'{prefix}_sum'] is None else row[f'{prefix}_sum'] + value
+                row[f'{prefix}_min'] = value if row[f'{prefix}_min'] is None else min(row[f'{prefix}_min'], value)
+                row[f'{prefix}_max'] = value if row[f'{prefix}_max'] is None else max(row[f'{prefix}_max'], value)
+        return list(buckets.values())
+
+    def bucket_columns(self, device, width, start, end, metrics):
+        # الـ chunks مضغوطة فالداتابيز ماتقدرش تجمّعها؛ NumPy على القراءات المفكوكة
+        starts, *stats = aggregate(*reading_arrays(self.range(device, start, end)), width)
+        return stats_columns(starts, stats, metrics)
+
+    def bucket_values(self, devices, width, start, end, metric):
+        values = {}
+        for device in devices:
+            values.update(_column_values(device, self.bucket_columns(device, width, start, end, [metric]), metric))
+        return values
+
+
+def _column_values(device, columns, metric):
+    return {
+        (device.pk, bucket): (t, h)
+        for bucket, t, h in zip(columns['buckets'], columns[f'temperature_{metric}'], columns[f'humidity_{metric}'])
+    }
+
+
+STORES = {
+    "table": TableReadingStore,
+    "chunks": ChunkReadingStore,
+}
+
+
+def get_reading_store(name=None):
+    name = name or getattr(settings, "READING_STORE", "table")
+    try:
+        return STORES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown READING_STORE backend: {name}")
+
+
+def readings_between(device, start=None, end=None, newest_first=False):
+    """
+    Raw readings of one device in [start, end] from the reading store and
+    the archive together. Returns the store's result as is (a queryset for
+    the table store) when nothing archived falls in the range.
+    """
+    live = get_reading_store().range(device, start, end, newest_first)
+
+    archived = list(archived_readings(device, start, end))
+    if not archived:
+        return live
+
+    if isinstance(live, list):
+        rows = archived + live
+    else:
+        rows = archived + [ReadingRow(*r) for r in live.values_list(*COLUMNS)]
+    rows.sort(key=lambda r: r.timestamp, reverse=newest_first)
+    return rows
+
+
+def bucket_columns(device, width, start, end, metrics):
+    """
+    Per-bucket metrics of a device's raw readings in [start, end] as
+    parallel lists. The reading store does the grouping (in the database
+    for the table store); ranges that reach into the archive are grouped
+    with NumPy over store and archive together.
+    """
+    if next(archived_readings(device, start, end), None) is None:
+        return get_reading_store().bucket_columns(device, width, start, end, metrics)
+
+    starts, *stats = aggregate(*reading_arrays(readings_between(device, start, end)), width)
+    return stats_columns(starts, stats, metrics)
+
+
+def aligned_buckets(devices, width, start, end, metric='avg'):
+    """
+    One metric of several devices on a shared grid of `width`-second
+    buckets covering [start, end]: (bucket starts, temperature matrix,
+    humidity matrix), one row per device in the given order and None where
+    a device has no value. Devices with nothing archived in the range are
+    grouped together in a single store query.
+    """
+    archived = set(
+        ReadingArchive.objects.filter(device__in=devices, month__gte=month_start(start), month__lte=end.date())
+        .values_list('device', flat=True)
+    )
+
+    live = [device for device in devices if device.pk not in archived]
+    values = get_reading_store().bucket_values(live, width, start, end, metric) if live else {}
+    for device in devices:
+        if device.pk in archived:
+            values.update(_column_values(device, bucket_columns(device, width, start, end, [metric]), metric))
+
+    step = timedelta(seconds=width)
+    bucket = EPOCH + (start - EPOCH) // step * step
+    buckets = []
+    while bucket <= end:
+        buckets.append(bucket)
+        bucket += step
+
+    missing = (None, None)
+    temperature = [[values.get((device.pk, b), missing)[0] for b in buckets] for device in devices]
+    humidity = [[values.get((device.pk, b), missing)[1] for b in buckets] for device in devices]
+    return buckets, temperature, humidity
+
+
+def readings_by_device(devices, start, end):
+    """
+    {device pk: [(timestamp, temperature, humidity)]} of several devices in
+    [start, end], oldest first. Devices with nothing archived in the range
+    are read together in a single store query.
+    """
+    archived = set(
+        ReadingArchive.objects.filter(device__in=devices, month__gte=month_start(start), month__lte=end.date())
+        .values_list('device', flat=True)
+    )
+
+    live = [device for device in devices if device.pk not in archived]
+    rows = get_reading_store().range_many(live, start, end) if live else {}
+    for device in devices:
+        if device.pk in archived:
+            rows[device.pk] = [tuple(row) for row in stream_readings(device, start, end)]
+    return rows
+
+
+def page_readings(device, start=None, end=None, cursor=None, newest_first=True, limit=100):
+    """
+    One keyset page of a device's readings in [start, end] from every
+    source: the reading store, the archive and the downsampled rollups of
+    compacted ranges. Rows are ordered by (timestamp, id) and start after
+    cursor, the (timestamp, id) of the last row already returned. Each
+    source reads at most limit + 2 rows, so a page costs the same at any
+    depth. Returns up to limit + 1 rows; the extra one means there is more.
+    """
+    wanted = limit + 2
+    bound = cursor[0] if cursor else None
+    source_start, source_end = (start, bound or end) if newest_first else (bound or start, end)
+
+    sources = [
+        get_reading_store().page(device, start, end, cursor, newest_first, wanted),
+        islice(archived_readings(device, source_start, source_end, newest_first), wanted),
+        downsampled_rows(device, source_start, source_end, newest_first, wanted),
+    ]
+
+    def key(row):
+        return (row.timestamp, row.id)
+
+    rows = heapq.merge(*sources, key=key, reverse=newest_first)
+    if cursor:
+        rows = (row for row in rows if (key(row) < cursor if newest_first else key(row) > cursor))
+    return list(islice(rows, limit + 1))
+
+
+def stream_readings(device, start=None, end=None, chunk_size=2000):
+    """
+    Every raw reading of one device in [start, end], oldest first, from the
+    archive and the reading store, as (timestamp, temperature, humidity)
+    tuples. Lazy on both sides, so memory does not grow with the range.
+    """
+    return heapq.merge(
+        archived_readings(device, start, end),
+        get_reading_store().stream(device, start, end, chunk_size),
+        key=lambda row: row[0],
+    )
+
+
+def series_rows(device, start=None, end=None):
+    """
+    Everything a chart of [start, end] shows, oldest first, as ReadingRow:
+    the downsampled averages of compacted ranges, then the raw readings.
+    """
+    rows = heapq.merge(
+        downsampled_rows(device, start, end, newest_first=False),
+        stream_readings(device, start, end),
+        key=lambda row: row[0],
+    )
+    return [row if isinstance(row, ReadingRow) else ReadingRow(*row) for row in rows]
@@ -1,3 +1,89 @@
+import gc
+from datetime import datetime, timedelta
 from django.test import TestCase
+from authentication.models import CustomUser
+from home.ingest import ingest_readings
+from home.models.departments import Department
+from home.models.device_model import Device
+from home.utils import get_master_time
+from .export import CSV, export_chunks
+from .management.commands.bench_export import Command as BenchExport, current_rss
+from .models import Excursion
 
-# Create your tests here.
+
+def make_device(device_id="T:01", admin=None):
+    if admin is None:
+        department = Department.objects.create(name="Cold room")
+        admin = CustomUser.objects.create_user(username="admin", password="p", role="admin", department=department)
+    return Device.objects.create(
+        admin=admin, device_id=device_id, department=admin.department, last_update=get_master_time(),
+        battery_level=80, min_temp=10, max_temp=40, min_hum=20, max_hum=70,
+    )
+
+
+class ExcursionRebuildTests(TestCase):
+    def setUp(self):
+        self.device = make_device()
+        self.day = datetime(2026, 1, 5)
+
+    def at(self, hour, minute):
+        return self.day.replace(hour=hour, minute=minute)
+
+    def test_late_reading_with_overlapping_metrics(self):
+        # رطوبة برا الحد 09:50–10:10، حرارة برا الحد 10:00–10:30
+        rows = [
+            (self.at(9, 45), 20.0, 50.0),
+            (self.at(9, 50), 20.0, 80.0),
+            (self.at(10, 0), 50.0, 80.0),
+            (self.at(10, 5), 50.0, 80.0),
+            (self.at(10, 10), 50.0, 50.0),
+            (self.at(10, 20), 50.0, 50.0),
+            (self.at(10, 30), 20.0, 50.0),
+        ]
+        ingest_readings(self.device, rows)
+        # قراءة متأخرة جوه الاتنين: بتعيد الـ detection من أول excursion الحرارة
+        ingest_readings(self.device, [(self.at(10, 15), 50.0, 50.0)])
+
+        humidity = list(Excursion.objects.filter(device=self.device, metric=Excursion.HUMIDITY).values_list("start", "end"))
+        temperature = list(Excursion.objects.filter(device=self.device, metric=Excursion.TEMPERATURE).values_list("start", "end"))
+        self.assertEqual(humidity, [(self.at(9, 50), self.at(10, 10))])
+        self.assertEqual(temperature, [(self.at(10, 0), self.at(10, 30))])
+
+    def test_late_reading_matches_in_order_ingest(self):
+        rows = [(self.at(9, 0) + timedelta(minutes=5 * i), 50.0 if 3 <= i < 9 else 20.0, 80.0 if 1 <= i < 6 else 50.0)
+                for i in range(12)]
+        late = rows.pop(4)
+        ingest_readings(self.device, rows)
+        ingest_readings(self.device, [late])
+        rebuilt = list(Excursion.objects.order_by("metric", "start").values_list("metric", "start", "end", "peak"))
+
+        Excursion.objects.all().delete()
+        other = make_device("T:02", admin=self.device.admin)
+        ingest_readings(other, sorted(rows + [late]))
+        expected = list(Excursion.objects.order_by("metric", "start").values_list("metric", "start", "end", "peak"))
+        self.assertEqual(rebuilt, expected)
+
+
+class ExportMemoryTests(TestCase):
+    rows = 200_000
+    max_growth = 2 * 2**20
+
+    def test_export_streams_in_bounded_memory(self):
+        device = make_device()
+        start = datetime(2000, 1, 1)
+        BenchExport()._fill(device, start, self.rows)
+
+        gc.collect()
+        baseline = peak = current_rss()
+        lines = size = 0
+        for i, chunk in enumerate(export_chunks([device], start, start + timedelta(minutes=self.rows), CSV)):
+            lines += chunk.count("\n")
+            size += len(chunk)
+            if i % 20 == 0:
+                peak = max(peak, current_rss())
+        peak = max(peak, current_rss())
+
+        self.assertEqual(lines, self.rows + 1)
+        # الملف كله أكبر من الحد، فلو اتجمع في الذاكرة الـ test يقع
+        self.assertGreater(size, 2 * self.max_growth)
+        self.assertLess(peak - baseline, self.max_growth)
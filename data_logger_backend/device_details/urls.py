@@ -1,12 +1,21 @@
 from django.urls import path
-from .views import DeviceAPIView
+from .views import BulkReportsView, DeviceAPIView, ExcursionsView, ReadingsCompareView, ReadingsExportView, ReportJobView
 
 urlpatterns = [
     path('', DeviceAPIView.as_view(), name='add-device'),
+    path('export/', ReadingsExportView.as_view(), name='readings-export'),
+    path('compare/', ReadingsCompareView.as_view(), name='readings-compare'),
+    path('excursions/', ExcursionsView.as_view(), name='excursions'),
+    path('reports/bulk/', BulkReportsView.as_view(), name='reports-bulk'),
+    path('reports/<int:job_id>/', ReportJobView.as_view(), name='report-job'),
+    path('reports/<int:job_id>/download/', ReportJobView.as_view(), name='report-job-download'),
     path('<str:device_id>/', DeviceAPIView.as_view(), name='device-details'),
     path('<str:device_id>/averages/', DeviceAPIView.as_view(), name='device-averages'),
+    path('<str:device_id>/compliance/', DeviceAPIView.as_view(), name='device-compliance'),
+    path('<str:device_id>/aggregate/', DeviceAPIView.as_view(), name='device-aggregate'),
     path('<str:device_id>/readings/', DeviceAPIView.as_view(), name='device-readings'),
     path('<str:device_id>/dashboard/', DeviceAPIView.as_view(), name='device-dashboard'),
+    path('<str:device_id>/reports/', DeviceAPIView.as_view(), name='report-jobs'),
     path('<str:device_id>/download/', DeviceAPIView.as_view(), name='download-pdf'),
     path('<str:device_id>/auto-control/', DeviceAPIView.as_view(), name='auto-control'),
     path('<str:device_id>/toggle/', DeviceAPIView.as_view(), name='toggle-device'),
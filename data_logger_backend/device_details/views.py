@@ -1,50 +1,55 @@
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import status
-from django.utils.dateparse import parse_date
-from django.utils import timezone
-from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db.models import Q
+from django.urls import reverse
 from home.models.device_model import Device
-from home.utils import get_master_time
+from home.utils import get_master_time, get_user_devices
 from home.serializers import DeviceSerializer
-from .models import ControlFeaturePriority, DeviceControl, DeviceReading
-from collections import defaultdict
-from weasyprint import HTML
+from .models import ControlFeaturePriority, DeviceControl, Excursion, ReadingRollup, ReportJob
+from .rollups import rollup_series
+from .storage import aligned_buckets, bucket_columns, get_reading_store, readings_between, series_rows
+from .downsample import MAX_POINTS, MIN_POINTS, lttb_rows
+from .aggregation import BUCKET_WIDTHS, MAX_BUCKETS, METRICS, aggregate, nan_to_none, reading_arrays
+from .pagination import ReadingCursorPagination
+from .compliance import compliance_summary
+from .reports import cached_report, job_status, pick_mode, render_pdf, request_report
+from .export import CONTENT_TYPES, CSV, export_chunks
+from .bulk_reports import report_parts, zip_chunks
 from datetime import datetime, timedelta, time
+import math
+
+
+def parse_bound(value, end=False):
+    # YYYY-MM-DD أو datetime كامل؛ التاريخ لوحده في الـ end معناه آخر اليوم
+    day = parse_date(value)
+    if day:
+        return datetime.combine(day, time.max if end else time.min)
+    parsed = parse_datetime(value)
+    if not parsed:
+        raise ValueError(value)
+    return parsed.replace(tzinfo=None)
 
 
 class DeviceAPIView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    chart_hours = 24  # مدى ?max_points= لو مفيش filter_date أو start_date/end_date
     
     def calculate_hourly_averages(self, readings):
-        hourly_data = defaultdict(lambda: {'temp_sum': 0, 'hum_sum': 0, 'count': 0})
-
-        for r in readings:
-            ts = r.timestamp
-            if timezone.is_naive(ts):
-                ts = timezone.make_aware(ts, timezone.get_current_timezone())
-            hour_key = ts.replace(minute=0, second=0, microsecond=0)
-            hourly_data[hour_key]['temp_sum'] += r.temperature
-            hourly_data[hour_key]['hum_sum'] += r.humidity
-            hourly_data[hour_key]['count'] += 1
-
-        sorted_hours = sorted(hourly_data.keys())
-        labels = []
-        avg_temps = []
-        avg_hums = []
-
-        for hour in sorted_hours:
-            data = hourly_data[hour]
-            labels.append(hour.strftime("%Y-%m-%d %H:%M"))
-            avg_temps.append(data['temp_sum'] / data['count'])
-            avg_hums.append(data['hum_sum'] / data['count'])
-
-        return labels, avg_temps, avg_hums
+        labels, stats = self.bucket_stats(readings, BUCKET_WIDTHS['1h'])
+        return labels, nan_to_none(stats[0].mean), nan_to_none(stats[1].mean)
+
+    def bucket_stats(self, readings, width):
+        # NumPy على values_list بدل loop على ORM objects؛ الحساس الناقص = NaN
+        starts, temperature, humidity = aggregate(*reading_arrays(readings), width)
+        labels = [b.strftime("%Y-%m-%d %H:%M") for b in starts.astype(datetime)]
+        return labels, (temperature, humidity)
 
     def get_device(self, device_id, user=None):
         try:
@@ -61,6 +66,12 @@ class DeviceAPIView(APIView):
             # Device readings averages
             if 'averages' in request.path:
                 return self.device_readings_averages(request, device_id)
+            # Cold-chain compliance
+            elif 'compliance' in request.path:
+                return self.device_compliance(request, device_id)
+            # Bucketed aggregates
+            elif 'aggregate' in request.path:
+                return self.device_readings_aggregate(request, device_id)
             # Device details
             elif 'details' in request.path or request.path.endswith(f"/{device_id}/"):
                 return self.api_device_details(request, device_id)
@@ -91,8 +102,11 @@ class DeviceAPIView(APIView):
     # POST - Add device, toggle, update settings, etc.
     def post(self, request, device_id=None):
         if device_id:
+            # Queue a PDF report job
+            if 'reports' in request.path:
+                return self.create_report_job(request, device_id)
             # Toggle device
-            if 'toggle' in request.path:
+            elif 'toggle' in request.path:
                 return self.toggle_device(request, device_id)
             # Toggle schedule
             elif 'toggle-schedule' in request.path:
@@ -128,25 +142,69 @@ class DeviceAPIView(APIView):
         if not device:
             return Response({'error': 'Device not found'}, status=404)
 
-        last_reading = DeviceReading.objects.filter(device=device).order_by('-timestamp').first()
+        period = request.GET.get('period', ReadingRollup.HOUR)
+        if period not in (ReadingRollup.HOUR, ReadingRollup.DAY):
+            return Response({'error': 'period must be hour or day'}, status=400)
 
-        if last_reading:
-            end_time = last_reading.timestamp
-            start_time = end_time - timedelta(hours=12)
+        bucket = request.GET.get('bucket')
+        if bucket and bucket not in BUCKET_WIDTHS:
+            return Response({'error': f"bucket must be one of {', '.join(BUCKET_WIDTHS)}"}, status=400)
+
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+
+        if start_date and end_date:
+            sd = parse_date(start_date)
+            ed = parse_date(end_date)
+            if not sd or not ed:
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+            start_time = datetime.combine(sd, time.min)
+            end_time = datetime.combine(ed, time.max)
         else:
-            end_time = get_master_time()
-            start_time = end_time - timedelta(hours=12)
+            last_reading = get_reading_store().latest(device, 1)
 
-        readings = DeviceReading.objects.filter(
-            device=device,
-            timestamp__gte=start_time,
-            timestamp__lte=end_time
-        ).order_by('timestamp')
+            if last_reading:
+                end_time = last_reading[0].timestamp
+                start_time = end_time - timedelta(hours=12)
+            else:
+                end_time = get_master_time()
+                start_time = end_time - timedelta(hours=12)
+
+        if bucket:
+            # أي عرض bucket من القراءات نفسها، مع min/max/std/count
+            labels, stats = self.bucket_stats(readings_between(device, start_time, end_time), BUCKET_WIDTHS[bucket])
+            data = {
+                'device_name': device.name,
+                'bucket': bucket,
+                'labels': labels,
+                'avg_temperatures': nan_to_none(stats[0].mean),
+                'avg_humidities': nan_to_none(stats[1].mean),
+            }
+            for name, series in (('temperature', stats[0]), ('humidity', stats[1])):
+                data[f'{name}_stats'] = {
+                    'count': series.count.tolist(),
+                    'min': nan_to_none(series.min),
+                    'max': nan_to_none(series.max),
+                    'std': nan_to_none(series.std),
+                }
+            return Response(data)
+
+        # ✅ من جدول الـ rollups بدل ما نحمّل كل القراءات
+        rollups = rollup_series(device, period, start_time, end_time)
+
+        if rollups or period == ReadingRollup.DAY:
+            labels = [r.bucket.strftime("%Y-%m-%d %H:%M") for r in rollups]
+            avg_temps = [r.avg_temperature for r in rollups]
+            avg_hums = [r.avg_humidity for r in rollups]
+        else:
+            # قراءات قديمة قبل ما rebuild_rollups يشتغل
+            readings = readings_between(device, start_time, end_time)
 
-        labels, avg_temps, avg_hums = self.calculate_hourly_averages(readings)
+            labels, avg_temps, avg_hums = self.calculate_hourly_averages(readings)
 
         data = {
             'device_name': device.name,
+            'period': period,
             'labels': labels,
             'avg_temperatures': avg_temps,
             'avg_humidities': avg_hums,
@@ -154,6 +212,97 @@ class DeviceAPIView(APIView):
 
         return Response(data)
 
+    def device_compliance(self, request, device_id):
+        """
+        GET /device/<id>/compliance/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+
+        MKT, % time within min_temp/max_temp and excursion minutes per day
+        and over the range (the last 30 days by default), from the daily
+        rows ingest keeps up to date.
+        """
+        device = self.get_device(device_id)
+        if not device:
+            return Response({'error': 'Device not found'}, status=404)
+
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        last_day = parse_date(end_date) if end_date else get_master_time().date()
+        first_day = parse_date(start_date) if start_date else (last_day and last_day - timedelta(days=29))
+        if not first_day or not last_day:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+        if first_day > last_day:
+            return Response({'error': 'start_date must be before end_date'}, status=400)
+
+        return Response({
+            'device_id': device.device_id,
+            'device_name': device.name,
+            **compliance_summary(device, first_day, last_day),
+        })
+
+    def device_readings_aggregate(self, request, device_id):
+        """
+        GET /device/<id>/aggregate/?bucket=1h&start=...&end=...&metrics=avg,min,max
+
+        Per-bucket statistics as parallel arrays, grouped by the database
+        instead of shipping every reading to Python. Defaults: 1h buckets,
+        avg only, the 24 hours up to the latest reading.
+        """
+        device = self.get_device(device_id)
+        if not device:
+            return Response({'error': 'Device not found'}, status=404)
+
+        bucket = request.GET.get('bucket', '1h')
+        if bucket not in BUCKET_WIDTHS:
+            return Response({'error': f"bucket must be one of {', '.join(BUCKET_WIDTHS)}"}, status=400)
+        width = BUCKET_WIDTHS[bucket]
+
+        metrics = [m for m in request.GET.get('metrics', 'avg').split(',') if m]
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown or not metrics:
+            return Response({'error': f"metrics must be a comma separated list of {', '.join(METRICS)}"}, status=400)
+        metrics = list(dict.fromkeys(metrics))
+
+        start = request.GET.get('start')
+        end = request.GET.get('end')
+        try:
+            end_time = parse_bound(end, end=True) if end else None
+            start_time = parse_bound(start) if start else None
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS'}, status=400)
+
+        if end_time is None:
+            last_reading = get_reading_store().latest(device, 1)
+            end_time = last_reading[0].timestamp if last_reading else get_master_time()
+        if start_time is None:
+            start_time = end_time - timedelta(hours=24)
+        if start_time > end_time:
+            return Response({'error': 'start must be before end'}, status=400)
+        if (end_time - start_time).total_seconds() / width > MAX_BUCKETS:
+            return Response({'error': f'Too many buckets; at most {MAX_BUCKETS} per request, use a wider bucket'},
+                            status=400)
+
+        columns = bucket_columns(device, width, start_time, end_time, metrics)
+        columns['buckets'] = [b.strftime("%Y-%m-%d %H:%M") for b in columns['buckets']]
+        sensors = [
+            sensor for sensor, present in (('temperature', device.has_temperature_sensor),
+                                           ('humidity', device.has_humidity_sensor))
+            if present
+        ]
+
+        return Response({
+            'device_id': device.device_id,
+            'device_name': device.name,
+            'bucket': bucket,
+            'start': start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'end': end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'metrics': metrics,
+            'buckets': columns['buckets'],
+            **{
+                f'{sensor}_{metric}': columns[f'{sensor}_{metric}']
+                for sensor in sensors for metric in metrics
+            },
+        })
+
     def delete_device_api(self, request, device_id):
         device = self.get_device(device_id, request.user)
         if not device:
@@ -231,15 +380,13 @@ class DeviceAPIView(APIView):
         if not device:
             return Response({'error': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # جلب كل القراءات
-        readings = DeviceReading.objects.filter(device=device).order_by('-timestamp')
-
         # فلترة حسب single date أو range
         filter_date = request.GET.get('filter_date')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
 
         message = "All readings"
+        start_dt = end_dt = None
 
         try:
             if filter_date:
@@ -249,7 +396,7 @@ class DeviceAPIView(APIView):
                     raise ValueError("Invalid date format")
                 day_start = datetime.combine(fd, time.min)
                 day_end = datetime.combine(fd, time.max)
-                readings = readings.filter(timestamp__gte=day_start, timestamp__lte=day_end)
+                start_dt, end_dt = day_start, day_end
                 message = f"Readings for {fd.strftime('%Y-%m-%d')}"
 
             elif start_date and end_date:
@@ -260,12 +407,33 @@ class DeviceAPIView(APIView):
                     raise ValueError("Invalid date format")
                 start_dt = datetime.combine(sd, time.min)
                 end_dt = datetime.combine(ed, time.max)
-                readings = readings.filter(timestamp__gte=start_dt, timestamp__lte=end_dt)
                 message = f"Readings from {sd.strftime('%Y-%m-%d')} to {ed.strftime('%Y-%m-%d')}"
         except ValueError:
             return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, 
                             status=status.HTTP_400_BAD_REQUEST)
 
+        max_points = request.GET.get('max_points')
+        if max_points:
+            # للرسم: المدى كله متقلص بـ LTTB لعدد نقط ثابت، من غير صفحات
+            try:
+                max_points = int(max_points)
+                if not MIN_POINTS <= max_points <= MAX_POINTS:
+                    raise ValueError
+            except ValueError:
+                return Response({'error': f'max_points must be an integer between {MIN_POINTS} and {MAX_POINTS}'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if start_dt is None:
+                # من غير مدى: آخر chart_hours ساعة زي الـ WebSocket، مش تاريخ الجهاز كله في الذاكرة
+                start_dt = get_master_time() - timedelta(hours=self.chart_hours)
+                message = f"Readings of the last {self.chart_hours} hours"
+            readings = lttb_rows(series_rows(device, start_dt, end_dt), max_points)[::-1]
+            next_link = previous_link = None
+        else:
+            # صفحة واحدة بس من (الجدول الحي + الأرشيف + المتوسطات)، مش كل القراءات
+            paginator = ReadingCursorPagination()
+            readings = paginator.paginate(request, device, start_dt, end_dt)
+            next_link, previous_link = paginator.get_next_link(), paginator.get_previous_link()
+
         combined_data = [
             {
                 'timestamp': r.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
@@ -279,6 +447,10 @@ class DeviceAPIView(APIView):
             'device_name': device.name,
             'message': message,
             'readings': combined_data,
+            # الفترات اللي الـ retention مسح الـ raw بتاعها بترجع كمتوسطات
+            'downsampled': sum(1 for r in readings if r.period),
+            'next': next_link,
+            'previous': previous_link,
             'current_time': get_master_time().strftime("%Y-%m-%d %H:%M:%S")
         }
 
@@ -328,34 +500,53 @@ class DeviceAPIView(APIView):
             end_time = get_master_time()
             start_time = end_time - timedelta(hours=12)
 
-        readings = DeviceReading.objects.filter(
-            device=device,
-            timestamp__gte=start_time,
-            timestamp__lte=end_time
-        ).order_by('-timestamp')
-
-        data_rows = [
-            {
-                'timestamp': r.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                'temperature': r.temperature,
-                'humidity': r.humidity
-            } for r in readings
-        ]
-
-        context = {
-            'device': device,
-            'rows': data_rows,
-            'filter_date': filter_date,
-            'now': get_master_time(),
-        }
-
-        html_string = render_to_string('device_details/device_data_pdf.html', context)
-        pdf_file = HTML(string=html_string).write_pdf()
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
+        # نفس اليوم اتطلب قبل كده ومفيش قراءات جديدة فيه: من الـ cache
+        cached = cached_report(device, start_time, end_time) if filter_date else None
+        if cached:
+            response = FileResponse(open(cached, 'rb'), content_type='application/pdf')
+        else:
+            response = HttpResponse(render_pdf(device, start_time, end_time, filter_date), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="device_data_{device.device_id}.pdf"'
         return response
 
+    def create_report_job(self, request, device_id):
+        """
+        POST /device/<id>/reports/ {"filter_date": "YYYY-MM-DD"} or
+        {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"},
+        optional "mode": "full" | "summary" | "auto" (default) and "raw_csv": true
+
+        Queues the PDF report for the process pool and returns the job
+        (202), or the finished job (200) when an up-to-date PDF of the
+        same range is already on disk. Poll status_url, then download_url.
+        "summary" draws charts and daily tables instead of every reading;
+        "auto" picks it for ranges over a day. raw_csv embeds the raw
+        readings as a CSV attachment.
+        """
+        device = get_user_devices(request.user).filter(device_id=device_id).first()
+        if not device:
+            return Response({'error': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        filter_date = request.data.get('filter_date')
+        start_date = request.data.get('start_date', filter_date)
+        end_date = request.data.get('end_date', filter_date)
+        if not start_date or not end_date:
+            return Response({'error': 'filter_date or start_date and end_date are required'}, status=400)
+        sd, ed = parse_date(start_date), parse_date(end_date)
+        if not sd or not ed:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+        if sd > ed:
+            return Response({'error': 'start_date must be before end_date'}, status=400)
+
+        mode = request.data.get('mode', 'auto')
+        if mode not in ('auto', ReportJob.FULL, ReportJob.SUMMARY):
+            return Response({'error': 'mode must be auto, full or summary'}, status=400)
+        raw_csv = request.data.get('raw_csv', False)
+        with_csv = raw_csv is True or str(raw_csv).lower() in ('1', 'true', 'yes')
+
+        start_time, end_time = datetime.combine(sd, time.min), datetime.combine(ed, time.max)
+        job = request_report(device, start_time, end_time, request.user, pick_mode(mode, start_time, end_time), with_csv)
+        return Response(report_job_data(request, job), status=200 if job.is_fresh else 202)
+
     def auto_control_refresh(self, request, device_id):
         master_now = get_master_time()
         current_time = master_now.time()
@@ -605,4 +796,296 @@ class DeviceAPIView(APIView):
             return Response({'status': 'ok'}, status=200)
 
         except Device.DoesNotExist:
-            return Response({'error': 'Device not found'}, status=404)
\ No newline at end of file
+            return Response({'error': 'Device not found'}, status=404)
+
+class ReadingsExportView(APIView):
+    """
+    GET /device/export/?devices=ID1,ID2&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&output=csv|ndjson
+
+    Streams the raw readings of the user's devices (all of them if
+    `devices` is missing) as CSV or NDJSON. Memory stays flat whatever
+    the range, so multi-month and multi-device exports are fine.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        output = request.GET.get('output', CSV)
+        if output not in CONTENT_TYPES:
+            return Response({'error': 'output must be csv or ndjson'}, status=400)
+
+        start_dt = end_dt = None
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        if start_date or end_date:
+            sd = parse_date(start_date) if start_date else None
+            ed = parse_date(end_date) if end_date else None
+            if (start_date and not sd) or (end_date and not ed):
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+            start_dt = datetime.combine(sd, time.min) if sd else None
+            end_dt = datetime.combine(ed, time.max) if ed else None
+
+        devices = get_user_devices(request.user).order_by('device_id')
+        requested = [d for d in request.GET.get('devices', '').split(',') if d]
+        if requested:
+            devices = list(devices.filter(device_id__in=requested))
+            missing = sorted(set(requested) - {d.device_id for d in devices})
+            if missing:
+                return Response({'error': 'Device not found', 'devices': missing}, status=404)
+
+        response = StreamingHttpResponse(
+            export_chunks(devices, start_dt, end_dt, output),
+            content_type=CONTENT_TYPES[output],
+        )
+        stamp = get_master_time().strftime("%Y%m%d_%H%M%S")
+        response['Content-Disposition'] = f'attachment; filename="readings_{stamp}.{output}"'
+        return response
+
+
+def report_job_data(request, job):
+    data = {
+        'id': job.pk,
+        'device_id': job.device.device_id,
+        'start': job.start.strftime("%Y-%m-%d %H:%M:%S"),
+        'end': job.end.strftime("%Y-%m-%d %H:%M:%S"),
+        'mode': job.mode,
+        'raw_csv': job.with_csv,
+        'status': job_status(job),
+        'error': job.error or None,
+        'created_at': job.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        'finished_at': job.finished_at.strftime("%Y-%m-%d %H:%M:%S") if job.finished_at else None,
+        'status_url': request.build_absolute_uri(reverse('report-job', args=[job.pk])),
+        'download_url': None,
+    }
+    if job.is_fresh:
+        data['download_url'] = request.build_absolute_uri(reverse('report-job-download', args=[job.pk]))
+    return data
+
+
+class ReportJobView(APIView):
+    """
+    GET /device/reports/<job_id>/           status of a report job
+    GET /device/reports/<job_id>/download/  the PDF, once status is done
+
+    A finished report whose range got new readings turns 'stale'; POST
+    /device/<id>/reports/ again to render it with the new data.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = ReportJob.objects.select_related('device').filter(
+            pk=job_id, device__in=get_user_devices(request.user),
+        ).first()
+        if not job:
+            return Response({'error': 'Report not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not request.path.rstrip('/').endswith('download'):
+            return Response(report_job_data(request, job))
+
+        if not job.is_fresh:
+            return Response({'error': f'Report is {job_status(job)}', **report_job_data(request, job)},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            pdf = open(job.path, 'rb')
+        except OSError:
+            return Response({'error': 'Report file is missing, request it again'}, status=status.HTTP_410_GONE)
+        response = FileResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = (
+            f'attachment; filename="device_data_{job.device.device_id}_{job.start:%Y%m%d}_{job.end:%Y%m%d}.pdf"'
+        )
+        return response
+
+
+class BulkReportsView(APIView):
+    """
+    GET /device/reports/bulk/?department=<id>&devices=ID1,ID2&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        &mode=auto|full|summary
+
+    One ZIP with the PDF report of each of the user's devices (optionally
+    narrowed to a department or a device list), streamed as the reports
+    finish rendering. Defaults to the last 7 full days. Devices whose
+    report failed are listed in errors.txt inside the ZIP.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_devices = 200
+    default_days = 7
+
+    def get(self, request):
+        devices = get_user_devices(request.user)
+        requested = [d for d in request.GET.get('devices', '').split(',') if d]
+        if requested:
+            devices = devices.filter(device_id__in=requested)
+        department = request.GET.get('department')
+        if department:
+            try:
+                devices = devices.filter(department_id=int(department))
+            except ValueError:
+                return Response({'error': 'department must be a department id'}, status=400)
+        devices = list(devices.order_by('device_id'))
+        if not devices:
+            return Response({'error': 'No devices found'}, status=status.HTTP_404_NOT_FOUND)
+        if len(devices) > self.max_devices:
+            return Response({'error': f'At most {self.max_devices} devices per request'}, status=400)
+
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        # افتراضيًا آخر 7 أيام كاملة، فالطلب المتكرر بيلاقي نفس التقارير في الـ cache
+        yesterday = get_master_time().date() - timedelta(days=1)
+        sd = parse_date(start_date) if start_date else yesterday - timedelta(days=self.default_days - 1)
+        ed = parse_date(end_date) if end_date else yesterday
+        if not sd or not ed:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+        if sd > ed:
+            return Response({'error': 'start_date must be before end_date'}, status=400)
+
+        mode = request.GET.get('mode', 'auto')
+        if mode not in ('auto', ReportJob.FULL, ReportJob.SUMMARY):
+            return Response({'error': 'mode must be auto, full or summary'}, status=400)
+
+        start_time, end_time = datetime.combine(sd, time.min), datetime.combine(ed, time.max)
+        parts = report_parts(devices, start_time, end_time, pick_mode(mode, start_time, end_time), request.user)
+        response = StreamingHttpResponse(zip_chunks(parts, start_time, end_time), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="device_reports_{sd:%Y%m%d}_{ed:%Y%m%d}.zip"'
+        return response
+
+
+class ReadingsCompareView(APIView):
+    """
+    GET /device/compare/?devices=ID1,ID2&bucket=1h&start=...&end=...&metric=avg
+
+    One metric of several devices on a shared time grid, for comparison
+    charts: 'buckets' plus 'temperature' and 'humidity' matrices with one
+    row per entry of 'devices' and null where a device has no data.
+    Devices outside the caller's scope are reported as not found.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_devices = 20
+
+    def get(self, request):
+        requested = list(dict.fromkeys(d for d in request.GET.get('devices', '').split(',') if d))
+        if not requested:
+            return Response({'error': 'devices is required'}, status=400)
+        if len(requested) > self.max_devices:
+            return Response({'error': f'At most {self.max_devices} devices per request'}, status=400)
+
+        bucket = request.GET.get('bucket', '1h')
+        if bucket not in BUCKET_WIDTHS:
+            return Response({'error': f"bucket must be one of {', '.join(BUCKET_WIDTHS)}"}, status=400)
+        width = BUCKET_WIDTHS[bucket]
+
+        metric = request.GET.get('metric', 'avg')
+        if metric not in METRICS:
+            return Response({'error': f"metric must be one of {', '.join(METRICS)}"}, status=400)
+
+        start = request.GET.get('start')
+        end = request.GET.get('end')
+        try:
+            end_time = parse_bound(end, end=True) if end else get_master_time()
+            start_time = parse_bound(start) if start else end_time - timedelta(hours=24)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS'}, status=400)
+        if start_time > end_time:
+            return Response({'error': 'start must be before end'}, status=400)
+        if (end_time - start_time).total_seconds() / width > MAX_BUCKETS:
+            return Response({'error': f'Too many buckets; at most {MAX_BUCKETS} per request, use a wider bucket'},
+                            status=400)
+
+        # نفس نطاق الصلاحيات بتاع باقي الـ APIs: اللي برا الـ scope كأنه مش موجود
+        found = {d.device_id: d for d in get_user_devices(request.user).filter(device_id__in=requested)}
+        missing = [d for d in requested if d not in found]
+        if missing:
+            return Response({'error': 'Device not found', 'devices': missing}, status=404)
+        devices = [found[d] for d in requested]
+
+        buckets, temperature, humidity = aligned_buckets(devices, width, start_time, end_time, metric)
+
+        return Response({
+            'bucket': bucket,
+            'metric': metric,
+            'start': start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'end': end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'devices': [{'device_id': d.device_id, 'name': d.name} for d in devices],
+            'buckets': [b.strftime("%Y-%m-%d %H:%M") for b in buckets],
+            'temperature': temperature,
+            'humidity': humidity,
+        })
+
+
+class ExcursionsView(APIView):
+    """
+    GET /device/excursions/?devices=ID1,ID2&department=<id>&metric=temperature|humidity
+        &start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&min_minutes=N&limit=N
+
+    Excursions of the user's devices that overlap the range, newest first,
+    from the excursion index (no reading scan). Ongoing ones have a null end.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    default_limit = 500
+    max_limit = 5000
+
+    def get(self, request):
+        devices = get_user_devices(request.user)
+        requested = [d for d in request.GET.get('devices', '').split(',') if d]
+        if requested:
+            devices = devices.filter(device_id__in=requested)
+        department = request.GET.get('department')
+        if department:
+            try:
+                devices = devices.filter(department_id=int(department))
+            except ValueError:
+                return Response({'error': 'department must be a department id'}, status=400)
+
+        excursions = Excursion.objects.filter(device__in=devices).select_related('device')
+
+        metric = request.GET.get('metric')
+        if metric:
+            if metric not in dict(Excursion.METRIC_CHOICES):
+                return Response({'error': 'metric must be temperature or humidity'}, status=400)
+            excursions = excursions.filter(metric=metric)
+
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        sd = parse_date(start_date) if start_date else None
+        ed = parse_date(end_date) if end_date else None
+        if (start_date and not sd) or (end_date and not ed):
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+        if ed:
+            excursions = excursions.filter(start__lte=datetime.combine(ed, time.max))
+        if sd:
+            # أي excursion متداخل مع المدى، حتى لو بدأ قبله
+            excursions = excursions.filter(Q(end__isnull=True) | Q(end__gte=datetime.combine(sd, time.min)))
+
+        try:
+            min_minutes = float(request.GET.get('min_minutes', 0))
+            limit = int(request.GET.get('limit', self.default_limit))
+            # nan و inf بيعدّوا من float()، والرقم الكبير بيوقع timedelta
+            if limit < 1 or not math.isfinite(min_minutes) or min_minutes < 0:
+                raise ValueError
+            min_duration = timedelta(minutes=min_minutes)
+        except (ValueError, OverflowError):
+            return Response({'error': 'min_minutes and limit must be positive numbers'}, status=400)
+        if min_minutes:
+            excursions = excursions.filter(duration__gte=min_duration)
+        limit = min(limit, self.max_limit)
+
+        rows = list(excursions.order_by('-start')[:limit + 1])
+        return Response({
+            'excursions': [
+                {
+                    'device_id': e.device.device_id,
+                    'device_name': e.device.name,
+                    'metric': e.metric,
+                    'direction': e.direction,
+                    'start': e.start.strftime("%Y-%m-%d %H:%M:%S"),
+                    'end': e.end.strftime("%Y-%m-%d %H:%M:%S") if e.end else None,
+                    'peak': e.peak,
+                    'limit': e.limit,
+                    'duration_minutes': round(e.duration.total_seconds() / 60, 1),
+                } for e in rows[:limit]
+            ],
+            'truncated': len(rows) > limit,
+        })
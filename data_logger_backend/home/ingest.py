@@ -0,0 +1,155 @@
+# home/ingest.py
+import math
+from datetime import datetime
+from django.db import transaction
+from django.utils.timezone import now
+from device_details.compliance import update_compliance
+from device_details.excursions import update_excursions
+from device_details.reports import invalidate_reports
+from device_details.rollups import recompute_rollups
+from device_details.signals import send_readings_batch
+from device_details.storage import get_reading_store
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _to_float(value, field, index):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"readings[{index}].{field} must be a number")
+    # float() بيقبل "nan" و "inf" و "1e999": MySQL يرفضهم وقت الـ insert والـ sums تبوظ
+    if not math.isfinite(number):
+        raise ValueError(f"readings[{index}].{field} must be a number")
+    return number
+
+
+def filter_rows(device, rows):
+    """
+    Drops values for sensors the device doesn't have and rows left with no
+    value at all. Returns the rows sorted by timestamp.
+    """
+    filtered = []
+    for timestamp, temperature, humidity in rows:
+        # تجاهل لو الجهاز مش فيه الحساس ده
+        if not device.has_temperature_sensor:
+            temperature = None
+        if not device.has_humidity_sensor:
+            humidity = None
+
+        # لازم يكون فيه على الأقل قيمة واحدة
+        if temperature is None and humidity is None:
+            continue
+
+        filtered.append((timestamp, temperature, humidity))
+
+    filtered.sort(key=lambda row: row[0])
+    return filtered
+
+
+def parse_readings(device, readings):
+    """
+    يتحقق من كل القراءات مرة واحدة قبل أي كتابة في الداتابيز.
+    Returns a list of (timestamp, temperature, humidity) sorted by timestamp.
+    Raises ValueError if any item is malformed, so a bad batch writes nothing.
+    """
+    if readings is None:
+        return []
+    if not isinstance(readings, list):
+        raise ValueError("readings must be a list")
+
+    rows = []
+    for index, r in enumerate(readings):
+        if not isinstance(r, dict):
+            raise ValueError(f"readings[{index}] must be an object")
+
+        temperature = _to_float(r.get('t'), 't', index)
+        humidity = _to_float(r.get('h'), 'h', index)
+
+        try:
+            timestamp = datetime.strptime(r.get('time'), TIME_FORMAT)
+        except (TypeError, ValueError):
+            timestamp = now()
+
+        rows.append((timestamp, temperature, humidity))
+
+    return filter_rows(device, rows)
+
+
+def merge_uploads(uploads):
+    """
+    Merges (device_id, rows, battery_level) uploads that belong to the same
+    device, keeping first-seen order. Returns {device_id: (rows, battery_level)}
+    with each device's rows sorted by timestamp.
+    """
+    merged = {}
+    for device_id, rows, battery_level in uploads:
+        merged_rows, merged_battery = merged.get(device_id, ([], None))
+        merged_rows.extend(rows)
+        if battery_level is not None:
+            merged_battery = battery_level
+        merged[device_id] = (merged_rows, merged_battery)
+
+    for rows, _ in merged.values():
+        rows.sort(key=lambda row: row[0])
+    return merged
+
+
+def _apply_live_fields(device, rows, battery_level):
+    if battery_level is not None:
+        device.battery_level = battery_level
+
+    # آخر القيم بعد ترتيب الدفعة زمنيًا
+    for ts, t, h in rows:
+        if t is not None:
+            device.temperature = t
+        if h is not None:
+            device.humidity = h
+        device.last_update = ts
+
+
+def ingest_batches(batches):
+    """
+    Writes parsed batches for one or many devices through the reading store
+    (one bulk insert for the table store), the affected hour/day rollups,
+    the daily compliance rows, the excursion index, the cached PDF reports
+    of the range and one Device.save() per device, all inside one
+    transaction, then sends one WebSocket message per device with its new
+    readings.
+
+    batches is a list of (device, rows, battery_level); rows must be
+    sorted by timestamp (parse_readings / filter_rows already do that).
+    Readings whose (device, timestamp) already exist are skipped, so a
+    batch the ESP resends after a lost response costs one range query.
+    Returns a list of (device, created_readings, duplicate_count).
+    """
+    results = []
+    store = get_reading_store()
+
+    for device, rows, battery_level in batches:
+        _apply_live_fields(device, rows, battery_level)
+
+    with transaction.atomic():
+        created = store.append([(device, rows) for device, rows, _ in batches])
+        for (device, rows, _), readings in zip(batches, created):
+            if readings:
+                recompute_rollups(device, readings[0].timestamp, readings[-1].timestamp)
+                update_compliance(device, readings)
+                update_excursions(device, readings)
+                invalidate_reports(device, readings[0].timestamp, readings[-1].timestamp)
+            device.save()
+            results.append((device, readings, len(rows) - len(readings)))
+
+    for device, readings, _ in results:
+        if readings:
+            send_readings_batch(device, readings)
+
+    return results
+
+
+def ingest_readings(device, rows, battery_level=None):
+    """Single-device ingest. Returns (created_readings, duplicate_count)."""
+    _, readings, duplicates = ingest_batches([(device, rows, battery_level)])[0]
+    return readings, duplicates
@@ -0,0 +1,179 @@
+# home/ingest_queue.py
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from django.conf import settings
+
+
+def encode_batch(device_id, rows, battery_level=None):
+    return json.dumps({
+        "device_id": device_id,
+        "battery_level": battery_level,
+        "rows": [(ts.isoformat(sep=" "), t, h) for ts, t, h in rows],
+    })
+
+
+def decode_batch(payload):
+    data = json.loads(payload)
+    rows = [(datetime.fromisoformat(ts), t, h) for ts, t, h in data["rows"]]
+    return data["device_id"], rows, data.get("battery_level")
+
+
+class RedisIngestQueue:
+    """Redis stream + consumer group; entries stay pending until ack()."""
+
+    stream = "ingest:readings"
+    dead_stream = "ingest:readings:dead"
+    group = "ingest-writers"
+
+    def __init__(self, url, consumer="writer"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.consumer = consumer
+        self._pending_checked = False
+
+    def _ensure_group(self):
+        import redis
+
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def put(self, payload):
+        self.client.xadd(self.stream, {"payload": payload})
+
+    def get(self, max_items, block_ms):
+        self._ensure_group()
+
+        # بعد crash: رجّع الرسائل اللي اتقرت ومتعملهاش ack الأول. القراية من "0"
+        # بتكمل لحد ما الـ pending يخلص، لأن كل مرة بتجيب max_items بس
+        start_id = ">" if self._pending_checked else "0"
+        response = self.client.xreadgroup(
+            self.group, self.consumer, {self.stream: start_id},
+            count=max_items, block=None if start_id == "0" else block_ms,
+        )
+
+        items, gone = [], []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                if not fields:
+                    # pending بس الرسالة نفسها اتمسحت من الـ stream
+                    gone.append(entry_id)
+                    continue
+                items.append((entry_id, fields[b"payload"].decode()))
+        if gone:
+            self.client.xack(self.stream, self.group, *gone)
+
+        if start_id == "0" and not items:
+            if not gone:
+                self._pending_checked = True
+            return self.get(max_items, block_ms)
+        return items
+
+    def ack(self, ids):
+        if ids:
+            self.client.xack(self.stream, self.group, *ids)
+            self.client.xdel(self.stream, *ids)
+
+    def release(self):
+        """Items read but not acked come back on the next get()."""
+        # ">" بيجيب الجديد بس؛ الـ pending بتاعنا بيرجع بالقراية من "0"
+        self._pending_checked = False
+
+    def dead_letter(self, items):
+        """Moves (id, payload) items that can never be written to the dead-letter stream."""
+        for _, payload in items:
+            self.client.xadd(self.dead_stream, {"payload": payload})
+        self.ack([item_id for item_id, _ in items])
+
+    def depth(self):
+        return self.client.xlen(self.stream)
+
+
+class DiskIngestQueue:
+    """One file per batch in a spool directory, for single-box installs."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def put(self, payload):
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def _names(self):
+        return sorted(n for n in os.listdir(self.path) if n.endswith(".json"))
+
+    def get(self, max_items, block_ms):
+        deadline = time.monotonic() + block_ms / 1000
+        while True:
+            names = self._names()[:max_items]
+            if names or time.monotonic() >= deadline:
+                break
+            time.sleep(0.2)
+
+        items = []
+        for name in names:
+            with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                items.append((name, f.read()))
+        return items
+
+    def ack(self, ids):
+        for name in ids:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def release(self):
+        # الملفات اللي متعملهاش ack لسه في الـ spool وهترجع في get() الجاية
+        pass
+
+    def dead_letter(self, items):
+        """Moves files that can never be written to the dead/ subdirectory."""
+        dead = os.path.join(self.path, "dead")
+        os.makedirs(dead, exist_ok=True)
+        for name, _ in items:
+            try:
+                os.replace(os.path.join(self.path, name), os.path.join(dead, name))
+            except FileNotFoundError:
+                pass
+
+    def depth(self):
+        return len(self._names())
+
+
+_queue = None
+
+
+def get_ingest_queue():
+    """
+    Returns the configured ingest queue, or None when INGEST_QUEUE is empty
+    and uploads are written synchronously in the request.
+    """
+    global _queue
+    backend = getattr(settings, "INGEST_QUEUE", "")
+
+    if not backend:
+        return None
+
+    if _queue is None:
+        if backend == "redis":
+            _queue = RedisIngestQueue(settings.INGEST_REDIS_URL)
+        elif backend == "disk":
+            _queue = DiskIngestQueue(settings.INGEST_QUEUE_DIR)
+        else:
+            raise ValueError(f"Unknown INGEST_QUEUE backend: {backend}")
+
+    return _queue
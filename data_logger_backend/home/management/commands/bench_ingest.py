@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.signals import post_save
+from home.models.device_model import Device
+from home.ingest import parse_readings, ingest_readings
+from home.utils import get_master_time
+from device_details.models import DeviceReading
+from device_details.signals import reading_rollup_signal
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark reading ingest: the old per-row create loop vs the bulk path. "
+        "Runs inside a transaction that is rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", help="Existing device to ingest into")
+        parser.add_argument("--batches", type=int, default=20, help="Requests per run")
+        parser.add_argument("--size", type=int, default=200, help="Readings per request")
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(device_id=options["device_id"])
+        except Device.DoesNotExist:
+            raise CommandError(f"Device {options['device_id']} not found")
+
+        batches = [self._make_batch(i, options["size"]) for i in range(options["batches"])]
+
+        for label, run in (("per-row (before)", self._per_row), ("bulk (after)", self._bulk)):
+            with transaction.atomic():
+                elapsed, rows = self._time(run, device, batches)
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{label:18} {len(batches) / elapsed:10.1f} req/s {rows / elapsed:12.1f} rows/s"
+            )
+
+    def _make_batch(self, index, size):
+        base = get_master_time() - timedelta(days=1) + timedelta(hours=index)
+        return [
+            {
+                "t": 20 + (i % 50) / 10,
+                "h": 50 + (i % 30) / 10,
+                "time": (base + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            for i in range(size)
+        ]
+
+    def _time(self, run, device, batches):
+        rows = 0
+        start = time.perf_counter()
+        for batch in batches:
+            device.refresh_from_db()
+            rows += run(device, batch)
+        return time.perf_counter() - start, rows
+
+    def _per_row(self, device, batch):
+        # نفس منطق DataLoggerListView.post قبل الـ bulk ingest. الـ rollup signal
+        # اتضاف بعدها، فبنفصله عشان الـ baseline يبقى الكود القديم بالظبط
+        post_save.disconnect(reading_rollup_signal, sender=DeviceReading)
+        try:
+            count = 0
+            for ts, t, h in parse_readings(device, batch):
+                DeviceReading.objects.create(device=device, temperature=t, humidity=h, timestamp=ts)
+                if t is not None:
+                    device.temperature = t
+                if h is not None:
+                    device.humidity = h
+                device.last_update = ts
+                count += 1
+            device.save()
+        finally:
+            post_save.connect(reading_rollup_signal, sender=DeviceReading)
+        return count
+
+    def _bulk(self, device, batch):
+        created, _ = ingest_readings(device, parse_readings(device, batch))
+        return len(created)
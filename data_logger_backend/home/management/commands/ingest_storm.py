@@ -0,0 +1,118 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from authentication.models import CustomUser
+from home.models.device_model import Device
+from home.utils import get_master_time
+
+PREFIX = "storm-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test: N devices reconnect at once and POST their stored backlog to a "
+        "running server, retrying after 429 as the firmware should. Prints status "
+        "counts and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/", help="Upload endpoint")
+        parser.add_argument("--token", help="API token sent as 'Authorization: Token ...'")
+        parser.add_argument("--devices", type=int, default=2000)
+        parser.add_argument("--backlog", type=int, default=100, help="Readings per device")
+        parser.add_argument("--concurrency", type=int, default=200, help="Parallel connections")
+        parser.add_argument("--max-retries", type=int, default=5)
+        parser.add_argument("--retry-scale", type=float, default=0.1, help="Multiply Retry-After to keep the run short")
+        parser.add_argument("--create-devices", metavar="ADMIN_USERNAME", help="Create the storm-* devices first")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the storm-* devices and exit")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            deleted, _ = Device.objects.filter(device_id__startswith=PREFIX).delete()
+            self.stdout.write(f"Deleted {deleted} rows")
+            return
+
+        device_ids = [f"{PREFIX}{i:05d}" for i in range(options["devices"])]
+
+        if options["create_devices"]:
+            self._create_devices(options["create_devices"], device_ids)
+
+        if not options["token"]:
+            raise CommandError("--token is required to run the storm")
+
+        self.options = options
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = [r for device_results in pool.map(self._device, device_ids) for r in device_results]
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for _, latency in results)
+        by_status = {}
+        for code, _ in results:
+            by_status[code] = by_status.get(code, 0) + 1
+
+        self.stdout.write(f"{len(device_ids)} devices, {len(results)} requests in {elapsed:.1f}s")
+        self.stdout.write(f"status: {dict(sorted(by_status.items()))}")
+        for p in (50, 95, 99):
+            self.stdout.write(f"p{p}: {self._percentile(latencies, p) * 1000:.0f} ms")
+
+    def _create_devices(self, username, device_ids):
+        try:
+            admin = CustomUser.objects.get(username=username)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {username} not found")
+
+        existing = set(Device.objects.filter(device_id__in=device_ids).values_list("device_id", flat=True))
+        now = get_master_time()
+        # bulk_create عشان ما نشغلش signals لكل جهاز وهمي
+        Device.objects.bulk_create([
+            Device(admin=admin, device_id=device_id, name=device_id, last_update=now, battery_level=80)
+            for device_id in device_ids if device_id not in existing
+        ])
+
+    def _body(self, device_id):
+        base = get_master_time() - timedelta(minutes=5 * self.options["backlog"])
+        return json.dumps({
+            "device_id": device_id,
+            "battery_level": 80,
+            "readings": [
+                {"t": 20 + i % 10, "h": 50, "time": (base + timedelta(minutes=5 * i)).strftime("%Y-%m-%d %H:%M:%S")}
+                for i in range(self.options["backlog"])
+            ],
+        }).encode()
+
+    def _device(self, device_id):
+        body = self._body(device_id)
+        results = []
+
+        for _ in range(self.options["max_retries"] + 1):
+            request = urllib.request.Request(self.options["url"], data=body, method="POST", headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Token {self.options['token']}",
+            })
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+                retry_after = e.headers.get("Retry-After")
+            except (urllib.error.URLError, TimeoutError):
+                code = 0
+            results.append((code, time.perf_counter() - start))
+
+            if code != 429:
+                break
+            time.sleep(float(retry_after or 1) * self.options["retry_scale"])
+
+        return results
+
+    def _percentile(self, values, p):
+        if not values:
+            return 0
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
@@ -0,0 +1,94 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, close_old_connections
+from home.ingest import filter_rows, ingest_batches, merge_uploads
+from home.ingest_queue import get_ingest_queue, decode_batch
+from home.models.device_model import Device
+
+logger = logging.getLogger(__name__)
+
+# أخطاء في الداتا نفسها: إعادة المحاولة مش هتنجح، فالرسالة بتروح الـ dead-letter
+BAD_UPLOAD_ERRORS = (ValidationError, DataError, IntegrityError, ValueError, TypeError, KeyError)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the reading ingest queue (INGEST_QUEUE) and write queued uploads "
+        "from many devices as one multi-device bulk insert per round."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-batches", type=int, default=500, help="Queued uploads per round")
+        parser.add_argument("--block-ms", type=int, default=1000, help="Wait for new uploads (ms)")
+        parser.add_argument("--once", action="store_true", help="Drain one round and exit")
+
+    def handle(self, *args, **options):
+        queue = get_ingest_queue()
+        if queue is None:
+            raise CommandError("INGEST_QUEUE is not configured; uploads are written synchronously.")
+
+        self.stdout.write(f"Ingest writer started ({queue.__class__.__name__})")
+
+        while True:
+            items = queue.get(options["max_batches"], options["block_ms"])
+            if items:
+                try:
+                    written = self.write(items)
+                    queue.ack([item_id for item_id, _ in items])
+                    self.stdout.write(f"[Writer] {len(items)} uploads -> {written} new readings")
+                except Exception as e:
+                    # دفعة واحدة بايظة مش لازم توقف باقي الأجهزة: نكتب كل رسالة لوحدها
+                    logger.error(f"❌ Ingest writer round failed, writing uploads one by one: {e}")
+                    self.write_each(queue, items)
+
+            close_old_connections()
+            if options["once"]:
+                break
+
+    def write_each(self, queue, items):
+        """
+        Writes items one upload at a time. An upload rejected for its data
+        goes to the dead-letter queue; any other error (database down...)
+        stops the round and the unacked uploads come back next round.
+        """
+        done, dead = [], []
+        try:
+            for item_id, payload in items:
+                try:
+                    self.write([(item_id, payload)])
+                    done.append(item_id)
+                except BAD_UPLOAD_ERRORS as e:
+                    logger.error(f"❌ Dead-lettering queued upload {item_id}: {e}")
+                    dead.append((item_id, payload))
+        except Exception as e:
+            # مفيش ack → نفس الرسائل هترجع الدورة الجاية (الـ dedup بيمنع التكرار)
+            logger.error(f"❌ Ingest writer round failed: {e}")
+            queue.release()
+        finally:
+            queue.ack(done)
+            queue.dead_letter(dead)
+        self.stdout.write(f"[Writer] {len(done)} uploads written one by one, {len(dead)} dead-lettered")
+
+    def write(self, items):
+        uploads = []
+        for _, payload in items:
+            try:
+                uploads.append(decode_batch(payload))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"❌ Dropping malformed queued upload: {e}")
+
+        # دمج كل الرسائل بتاعة نفس الجهاز في دفعة واحدة
+        merged = merge_uploads(uploads)
+        devices = Device.objects.in_bulk(list(merged), field_name="device_id")
+
+        batches = []
+        for device_id, (rows, battery_level) in merged.items():
+            device = devices.get(device_id)
+            if device is None:
+                logger.error(f"❌ Dropping queued upload for unknown device {device_id}")
+                continue
+            batches.append((device, filter_rows(device, rows), battery_level))
+
+        results = ingest_batches(batches)
+        return sum(len(readings) for _, readings, _ in results)
@@ -11,6 +11,13 @@ class MasterClock(models.Model):
         self.time_difference = time_diff
         self.save()
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        from ..utils import set_master_offset, broadcast_master_offset
+        set_master_offset(self.time_difference)
+        broadcast_master_offset(self.time_difference)
+
     def get_adjusted_time(self):
         """يرجع الوقت المعدل بناءً على الفرق المخزن"""
         return timezone.now() + timedelta(seconds=self.time_difference)
@@ -0,0 +1,77 @@
+# home/parsers.py
+import math
+import struct
+from datetime import datetime, timedelta
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+EPOCH = datetime(1970, 1, 1)
+
+# "DL" | version | battery | base_epoch | count | device_id length
+HEADER = struct.Struct("<2sBBIHB")
+# delta seconds from base_epoch | centi-°C | centi-%RH
+RECORD = struct.Struct("<Ihh")
+
+FRAME_VERSION = 1
+NO_BATTERY = 0xFF
+NO_VALUE = -32768
+
+
+def _value(raw):
+    if raw == NO_VALUE:
+        return None
+    value = raw / 100
+    # نفس شرط الـ JSON (home.ingest._to_float): قيمة مش finite ترفض الفريم كله
+    if not math.isfinite(value):
+        raise ParseError("Reading values must be finite numbers")
+    return value
+
+
+class ReadingsFrameParser(BaseParser):
+    """
+    Compact binary upload for ESP batches (little-endian):
+
+        header  : b"DL", version u8, battery u8 (0xFF = not sent),
+                  base_epoch u32, count u16, device_id length u8
+        device_id bytes (ascii)
+        records : count x (delta_seconds u32, temperature i16, humidity i16)
+
+    base_epoch is the RTC wall-clock time as seconds since 1970-01-01, the
+    same local time the JSON "time" strings carry. Temperature and humidity
+    are hundredths; -32768 means the sensor has no value.
+
+    Returns the same keys as the JSON body, except that readings come back
+    as "frame_rows" - already decoded (timestamp, t, h) tuples.
+    """
+    media_type = "application/x-datalogger-frame"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        body = stream.read() if stream is not None else b""
+
+        if len(body) < HEADER.size:
+            raise ParseError("Frame too short")
+
+        magic, version, battery, base_epoch, count, id_len = HEADER.unpack_from(body)
+        if magic != b"DL" or version != FRAME_VERSION:
+            raise ParseError("Unsupported frame")
+
+        records_start = HEADER.size + id_len
+        if len(body) != records_start + count * RECORD.size:
+            raise ParseError("Frame length does not match record count")
+
+        try:
+            device_id = body[HEADER.size:records_start].decode("ascii")
+        except UnicodeDecodeError:
+            raise ParseError("device_id must be ascii")
+
+        base = EPOCH + timedelta(seconds=base_epoch)
+        rows = [
+            (base + timedelta(seconds=delta), _value(t), _value(h))
+            for delta, t, h in RECORD.iter_unpack(body[records_start:])
+        ]
+
+        return {
+            "device_id": device_id,
+            "battery_level": None if battery == NO_BATTERY else battery,
+            "frame_rows": rows,
+        }
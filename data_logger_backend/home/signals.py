@@ -4,6 +4,7 @@ from django.dispatch import receiver
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from authentication.models import CustomUser
+from logs.offline_scheduler import push_device_deadline
 from .models.device_model import Device
 from .serializers import DeviceSerializer
 from django.db.models import Q
@@ -11,6 +12,7 @@ from django.db.models import Q
 @receiver(post_save, sender=Device)
 def device_updated(sender, instance: Device, created, **kwargs):
     instance.check_and_log_status()
+    push_device_deadline(instance)
     channel_layer = get_channel_layer()
     serialized = DeviceSerializer(instance).data
 
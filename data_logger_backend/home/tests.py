@@ -1,3 +1,48 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from authentication.models import CustomUser
+from .models.departments import Department
+from .models.device_model import Device
+from .models.master_clock import MasterClock
+from .utils import _clock_cache, get_master_time
 
-# Create your tests here.
+
+class DeviceListClockQueryTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name="Cold room")
+        self.admin = CustomUser.objects.create_user(username="admin", password="p", role="admin", department=department)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        _clock_cache.update(offset=None, expires=0)
+
+    def add_devices(self, count):
+        start = Device.objects.count()
+        for i in range(start, start + count):
+            Device.objects.create(
+                admin=self.admin, device_id=f"T:{i:02}", department=self.admin.department,
+                last_update=get_master_time(), battery_level=80,
+            )
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_clock_lookups_do_not_grow_with_devices(self):
+        clock_table = MasterClock._meta.db_table
+        self.add_devices(2)
+        _clock_cache.update(offset=None, expires=0)
+
+        # cache بارد: query واحدة للساعة للطلب كله
+        queries = self.list_queries()
+        self.assertEqual(sum(clock_table in sql for sql in queries), 1)
+
+        # cache دافي: ولا query، ونفس العدد مهما زادت الأجهزة
+        queries = self.list_queries()
+        self.assertEqual(sum(clock_table in sql for sql in queries), 0)
+        self.add_devices(20)
+        with self.assertNumQueries(len(queries)):
+            self.client.get("/")
@@ -0,0 +1,122 @@
+# home/throttling.py
+import math
+import threading
+import time
+import zlib
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now, cost=1):
+        """Returns 0 if the tokens were taken, otherwise the seconds to wait."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost=1):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+# الـ buckets والعدادات في ذاكرة الـ worker process
+_lock = threading.Lock()
+_buckets = {}
+_stats = {"accepted": 0, "rejected_device": 0, "rejected_global": 0}
+MAX_BUCKETS = 10000
+
+
+def _bucket(key, rate, burst):
+    bucket = _buckets.get(key)
+    if bucket is None:
+        if len(_buckets) >= MAX_BUCKETS:
+            # bucket مليان = نفس bucket جديد، فممكن نشيله
+            now = time.monotonic()
+            for k in [k for k, b in _buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.burst]:
+                del _buckets[k]
+        bucket = _buckets[key] = TokenBucket(rate, burst)
+    return bucket
+
+
+def admission_stats():
+    with _lock:
+        return dict(_stats, buckets=len(_buckets))
+
+
+class IngestAdmissionThrottle(BaseThrottle):
+    """
+    Token-bucket admission control for device POSTs (uploads, discovery).
+    Each device_id has its own bucket and every request also takes a token
+    from the scope's global bucket. Rejections get 429 with a Retry-After
+    that adds a per-device offset, so a fleet reconnecting together spreads
+    its retries out instead of coming back in lockstep.
+
+    Limits come from settings.INGEST_ADMISSION[scope] and apply per worker
+    process.
+    """
+    scope = "ingest"
+
+    def get_device_id(self, request):
+        # body بايظ أو مش object: الـ IP هو الـ key، والـ view هي اللي ترد بالـ 400
+        try:
+            data = request.data
+        except ParseError:
+            return self.get_ident(request)
+        device_id = data.get("device_id") if isinstance(data, dict) else None
+        if isinstance(device_id, str) and device_id:
+            return device_id
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        if request.method != "POST":
+            return True
+
+        config = settings.INGEST_ADMISSION[self.scope]
+        device_id = self.get_device_id(request)
+        now = time.monotonic()
+
+        with _lock:
+            device_bucket = _bucket((self.scope, device_id), config["DEVICE_RATE"], config["DEVICE_BURST"])
+            global_bucket = _bucket((self.scope, None), config["GLOBAL_RATE"], config["GLOBAL_BURST"])
+
+            wait = device_bucket.take(now)
+            if wait:
+                _stats["rejected_device"] += 1
+            else:
+                wait = global_bucket.take(now)
+                if wait:
+                    device_bucket.refund()
+                    _stats["rejected_global"] += 1
+                else:
+                    _stats["accepted"] += 1
+
+        if not wait:
+            return True
+
+        jitter = zlib.crc32(device_id.encode()) % (config["RETRY_JITTER"] + 1)
+        self._wait = math.ceil(wait) + jitter
+        return False
+
+    def wait(self):
+        return self._wait
+
+
+class DiscoveryAdmissionThrottle(IngestAdmissionThrottle):
+    scope = "discovery"
+
+
+class GatewayAdmissionThrottle(IngestAdmissionThrottle):
+    """Gateways carry many devices per request, so they're keyed by user/IP."""
+    scope = "gateway"
+
+    def get_device_id(self, request):
+        return self.get_ident(request)
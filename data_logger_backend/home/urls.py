@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import AddDeviceView, DataLoggerListView, DepartmentListView, DiscoveryListView, EditMasterClockView, DeviceReadingView, FirmwareUpdateView, IsRegisteredView
+from .views import AddDeviceView, DataLoggerListView, DepartmentListView, DiscoveryListView, EditMasterClockView, DeviceReadingView, FirmwareUpdateView, GatewayIngestView, IngestStatsView, IsRegisteredView
 
 urlpatterns = [
     path('', DataLoggerListView.as_view(), name='data-logger-list'),
     path('departments/', DepartmentListView.as_view(), name='departments'),
+    path('gateway/', GatewayIngestView.as_view(), name='data-logger-gateway'),
+    path('ingest/stats/', IngestStatsView.as_view(), name='data-logger-ingest-stats'),
     path('add/', AddDeviceView.as_view(), name='data-logger-add'),
     path("registered/<str:device_id>/", IsRegisteredView.as_view()),
     path('discover/', DiscoveryListView.as_view(), name='data-logger-discover'),
@@ -1,15 +1,93 @@
 # master/utils.py
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
 from django.utils.timezone import now
 
+logger = logging.getLogger(__name__)
+
+# فرق الـ MasterClock متخزن في ذاكرة الـ process بدل query مع كل get_master_time()
+MASTER_CLOCK_TTL = 60  # ثواني، احتياطي لو رسالة الـ channel layer ضاعت
+MASTER_CLOCK_GROUP = "master_clock"
+_clock_cache = {"offset": None, "expires": 0}
+
+
+def get_master_offset():
+    """Seconds between the master clock and the real time, cached per process."""
+    if _clock_cache["offset"] is None or time.monotonic() >= _clock_cache["expires"]:
+        from .models.master_clock import MasterClock
+        master_clock = MasterClock.objects.first()
+        set_master_offset(master_clock.time_difference if master_clock else 0)
+    return _clock_cache["offset"]
+
+
+def set_master_offset(offset):
+    _clock_cache["offset"] = offset
+    _clock_cache["expires"] = time.monotonic() + MASTER_CLOCK_TTL
+
+
+def broadcast_master_offset(offset):
+    """Tell every worker (and the checker thread) about a new offset."""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            MASTER_CLOCK_GROUP,
+            {"type": "master_clock.update", "time_difference": offset},
+        )
+    except Exception as e:
+        # الـ TTL هيحدث باقي الـ workers في الآخر
+        logger.error(f"❌ Master clock broadcast failed: {e}")
+
+
+_listener_started = False
+
+
+def start_master_clock_listener():
+    """
+    Background thread that applies master clock updates from other
+    processes. Started by the server entry points (asgi.py / wsgi.py) only;
+    management commands and tests fall back to MASTER_CLOCK_TTL.
+    """
+    from device_details.report_worker import in_report_worker
+
+    global _listener_started
+    if _listener_started or in_report_worker():
+        return
+    _listener_started = True
+
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def listen():
+        channel = await channel_layer.new_channel()
+        while True:
+            try:
+                # group_add كل دورة عشان الـ group membership ليها expiry
+                await channel_layer.group_add(MASTER_CLOCK_GROUP, channel)
+                message = await asyncio.wait_for(channel_layer.receive(channel), timeout=MASTER_CLOCK_TTL * 10)
+                set_master_offset(int(message["time_difference"]))
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                logger.error(f"❌ Master clock listener error: {e}")
+                await asyncio.sleep(MASTER_CLOCK_TTL)
+
+    threading.Thread(target=lambda: asyncio.run(listen()), daemon=True).start()
+
+
 def get_master_time():
-    from .models.master_clock import MasterClock
-    master_clock = MasterClock.objects.first()
-    if master_clock:
-        adjusted_time = master_clock.get_adjusted_time()  # استرجاع الوقت المعدل
-    else:
-        adjusted_time = now()  # إذا لم يوجد MasterClock، استخدم الوقت الفعلي
-
-    return adjusted_time   
+    return now() + timedelta(seconds=get_master_offset())
+
 
 def get_user_devices(user):
     from .models.device_model import Device
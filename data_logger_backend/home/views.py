@@ -1,14 +1,23 @@
+import logging
+import math
 from datetime import timedelta
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 from .models.device_model import Device
 from .models.departments import Department
 from .models.master_clock import MasterClock
 from .models.esp_discovery import ESPDiscovery
 from device_details.models import DeviceReading
 from .serializers import DeviceSerializer, MasterClockSerializer, DeviceReadingSerializer, DepartmentSerializer
-from .utils import get_master_time
+from .utils import get_master_time, get_master_offset
+from .ingest import filter_rows, parse_readings, ingest_readings, ingest_batches, merge_uploads
+from .ingest_queue import get_ingest_queue, encode_batch
+from .parsers import ReadingsFrameParser
+from .throttling import IngestAdmissionThrottle, DiscoveryAdmissionThrottle, GatewayAdmissionThrottle, admission_stats
+
+logger = logging.getLogger(__name__)
 
 class DepartmentListView(APIView):
     def get(self, request):
@@ -18,6 +27,8 @@ class DepartmentListView(APIView):
 
 class DataLoggerListView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [IngestAdmissionThrottle]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, ReadingsFrameParser]
 
     def get(self, request, device_id=None):  
         user = request.user
@@ -52,9 +63,6 @@ class DataLoggerListView(APIView):
             if not device:
                 return Response({'message': 'Device not found'}, status=404)
 
-            master_clock = MasterClock.objects.first()
-            time_difference = master_clock.time_difference if master_clock else 0
-
             data = {
                 "message": "Getting Device Data Successfully",
                 "current_time": get_master_time().strftime("%Y-%m-%d %H:%M:%S"),
@@ -69,7 +77,8 @@ class DataLoggerListView(APIView):
             return Response(data)
 
         # ✅ لو مفيش device_id، نرجع كل الأجهزة
-        devices = list(device_qs)
+        # department_name في الـ serializer: من غير select_related تبقى query لكل جهاز
+        devices = list(device_qs.select_related('department'))
         for device in devices:
             device.status = device.get_dynamic_status()
 
@@ -79,12 +88,9 @@ class DataLoggerListView(APIView):
 
         serialized = DeviceSerializer(devices, many=True)
 
-        master_clock = MasterClock.objects.first()
-        time_difference = master_clock.time_difference if master_clock else 0
-
         data = {
             'current_time': get_master_time().strftime("%Y-%m-%d %H:%M:%S"),
-            'time_difference': time_difference,
+            'time_difference': get_master_offset(),
             'devices': serialized.data
         }
         return Response({
@@ -95,9 +101,12 @@ class DataLoggerListView(APIView):
     def post(self, request):
         """
         ESP sends one or multiple readings (temperature, humidity, time)
-        and optionally a battery_level field
+        and optionally a battery_level field, either as JSON or as a
+        binary application/x-datalogger-frame (see home.parsers)
         """
         data = request.data
+        if not isinstance(data, dict):
+            return Response({'message': 'Body must be a JSON object'}, status=400)
         device_id = data.get('device_id')
         battery_level = data.get('battery_level')
         readings = data.get('readings')
@@ -110,63 +119,125 @@ class DataLoggerListView(APIView):
         except Device.DoesNotExist:
             return Response({'message': 'Device not found'}, status=404)
 
-        # ✅ تحديث مستوى البطارية لو اتبعت
-        if battery_level is not None:
-            device.battery_level = battery_level
-
-        created_readings = []
-
-        if readings and isinstance(readings, list):
-            for r in readings:
-                temperature = r.get('t')
-                humidity = r.get('h')
-                reading_time = r.get('time')
-
-                from datetime import datetime
-                from django.utils.timezone import now
-
-                try:
-                    timestamp = datetime.strptime(reading_time, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    timestamp = now()
-
-                # تجاهل لو الجهاز مش فيه الحساس ده
-                if not device.has_temperature_sensor:
-                    temperature = None
-                if not device.has_humidity_sensor:
-                    humidity = None
-
-                # لازم يكون فيه على الأقل قيمة واحدة
-                if all(v is None for v in [temperature, humidity]):
-                    continue
-
-                reading = DeviceReading.objects.create(
-                    device=device,
-                    temperature=temperature,
-                    humidity=humidity,
-                    timestamp=timestamp
-                )
-                created_readings.append(reading)
-
-                # تحديث آخر القيم
-                if temperature is not None:
-                    device.temperature = temperature
-                if humidity is not None:
-                    device.humidity = humidity
-
-                device.last_update = timestamp
-
-        # حفظ كل التغييرات مرة واحدة
-        device.save()
+        # ✅ تحقق من الدفعة كلها قبل أي كتابة
+        if request.content_type.startswith(ReadingsFrameParser.media_type):
+            # binary frame متفكك جاهز من ReadingsFrameParser
+            rows = filter_rows(device, data['frame_rows'])
+        else:
+            try:
+                rows = parse_readings(device, readings)
+            except ValueError as e:
+                return Response({'message': str(e)}, status=400)
+
+        # ✅ لو فيه ingest queue: نسجل الدفعة ونرد فورًا، والكتابة على run_ingest_writer
+        queue = get_ingest_queue()
+        if queue is not None:
+            queue.put(encode_batch(device.device_id, rows, battery_level))
+            return Response({
+                'success': True,
+                'queued': len(rows),
+                'message': f'{len(rows)} readings queued',
+                'device_id': device.device_id,
+            }, status=202)
+
+        # ✅ bulk insert + حفظ الجهاز مرة واحدة في transaction واحدة
+        created_readings, duplicates = ingest_readings(device, rows, battery_level)
 
         return Response({
             'success': True,
             'count': len(created_readings),
+            'duplicates': duplicates,
             'message': f'{len(created_readings)} readings saved successfully',
             'device_id': device.device_id,
             'last_update': device.last_update.strftime("%Y-%m-%d %H:%M:%S")
         }, status=201)
     
+class GatewayIngestView(APIView):
+    """
+    Gateway / local relay upload for many devices in one request:
+    {"devices": [{"device_id", "battery_level", "readings": [{t, h, time}, ...]}, ...]}
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [GatewayAdmissionThrottle]
+    # أقصى عدد قراءات في كل bulk insert عشان الذاكرة تفضل محدودة
+    chunk_rows = 5000
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({'message': 'Body must be a JSON object'}, status=400)
+        entries = request.data.get('devices')
+        if not isinstance(entries, list):
+            return Response({'message': 'devices must be a list'}, status=400)
+
+        device_ids = {e.get('device_id') for e in entries if isinstance(e, dict) and isinstance(e.get('device_id'), str)}
+        devices = Device.objects.in_bulk(list(device_ids), field_name='device_id')
+
+        acks = {}
+        uploads = []
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not isinstance(entry.get('device_id'), str):
+                acks[f'#{index}'] = {'status': 'invalid', 'message': 'device_id is required'}
+                continue
+
+            device_id = entry['device_id']
+            device = devices.get(device_id)
+            if device is None:
+                acks[device_id] = {'status': 'not_found', 'message': 'Device not found'}
+                continue
+
+            try:
+                rows = parse_readings(device, entry.get('readings'))
+            except ValueError as e:
+                acks[device_id] = {'status': 'invalid', 'message': str(e)}
+                continue
+
+            uploads.append((device_id, rows, entry.get('battery_level')))
+
+        merged = merge_uploads(uploads)
+
+        queue = get_ingest_queue()
+        if queue is not None:
+            for device_id, (rows, battery_level) in merged.items():
+                queue.put(encode_batch(device_id, rows, battery_level))
+                acks[device_id] = {'status': 'queued', 'queued': len(rows)}
+            return Response({'success': True, 'results': acks}, status=202)
+
+        # كل chunk في transaction لوحده: لو واحد وقع، اللي قبله اتكتب فعلًا،
+        # فالرد بيقول لكل جهاز اتكتب ولا لأ (207) والـ gateway يعيد الفاشل بس
+        batch, batch_rows, failed = [], 0, 0
+        for device_id, (rows, battery_level) in merged.items():
+            batch.append((devices[device_id], rows, battery_level))
+            batch_rows += len(rows)
+            if batch_rows >= self.chunk_rows:
+                failed += self._write(batch, acks)
+                batch, batch_rows = [], 0
+        if batch:
+            failed += self._write(batch, acks)
+
+        if failed:
+            return Response({'success': False, 'failed': failed, 'results': acks}, status=207)
+        return Response({'success': True, 'results': acks}, status=201)
+
+    def _write(self, batch, acks):
+        """Writes one chunk and fills in its acks. Returns how many devices weren't written."""
+        try:
+            results = ingest_batches(batch)
+        except Exception as e:
+            logger.error(f"❌ Gateway chunk of {len(batch)} devices not written: {e}")
+            for device, _, _ in batch:
+                acks[device.device_id] = {'status': 'error', 'message': 'Not saved, send again'}
+            return len(batch)
+
+        for device, readings, duplicates in results:
+            acks[device.device_id] = {
+                'status': 'ok',
+                'count': len(readings),
+                'duplicates': duplicates,
+                'last_update': device.last_update.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        return 0
+
+
 class AddDeviceView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -262,6 +333,7 @@ class IsRegisteredView(APIView):
 
 class DiscoveryListView(APIView):
     permission_classes = []
+    throttle_classes = [DiscoveryAdmissionThrottle]
 
     def get(self, request):
         # نحذف الأجهزة القديمة (اللي عدّى عليها 10 ثواني بدون تحديث)
@@ -278,6 +350,8 @@ class DiscoveryListView(APIView):
         return Response({"count": len(data), "results": data})
 
     def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({"message": "Body must be a JSON object"}, status=400)
         device_id = request.data.get("device_id")
         if not device_id:
             return Response({"message": "device_id is required"}, status=400)
@@ -296,6 +370,19 @@ class DiscoveryListView(APIView):
             status=201 if created else 200
         )
         
+class IngestStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role not in ['admin', 'manager']:
+            return Response({'message': 'Unauthorized'}, status=403)
+
+        queue = get_ingest_queue()
+        return Response({
+            'queue_depth': queue.depth() if queue is not None else 0,
+            'admission': admission_stats(),
+        })
+
 class EditMasterClockView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -328,6 +415,8 @@ class DeviceReadingView(APIView):
             device_id = request.data.get('device_id')
             temperature = float(request.data.get('temperature'))
             humidity = float(request.data.get('humidity'))
+            if not (math.isfinite(temperature) and math.isfinite(humidity)):
+                raise ValueError
             time = get_master_time()
         except (TypeError, ValueError):
             return Response({'message': 'Invalid or missing fields'}, status=400)
@@ -337,14 +426,17 @@ class DeviceReadingView(APIView):
         except Device.DoesNotExist:
             return Response({'message': 'Device not found'}, status=404)
 
-        reading = DeviceReading.objects.create(
-            device=device,
-            temperature=temperature,
-            humidity=humidity,
-            timestamp=time
-        )
-
-        serializer = DeviceReadingSerializer(reading)
+        # نفس مسار باقي الرفع: الـ store والـ rollups والـ compliance والـ excursions والتقارير المتخزنة
+        readings, _ = ingest_readings(device, [(time, temperature, humidity)])
+        if not readings:
+            return Response({'success': True, 'message': 'Device reading already saved', 'results': None})
+
+        # الـ chunks store بيرجع ReadingRow، فنبني DeviceReading للـ serializer بس
+        reading = readings[0]
+        serializer = DeviceReadingSerializer(DeviceReading(
+            id=reading.id or None, device=device,
+            temperature=reading.temperature, humidity=reading.humidity, timestamp=reading.timestamp,
+        ))
         return Response({'success': True, 'message': 'Device reading added successfully', 'results': serializer.data})
 
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import DeviceLog, AdminLog, NotificationSettings
+from .models import DeviceLog, AdminLog, NotificationSettings, DailyReportDelivery
 
 
 @admin.register(DeviceLog)
@@ -108,3 +108,12 @@ class NotificationSettingsAdmin(admin.ModelAdmin):
             return qs.filter(user__department=user.department)
         # normal user: only their own row
         return qs.filter(user=user)
+
+
+@admin.register(DailyReportDelivery)
+class DailyReportDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'day', 'report_time', 'status', 'attempts', 'device_count', 'sent_at')
+    list_filter = ('status', 'day')
+    search_fields = ('user__username', 'email')
+    readonly_fields = ('created_at', 'claimed_at', 'sent_at')
+    ordering = ('-day', 'report_time')
@@ -0,0 +1,203 @@
+# logs/daily_reports.py
+"""
+Daily report mail. Once a user's NotificationSettings.report_time has
+passed, they get yesterday's report of every device they follow. Users are
+grouped by report_time: the reports of all due devices are rendered once on
+the report process pool, however many users follow them (the ReportJob
+cache), and each group's mail goes out over one SMTP connection.
+
+DailyReportDelivery is the run-log: a row per (user, day) is claimed before
+sending and marked sent right after, so a run restarted after a crash picks
+up what is left without mailing the users already done. Only a mail in
+flight when the process died can go out twice, once its claim times out.
+"""
+import logging
+import os
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from smtplib import SMTPException
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from device_details.models import ReportJob
+from device_details.reports import pick_mode, prepare_report, render_reports
+from home.utils import get_master_time
+from .models import DailyReportDelivery, NotificationSettings
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+CLAIM_TIMEOUT = timedelta(minutes=30)  # sending أكتر من كده = الـ run اللي مسكه مات
+
+
+def report_range(day):
+    # نفس مدى ?filter_date= في download_device_data_pdf_api، فالـ PDF المتخزن بيتشارك
+    return datetime.combine(day, time.min), datetime.combine(day, time.max)
+
+
+def due_settings(day, now):
+    """NotificationSettings that get the report of day by now, ordered by report_time."""
+    qs = (
+        NotificationSettings.objects.filter(gmail_is_active=True, devices__isnull=False)
+        .exclude(email__isnull=True).exclude(email__exact='')
+        .select_related('user').prefetch_related('devices').distinct()
+    )
+    if day >= now.date() - timedelta(days=1):
+        # تقرير امبارح: بس اللي معاده عدّى النهارده
+        qs = qs.filter(report_time__lte=now.time())
+    return qs.order_by('report_time', 'user_id')
+
+
+def claim_deliveries(day, due, now):
+    """Creates the day's run-log rows for the due users and claims the pending ones for this run."""
+    DailyReportDelivery.objects.bulk_create(
+        [DailyReportDelivery(user=s.user, day=day, report_time=s.report_time, email=s.email) for s in due],
+        ignore_conflicts=True,
+    )
+    DailyReportDelivery.objects.filter(
+        day=day, status=DailyReportDelivery.SENDING, claimed_at__lt=now - CLAIM_TIMEOUT,
+    ).update(status=DailyReportDelivery.PENDING)
+
+    pending = DailyReportDelivery.objects.filter(
+        day=day, status=DailyReportDelivery.PENDING, user__in=[s.user for s in due],
+    ).values_list('pk', 'user_id')
+
+    claimed = {}
+    for pk, user_id in pending:
+        # update مشروط: لو run تاني سبقنا على الصف ده، بيرجع 0
+        if DailyReportDelivery.objects.filter(pk=pk, status=DailyReportDelivery.PENDING).update(
+            status=DailyReportDelivery.SENDING, claimed_at=now,
+        ):
+            claimed[user_id] = pk
+    return claimed
+
+
+def render_day(devices, day):
+    """{device_pk: ReportJob} for day, rendering the ones not cached yet in parallel."""
+    start, end = report_range(day)
+    mode = pick_mode('auto', start, end)
+    jobs, to_render = {}, []
+    for device in devices:
+        job, render = prepare_report(device, start, end, mode=mode)
+        jobs[device.pk] = job
+        if render:
+            to_render.append(job.pk)
+
+    if to_render:
+        render_reports(to_render)
+    fresh = ReportJob.objects.in_bulk([job.pk for job in jobs.values()])
+    return {device_pk: fresh[job.pk] for device_pk, job in jobs.items()}
+
+
+class ReportNotReady(Exception):
+    """A report is still being rendered (possibly by another process); not a failed attempt."""
+
+
+def build_message(notification, devices, jobs, day, connection):
+    """
+    The mail of one user. Raises ValueError naming the devices whose report
+    failed, or ReportNotReady for the ones still rendering.
+    """
+    missing = [
+        d for d in devices
+        if not (jobs[d.pk].is_fresh and os.path.exists(jobs[d.pk].path))
+    ]
+    failed = [d for d in missing if jobs[d.pk].status == ReportJob.FAILED]
+    if failed:
+        raise ValueError("Report failed for " + ", ".join(d.name or d.device_id for d in failed))
+    if missing:
+        raise ReportNotReady("Report not rendered yet for " + ", ".join(d.name or d.device_id for d in missing))
+
+    names = "\n".join(f"- {d.name or d.device_id}" for d in devices)
+    message = EmailMessage(
+        subject=f"Daily device report - {day:%Y-%m-%d}",
+        body=f"Attached are the reports of {day:%Y-%m-%d} for:\n{names}\n",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.email],
+        connection=connection,
+    )
+    for d in devices:
+        message.attach_file(jobs[d.pk].path, 'application/pdf')
+    return message
+
+
+def _finish(pk, error=None, device_count=0, retry=False):
+    delivery = DailyReportDelivery.objects.get(pk=pk)
+    if error is None:
+        delivery.status = DailyReportDelivery.SENT
+        delivery.error = ''
+        delivery.device_count = device_count
+        delivery.sent_at = get_master_time()
+    elif retry:
+        # مش محاولة فاشلة: التقرير لسه بيترسم، فيرجع pending من غير ما ياكل من MAX_ATTEMPTS
+        delivery.error = str(error)
+        delivery.status = DailyReportDelivery.PENDING
+    else:
+        delivery.attempts += 1
+        delivery.error = str(error)
+        # يرجع pending للـ run الجاي لحد MAX_ATTEMPTS
+        delivery.status = DailyReportDelivery.FAILED if delivery.attempts >= MAX_ATTEMPTS else DailyReportDelivery.PENDING
+    delivery.save(update_fields=['status', 'error', 'device_count', 'sent_at', 'attempts'])
+
+
+def send_batch(batch, claimed, jobs, day):
+    """Mails one report_time group over a single SMTP connection. Returns (sent, failed, waiting)."""
+    sent = failed = waiting = 0
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+    except (SMTPException, OSError) as e:
+        logger.error(f"❌ SMTP connection failed for the {batch[0].report_time} batch: {e}")
+        for notification in batch:
+            _finish(claimed[notification.user_id], e)
+        return 0, len(batch), 0
+
+    try:
+        for notification in batch:
+            pk = claimed[notification.user_id]
+            devices = list(notification.devices.all())
+            try:
+                message = build_message(notification, devices, jobs, day, connection)
+                message.send()
+            except ReportNotReady as e:
+                logger.info(f"⏳ Daily report for {notification.user.username} waits for: {e}")
+                _finish(pk, e, retry=True)
+                waiting += 1
+                continue
+            except (ValueError, SMTPException, OSError) as e:
+                logger.error(f"❌ Daily report for {notification.user.username} not sent: {e}")
+                _finish(pk, e)
+                failed += 1
+                continue
+            _finish(pk, device_count=len(devices))
+            sent += 1
+    finally:
+        connection.close()
+    return sent, failed, waiting
+
+
+def run_daily_reports(day=None, now=None):
+    """
+    Sends the due daily reports of day (yesterday by default).
+    Returns {'due', 'claimed', 'devices', 'sent', 'failed', 'waiting'}.
+    """
+    now = now or get_master_time()
+    day = day or now.date() - timedelta(days=1)
+
+    due = list(due_settings(day, now))
+    claimed = claim_deliveries(day, due, now)
+    batch = [s for s in due if s.user_id in claimed]
+
+    devices = {d.pk: d for s in batch for d in s.devices.all()}
+    jobs = render_day(devices.values(), day) if devices else {}
+
+    sent = failed = waiting = 0
+    for _, group in groupby(batch, key=lambda s: s.report_time):
+        group_sent, group_failed, group_waiting = send_batch(list(group), claimed, jobs, day)
+        sent += group_sent
+        failed += group_failed
+        waiting += group_waiting
+
+    return {
+        'due': len(due), 'claimed': len(claimed), 'devices': len(devices),
+        'sent': sent, 'failed': failed, 'waiting': waiting,
+    }
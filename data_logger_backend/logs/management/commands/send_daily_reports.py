@@ -0,0 +1,47 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils.dateparse import parse_date
+from logs.daily_reports import run_daily_reports
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mail the daily device reports whose NotificationSettings.report_time has passed. "
+        "Safe to run from cron every few minutes or with --loop: deliveries already sent "
+        "are recorded in DailyReportDelivery and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--day", help="Report day YYYY-MM-DD (default: yesterday); a past day sends to everyone due")
+        parser.add_argument("--loop", action="store_true", help="Keep running, checking every --interval seconds")
+        parser.add_argument("--interval", type=int, default=60)
+
+    def handle(self, *args, **options):
+        day = None
+        if options["day"]:
+            day = parse_date(options["day"])
+            if day is None:
+                raise CommandError(f"Invalid --day {options['day']}")
+
+        while True:
+            try:
+                result = run_daily_reports(day)
+                if result["claimed"]:
+                    self.stdout.write(
+                        f"[Reports] {result['sent']} sent, {result['failed']} failed, {result['waiting']} waiting, "
+                        f"{result['devices']} device reports for {result['claimed']} users"
+                    )
+            except Exception as e:
+                # الـ run-log بيخلي الدورة الجاية تكمل من مكان ما وقفنا
+                logger.error(f"❌ Daily reports run failed: {e}")
+                if not options["loop"]:
+                    raise
+
+            close_old_connections()
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -124,4 +124,40 @@ class NotificationSettings(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.user.username} Notifications"
\ No newline at end of file
+        return f"{self.user.username} Notifications"
+
+class DailyReportDelivery(models.Model):
+    """سجل الإرسال اليومي: صف لكل (user, day)، فإعادة تشغيل الـ scheduler بعد crash مابتبعتش مرتين"""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_reports')
+    day = models.DateField()  # يوم القراءات اللي في التقرير
+    report_time = models.TimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    email = models.EmailField(blank=True, default='')
+    device_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=get_master_time)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_report_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.day} - {self.status}"
@@ -0,0 +1,146 @@
+# logs/offline_scheduler.py
+"""
+Offline detection by deadline. Each device goes offline at
+last_update + interval_wifi + OFFLINE_GRACE (the rule of
+Device.get_dynamic_status); the deadlines sit in a min-heap and the
+checker thread sleeps until the earliest one, so an idle fleet costs
+nothing. Device saves (every ingest) push the device's deadline forward.
+
+An expired deadline is checked against the database before anything is
+logged, because readings written by another process (run_ingest_writer,
+another web worker) don't reach this heap. A reconcile pass every
+OFFLINE_RECONCILE_SECONDS reloads every deadline in one query, for new
+devices, changed intervals and anything missed.
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from home.utils import get_master_time
+from .models import DeviceLog
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_GRACE = timedelta(minutes=10)
+MAX_SLEEP = 60  # ثواني؛ الـ master clock ممكن يتغير وإحنا نايمين
+
+
+def offline_deadline(last_update, interval_wifi):
+    """The moment a device with this last_update counts as offline, or None."""
+    if not last_update:
+        return None
+    return last_update + timedelta(minutes=interval_wifi) + OFFLINE_GRACE
+
+
+class OfflineScheduler:
+    def __init__(self):
+        self._heap = []  # (deadline, device pk)؛ العناصر القديمة بتتشال لما تطلع
+        self._deadlines = {}  # device pk -> الـ deadline الحالي
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.running = False
+
+    def push(self, device_pk, deadline):
+        """Sets a device's deadline; the old heap entry is dropped when it surfaces."""
+        with self._lock:
+            if deadline is None:
+                self._deadlines.pop(device_pk, None)
+                return
+            if self._deadlines.get(device_pk) == deadline:
+                return
+            earliest = self._heap[0][0] if self._heap else None
+            self._deadlines[device_pk] = deadline
+            heapq.heappush(self._heap, (deadline, device_pk))
+        if earliest is None or deadline < earliest:
+            self._wake.set()
+
+    def reconcile(self, now):
+        """Rebuilds the heap from the database: one query for the devices, one for the open offline logs."""
+        Device = apps.get_model('home', 'Device')
+        rows = Device.objects.exclude(last_update__isnull=True).values_list('pk', 'last_update', 'interval_wifi')
+        logged = set(
+            DeviceLog.objects.filter(error_type="offline", resolved=False).values_list('device_id', flat=True)
+        )
+
+        deadlines = {}
+        for pk, last_update, interval_wifi in rows:
+            deadline = offline_deadline(last_update, interval_wifi)
+            # أوفلاين وليه log مفتوح: مفيش حاجة نعملها لحد ما يبعت تاني
+            if deadline < now and pk in logged:
+                continue
+            deadlines[pk] = deadline
+
+        with self._lock:
+            self._deadlines = deadlines
+            self._heap = [(deadline, pk) for pk, deadline in deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < now:
+                deadline, pk = heapq.heappop(self._heap)
+                if self._deadlines.get(pk) == deadline:
+                    del self._deadlines[pk]
+                    due.append(pk)
+        return due
+
+    def expire(self, now):
+        """Logs the devices whose deadline passed and whose database row agrees. Returns them."""
+        due = self._pop_due(now)
+        if not due:
+            return []
+
+        Device = apps.get_model('home', 'Device')
+        offline = []
+        for pk, device in Device.objects.in_bulk(due).items():
+            deadline = offline_deadline(device.last_update, device.interval_wifi)
+            if deadline is None:
+                continue
+            if deadline >= now:
+                # قراءة وصلت من process تاني: الموعد اتأجل
+                self.push(pk, deadline)
+                continue
+            try:
+                # الجهاز الأوفلاين مابيرجعش الـ heap لحد ما يتحفظ تاني (أو الـ reconcile)
+                device.check_and_log_status()
+                offline.append(device)
+            except Exception as e:
+                logger.error(f"❌ Error checking device {device.device_id}: {e}")
+        return offline
+
+    def _sleep_seconds(self, now, next_reconcile):
+        with self._lock:
+            until = min(self._heap[0][0], next_reconcile) if self._heap else next_reconcile
+        return min(max((until - now).total_seconds(), 0), MAX_SLEEP)
+
+    def loop(self):
+        interval = timedelta(seconds=getattr(settings, "OFFLINE_RECONCILE_SECONDS", 300))
+        next_reconcile = get_master_time()
+        while True:
+            try:
+                now = get_master_time()
+                if now >= next_reconcile:
+                    self.reconcile(now)
+                    next_reconcile = now + interval
+                for device in self.expire(now):
+                    logger.info(f"[Checker] {device.device_id}: offline")
+            except Exception as e:
+                logger.error(f"❌ Offline checker error: {e}")
+            finally:
+                close_old_connections()
+
+            self._wake.clear()
+            self._wake.wait(self._sleep_seconds(get_master_time(), next_reconcile))
+
+
+scheduler = OfflineScheduler()
+
+
+def push_device_deadline(device):
+    """Called on every Device save: moves the device's offline deadline to match its last_update."""
+    if scheduler.running:
+        scheduler.push(device.pk, offline_deadline(device.last_update, device.interval_wifi))
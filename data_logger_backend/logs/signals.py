@@ -1,13 +1,12 @@
 from datetime import datetime
-import threading, time, logging
-from django.db import close_old_connections
+import threading, logging
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.apps import apps
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from .models import DeviceLog, AdminLog
-from home.utils import get_master_time
+from device_details.report_worker import in_report_worker
+from .offline_scheduler import scheduler
 
 channel_layer = get_channel_layer()
 User = get_user_model()
@@ -145,41 +144,14 @@ _auto_checker_started = False
 
 def start_auto_offline_checker():
     global _auto_checker_started
+    if in_report_worker():
+        return
     if _auto_checker_started:
         logger.info("⏩ Auto offline checker already running, skipping duplicate start.")
         return
     _auto_checker_started = True
 
-    Device = apps.get_model('home', 'Device')
     logger.info("🔄 Auto offline checker started from logs.signals.")
-
-    def loop():
-        while True:
-            print("[Checker] 🔁 Loop tick at", get_master_time())
-            now = get_master_time()
-            devices = Device.objects.all()
-
-            for device in devices:
-                try:
-                    if not device.last_update:
-                        continue
-
-                    status = device.check_and_log_status()
-                    print(f"[Check] {device.device_id}: dynamic_status={status}")
-
-                    if status != "offline":
-                        resolved_logs = DeviceLog.objects.filter(
-                            device=device, error_type="offline", resolved=True
-                        ).order_by("-timestamp")[:1]
-
-                        for log in resolved_logs:
-                            msg = f"✅ Device {device.device_id} is back online."
-                            print(msg)
-
-                except Exception as e:
-                    logger.error(f"❌ Error checking device {getattr(device, 'device_id', 'UNKNOWN')}: {e}")
-
-            close_old_connections()
-            time.sleep(10)
-
-    threading.Thread(target=loop, daemon=True).start()
+    # شغال من غير ما يلف على كل الأجهزة كل 10 ثواني: بيصحى عند أقرب deadline بس
+    scheduler.running = True
+    threading.Thread(target=scheduler.loop, daemon=True).start()